@@ -1,5 +1,22 @@
 import axios from "axios";
 
+// The classifier answers 503 while a (re)started instance loads and warms
+// its model, and refuses connections for a moment during rolling restarts.
+const MAX_ATTEMPTS = 5;
+const BASE_DELAY_MS = 500;
+const RETRYABLE_CODES = ["ECONNREFUSED", "ECONNRESET", "ETIMEDOUT", "EAI_AGAIN"];
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+const isRetryable = (err) =>
+  RETRYABLE_CODES.includes(err.code) || err.response?.status === 503;
+
+const retryDelay = (err, attempt) => {
+  const retryAfter = Number(err.response?.headers?.["retry-after"]);
+  if (retryAfter > 0) return retryAfter * 1000;
+  return BASE_DELAY_MS * 2 ** (attempt - 1);
+};
+
 export const classifyText = async (text, source) => {
   const CLASSIFIER_BASE_URL = process.env.CLASSIFIER_API_URL;
 
@@ -11,10 +28,59 @@ export const classifyText = async (text, source) => {
 
   console.log("Calling classifier at:", url);
 
-  const response = await axios.post(url, {
-    text,
-    source,
-  });
+  for (let attempt = 1; ; attempt++) {
+    try {
+      const response = await axios.post(url, {
+        text,
+        source,
+      });
+
+      return response.data;
+    } catch (err) {
+      if (attempt >= MAX_ATTEMPTS || !isRetryable(err)) throw err;
+
+      const delay = retryDelay(err, attempt);
+      console.warn(
+        `⏳ Classifier unavailable (${err.code || err.response?.status}), retrying in ${delay}ms`,
+      );
+      await sleep(delay);
+    }
+  }
+};
 
-  return response.data;
+// Near-duplicate check (same story from several feeds) before classifying.
+// Fails open: if the check itself is unavailable the item is processed.
+// The check records nothing; call recordNearDuplicate once the event is saved.
+export const findNearDuplicate = async (text) => {
+  const CLASSIFIER_BASE_URL = process.env.CLASSIFIER_API_URL;
+  if (!CLASSIFIER_BASE_URL) return null;
+
+  try {
+    const response = await axios.post(
+      `${CLASSIFIER_BASE_URL}/dedupe`,
+      { text },
+      { timeout: 5000 },
+    );
+    return response.data.duplicate ? response.data : null;
+  } catch (err) {
+    console.warn(`⚠️ Near-duplicate check failed (${err.code || err.response?.status})`);
+    return null;
+  }
+};
+
+// Record a saved text so later near-duplicates of it are skipped. Failing
+// only means a repeat of this item may be stored once more.
+export const recordNearDuplicate = async (text) => {
+  const CLASSIFIER_BASE_URL = process.env.CLASSIFIER_API_URL;
+  if (!CLASSIFIER_BASE_URL) return;
+
+  try {
+    await axios.post(
+      `${CLASSIFIER_BASE_URL}/dedupe/record`,
+      { text },
+      { timeout: 5000 },
+    );
+  } catch (err) {
+    console.warn(`⚠️ Recording near-duplicate text failed (${err.code || err.response?.status})`);
+  }
 };
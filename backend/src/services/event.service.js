@@ -1,33 +1,46 @@
 import prisma from "../../prisma/client.js";
 
-export const saveEvent = async ({
+// Saves an event and reports whether it is new: a re-fetched item (same
+// externalId) only gets its analysis updated and is not a new mention.
+export const upsertEvent = async ({
   text,
   category,
   confidence,
   source,
   externalId,
 }) => {
-  // If we have a unique ID (like a URL), use upsert to avoid duplicates
-  if (externalId) {
-    return prisma.event.upsert({
-      where: { externalId },
-      update: { confidence, category }, // Update if the analysis changes
-      create: {
-        text,
-        category,
-        confidence,
-        source,
-        externalId,
-      },
+  // Fallback for manual inputs or items without IDs
+  if (!externalId) {
+    const event = await prisma.event.create({
+      data: { text, category, confidence, source },
     });
+    return { event, created: true };
   }
 
-  // Fallback for manual inputs or items without IDs
-  return prisma.event.create({
-    data: { text, category, confidence, source },
+  const existing = await prisma.event.findUnique({
+    where: { externalId },
+    select: { id: true },
+  });
+  if (!existing) {
+    try {
+      const event = await prisma.event.create({
+        data: { text, category, confidence, source, externalId },
+      });
+      return { event, created: true };
+    } catch (err) {
+      if (err.code !== "P2002") throw err; // saved concurrently; update below
+    }
+  }
+
+  const event = await prisma.event.update({
+    where: { externalId },
+    data: { confidence, category }, // Update if the analysis changes
   });
+  return { event, created: false };
 };
 
+export const saveEvent = async (data) => (await upsertEvent(data)).event;
+
 export const getEvents = async () => {
   return prisma.event.findMany({
     orderBy: { createdAt: "desc" },
@@ -4,10 +4,14 @@ import { fetchRSSFeeds } from "./fetchers/rss.fetcher.js";
 import { fetchClinicalTrials } from "./fetchers/clinical-trials.fetcher.js";
 import { fetchRegulatoryNews } from "./fetchers/regulatory.fetcher.js";
 import { fetchPubMedAbstracts } from "./fetchers/pubmed.fetcher.js";
-import { classifyText } from "./classifier.service.js";
-import { saveEvent } from "./event.service.js";
+import {
+  classifyText,
+  findNearDuplicate,
+  recordNearDuplicate,
+} from "./classifier.service.js";
+import { upsertEvent } from "./event.service.js";
 import { mapLabelToCategory } from "../utils/categoryMapper.js";
-import { runTrendDetection } from "./trend.service.js";
+import { runTrendDetection, streamEvents } from "./trend.service.js";
 
 class SchedulerService {
   constructor() {
@@ -16,6 +20,7 @@ class SchedulerService {
     this.stats = {
       totalFetches: 0,
       totalClassified: 0,
+      totalDuplicates: 0,
       lastRun: null,
       errors: [],
     };
@@ -27,22 +32,41 @@ class SchedulerService {
   async processBatch(texts) {
     let processedCount = 0;
     let errorCount = 0;
+    let duplicateCount = 0;
+    const savedEvents = [];
 
     console.log(`📦 Processing batch of ${texts.length} items...`);
 
     for (const item of texts) {
       try {
+        const duplicate = await findNearDuplicate(item.text);
+        if (duplicate) {
+          duplicateCount++;
+          this.stats.totalDuplicates++;
+          continue;
+        }
+
         const result = await classifyText(item.text, item.source);
         const categoryEnum = mapLabelToCategory(result.label);
 
-        await saveEvent({
+        const { event, created } = await upsertEvent({
           text: item.text,
           category: categoryEnum,
           confidence: result.confidence,
           source: item.source,
           externalId: item.url || item.id || null,
         });
-
+        await recordNearDuplicate(item.text);
+
+        // Only new events are new mentions for the streaming detector
+        if (created) {
+          savedEvents.push({
+            category: categoryEnum,
+            timestamp: event.createdAt,
+            source: item.source,
+            text: item.text,
+          });
+        }
         processedCount++;
         this.stats.totalClassified++;
       } catch (err) {
@@ -59,10 +83,12 @@ class SchedulerService {
       }
     }
 
+    await streamEvents(savedEvents);
+
     console.log(
-      `✅ Batch processed: ${processedCount} successful, ${errorCount} errors`,
+      `✅ Batch processed: ${processedCount} successful, ${duplicateCount} near-duplicates skipped, ${errorCount} errors`,
     );
-    return { processedCount, errorCount };
+    return { processedCount, errorCount, duplicateCount };
   }
 
   /**
@@ -30,3 +30,24 @@ export const runTrendDetection = async () => {
     throw err;
   }
 };
+
+// Feed freshly saved events to the streaming detector so spikes are
+// reported as they happen. Fails open: the hourly batch run still catches them.
+export const streamEvents = async (events) => {
+  if (events.length === 0) return null;
+
+  try {
+    const res = await axios.post(
+      `${TREND_API_URL}/stream/events`,
+      { events },
+      { timeout: 10000 },
+    );
+    if (res.data.count > 0) {
+      console.log(`🚨 Streaming detector raised ${res.data.count} trends`);
+    }
+    return res.data;
+  } catch (err) {
+    console.warn(`⚠️ Streaming trend update failed (${err.code || err.response?.status})`);
+    return null;
+  }
+};
@@ -0,0 +1,203 @@
+"""
+Dynamic micro-batching for classifier inference.
+
+Concurrent requests are parked on a bounded queue. A single worker thread
+drains the queue, grouping every item that arrives within ``max_wait_ms``
+(or until ``max_batch_size`` items are collected) into one padded forward
+pass, then hands each caller its own result.
+"""
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+
+class QueueFullError(Exception):
+    """Raised when the batching queue is at capacity"""
+
+
+class BatcherStoppedError(Exception):
+    """Set on items still queued when the batcher is stopped"""
+
+
+class MicroBatcher:
+    def __init__(self, predict_fn, max_batch_size=32, max_wait_ms=10, max_queue_size=1024,
+                 on_queue_wait=None):
+        """
+        Args:
+            predict_fn: Callable taking a list of texts and returning a list
+                of results in the same order
+            max_batch_size: Upper bound on texts per forward pass
+            max_wait_ms: How long to keep collecting after the first item
+            max_queue_size: Pending items allowed before callers are rejected
+            on_queue_wait: Optional callable receiving each item's seconds
+                spent queued before its batch started
+        """
+        self.predict_fn = predict_fn
+        self.on_queue_wait = on_queue_wait
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_queue_size = max_queue_size
+
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._submit_lock = threading.Lock()  # room check and puts are one step
+        self._worker = None
+        self._running = False
+        self._stats_lock = threading.Lock()
+        self._reset_stats()
+
+    # ------------------ Lifecycle ------------------
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._worker = threading.Thread(
+            target=self._run, name="classifier-batcher", daemon=True
+        )
+        self._worker.start()
+
+    def stop(self, timeout=5):
+        """Stop the worker; items still queued fail with BatcherStoppedError"""
+        if not self._running:
+            return
+        self._running = False
+        with self._submit_lock:
+            try:
+                self._queue.put_nowait(None)  # wake the worker
+            except queue.Full:
+                pass  # it isn't waiting; it stops after the batch it is on
+        self._worker.join(timeout)
+
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None and item[1].set_running_or_notify_cancel():
+                item[1].set_exception(BatcherStoppedError("Classifier batcher stopped"))
+
+    # ------------------ Submission ------------------
+    def submit(self, text):
+        """Queue a single text, returning a Future for its result"""
+        return self._enqueue([text], "Classifier queue is full ({pending} pending)")[0]
+
+    def submit_many(self, texts):
+        """Queue several texts, rejecting up front if they cannot all fit"""
+        return self._enqueue(texts, "Classifier queue cannot take {n} items ({free} free)")
+
+    def _enqueue(self, texts, message):
+        # Under one lock, so a concurrent caller can't fill the queue between
+        # the room check and the puts and leave part of a request queued
+        with self._submit_lock:
+            free = self.max_queue_size - self._queue.qsize()
+            if len(texts) > free:
+                with self._stats_lock:
+                    self._rejected += len(texts)
+                raise QueueFullError(message.format(n=len(texts), free=free, pending=self.max_queue_size - free))
+
+            queued_at = time.perf_counter()
+            futures = []
+            for text in texts:
+                future = Future()
+                self._queue.put_nowait((text, future, queued_at))
+                futures.append(future)
+            return futures
+
+    # ------------------ Worker ------------------
+    def _collect(self):
+        """Block for one item, then gather more until the window closes"""
+        first = self._queue.get()
+        if first is None:
+            return []
+
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._running = False
+                break
+            batch.append(item)
+
+        return batch
+
+    def _run(self):
+        while self._running:
+            batch = self._collect()
+            if not batch:
+                continue
+
+            # Callers that gave up (timeout/cancel) don't need a slot
+            batch = [(t, f, q) for t, f, q in batch if f.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            texts = [t for t, _, _ in batch]
+            started = time.perf_counter()
+            if self.on_queue_wait is not None:
+                for _, _, queued_at in batch:
+                    self.on_queue_wait(started - queued_at)
+            try:
+                results = self.predict_fn(texts)
+                if len(results) != len(batch):
+                    raise RuntimeError(f"predict_fn returned {len(results)} results for {len(batch)} texts")
+            except Exception as e:
+                for _, f, _ in batch:
+                    f.set_exception(e)
+                continue
+            elapsed = time.perf_counter() - started
+
+            for (_, f, _), result in zip(batch, results):
+                f.set_result(result)
+
+            self._record(len(batch), elapsed)
+
+    # ------------------ Statistics ------------------
+    def _reset_stats(self):
+        self._batches = 0
+        self._items = 0
+        self._rejected = 0
+        self._busy_seconds = 0.0
+        self._size_histogram = Counter()
+
+    def _record(self, size, elapsed):
+        with self._stats_lock:
+            self._batches += 1
+            self._items += size
+            self._busy_seconds += elapsed
+            self._size_histogram[size] += 1
+
+    def stats(self):
+        with self._stats_lock:
+            avg_size = self._items / self._batches if self._batches else 0.0
+            return {
+                "config": {
+                    "max_batch_size": self.max_batch_size,
+                    "max_wait_ms": self.max_wait * 1000,
+                    "max_queue_size": self.max_queue_size,
+                },
+                "batches": self._batches,
+                "items": self._items,
+                "rejected": self._rejected,
+                "queue_depth": self._queue.qsize(),
+                "avg_batch_size": round(avg_size, 2),
+                "avg_fill_ratio": round(avg_size / self.max_batch_size, 3),
+                "avg_batch_ms": round(
+                    1000 * self._busy_seconds / self._batches, 2
+                ) if self._batches else 0.0,
+                "batch_size_histogram": {
+                    str(k): v for k, v in sorted(self._size_histogram.items())
+                },
+            }
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._reset_stats()
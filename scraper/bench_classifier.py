@@ -0,0 +1,340 @@
+"""
+Latency / throughput benchmark for the pharma classifier.
+
+Sweeps text length (sampled from pharma_mentions.csv), client concurrency,
+micro-batch size and torch thread count, either in-process (backend +
+MicroBatcher, no HTTP) or over HTTP against a locally started
+classifier_api server. Results are written as JSON so runs can be diffed.
+
+Usage:
+    python bench_classifier.py --mode inprocess --output bench_base.json
+    python bench_classifier.py --mode http --threads 1,2,4 --compare bench_base.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+LENGTH_BUCKETS = ("short", "medium", "long")
+
+
+def int_list(value):
+    return [int(v) for v in value.split(",") if v]
+
+
+# ------------------ Workload ------------------
+def load_texts(path, tokenizer, seed):
+    """Split the dataset into short / medium / long thirds by token count"""
+    texts = pd.read_csv(path)["text"].dropna().astype(str).tolist()
+    lengths = [len(ids) for ids in tokenizer(texts, truncation=True, max_length=512)["input_ids"]]
+    order = np.argsort(lengths)
+    thirds = np.array_split(order, len(LENGTH_BUCKETS))
+
+    rng = random.Random(seed)
+    buckets = {}
+    for name, idx in zip(LENGTH_BUCKETS, thirds):
+        bucket = [texts[i] for i in idx]
+        rng.shuffle(bucket)
+        buckets[name] = {
+            "texts": bucket,
+            "median_tokens": int(np.median([lengths[i] for i in idx])),
+        }
+    return buckets
+
+
+def summarize(latencies, elapsed):
+    ms = np.array(latencies) * 1000
+    return {
+        "requests": len(latencies),
+        "p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(ms, 95)), 2),
+        "p99_ms": round(float(np.percentile(ms, 99)), 2),
+        "rps": round(len(latencies) / elapsed, 1),
+    }
+
+
+def drive(call, texts, concurrency, requests):
+    """Send ``requests`` single-text calls from ``concurrency`` client threads"""
+    latencies = []
+    lock = threading.Lock()
+
+    def client(worker):
+        local = []
+        for i in range(worker, requests, concurrency):
+            started = time.perf_counter()
+            call(texts[i % len(texts)])
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(client, range(concurrency)))
+    return summarize(latencies, time.perf_counter() - started)
+
+
+# ------------------ Memory ------------------
+def rss_mb(pid="self", field="VmRSS"):
+    """Resident set size (or its high-water mark with field="VmHWM"), Linux only"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(f"{field}:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss(pid="self"):
+    """Restart the VmHWM high-water mark so each configuration reports its own peak"""
+    try:
+        with open(f"/proc/{pid}/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def measure_memory(pid, run):
+    """Run ``run()``; return its result plus peak RSS and growth over the run"""
+    reset = reset_peak_rss(pid)
+    before = rss_mb(pid)
+    result = run()
+    peak = rss_mb(pid, "VmHWM") if reset else None
+    return result, {
+        "peak_rss_mb": peak,
+        "rss_delta_mb": round(peak - before, 1) if peak is not None and before is not None else None,
+    }
+
+
+# ------------------ In-process ------------------
+def bench_inprocess(args):
+    import torch
+    from batcher import MicroBatcher
+    from inference_backend import load_backend
+
+    backend = load_backend(args.backend, args.model_dir)
+    buckets = load_texts(args.data, backend.tokenizer, args.seed)
+    results = []
+
+    for threads in args.threads:
+        torch.set_num_threads(threads)
+        for batch_size in args.batch_sizes:
+            batcher = MicroBatcher(
+                backend.predict, max_batch_size=batch_size, max_wait_ms=args.max_wait_ms
+            )
+            batcher.start()
+            call = lambda text: batcher.submit(text).result()
+
+            for bucket in args.lengths:
+                texts = buckets[bucket]["texts"]
+                drive(call, texts, 1, args.warmup)
+                for concurrency in args.concurrency:
+                    batcher.reset_stats()
+                    timing, memory = measure_memory(
+                        "self", lambda: drive(call, texts, concurrency, args.requests)
+                    )
+                    row = {
+                        "mode": "inprocess",
+                        "backend": args.backend,
+                        "threads": threads,
+                        "batch_size": batch_size,
+                        "length": bucket,
+                        "median_tokens": buckets[bucket]["median_tokens"],
+                        "concurrency": concurrency,
+                        **timing,
+                        "avg_batch_fill": batcher.stats()["avg_batch_size"],
+                        **memory,
+                    }
+                    results.append(row)
+                    report(row)
+
+            batcher.stop()
+    return results
+
+
+# ------------------ HTTP ------------------
+def start_server(args, threads, batch_size):
+    env = dict(
+        os.environ,
+        CLASSIFIER_BACKEND=args.backend,
+        CLASSIFIER_MODEL_DIR=args.model_dir,
+        CLASSIFIER_TORCH_THREADS=str(threads),
+        CLASSIFIER_MAX_BATCH_SIZE=str(batch_size),
+        CLASSIFIER_MAX_WAIT_MS=str(args.max_wait_ms),
+        CLASSIFIER_CACHE_SIZE="0",  # repeated texts must reach the model
+    )
+    # Only the transformer path is measured: no cascade tier or near-dup index
+    for name in ("CLASSIFIER_CASCADE_MODEL", "CLASSIFIER_NEAR_DUP_INDEX", "CLASSIFIER_NEAR_DUP_THRESHOLD"):
+        env.pop(name, None)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "classifier_api:app", "--port", str(args.port), "--log-level", "warning"],
+        env=env,
+    )
+    return proc
+
+
+def wait_ready(session, base_url, proc, timeout=300):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"classifier server exited with {proc.returncode}")
+        try:
+            if session.get(f"{base_url}/ready", timeout=2).status_code == 200:
+                return
+        except Exception:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError("classifier server did not become ready")
+
+
+def bench_http(args):
+    import requests
+    from transformers import DistilBertTokenizerFast
+
+    tokenizer = DistilBertTokenizerFast.from_pretrained(args.model_dir)
+    buckets = load_texts(args.data, tokenizer, args.seed)
+    base_url = f"http://127.0.0.1:{args.port}"
+    results = []
+
+    local = threading.local()
+
+    def call(text):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        r = local.session.post(f"{base_url}/classify", json={"text": text}, timeout=60)
+        r.raise_for_status()
+
+    for threads in args.threads:
+        for batch_size in args.batch_sizes:
+            proc = start_server(args, threads, batch_size)
+            try:
+                wait_ready(requests.Session(), base_url, proc)
+                for bucket in args.lengths:
+                    texts = buckets[bucket]["texts"]
+                    drive(call, texts, 1, args.warmup)
+                    for concurrency in args.concurrency:
+                        before = requests.get(f"{base_url}/classify/stats").json()
+                        timing, memory = measure_memory(
+                            proc.pid, lambda: drive(call, texts, concurrency, args.requests)
+                        )
+                        after = requests.get(f"{base_url}/classify/stats").json()
+                        batches = after["batches"] - before["batches"]
+
+                        row = {
+                            "mode": "http",
+                            "backend": args.backend,
+                            "threads": threads,
+                            "batch_size": batch_size,
+                            "length": bucket,
+                            "median_tokens": buckets[bucket]["median_tokens"],
+                            "concurrency": concurrency,
+                            **timing,
+                            "avg_batch_fill": round(
+                                (after["items"] - before["items"]) / batches, 2
+                            ) if batches else 0.0,
+                            **memory,
+                        }
+                        results.append(row)
+                        report(row)
+            finally:
+                proc.terminate()
+                proc.wait()
+    return results
+
+
+# ------------------ Reporting ------------------
+CONFIG_KEYS = ("mode", "backend", "threads", "batch_size", "length", "concurrency")
+
+
+def report(row):
+    print(
+        f"   {row['mode']:9} t={row['threads']:<2} b={row['batch_size']:<3} "
+        f"{row['length']:6} c={row['concurrency']:<3} | "
+        f"p50 {row['p50_ms']:7.1f}ms  p95 {row['p95_ms']:7.1f}ms  p99 {row['p99_ms']:7.1f}ms  "
+        f"{row['rps']:7.1f} req/s  rss peak {row['peak_rss_mb']}MB (+{row['rss_delta_mb']}MB)"
+    )
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {
+            tuple(r[k] for k in CONFIG_KEYS): r for r in json.load(f)["results"]
+        }
+
+    print(f"\n📊 Compared with {baseline_path}")
+    for row in results:
+        old = baseline.get(tuple(row[k] for k in CONFIG_KEYS))
+        if old is None:
+            continue
+        rps_delta = (row["rps"] - old["rps"]) / old["rps"] * 100
+        p95_delta = (row["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100
+        print(
+            f"   {' '.join(str(row[k]) for k in CONFIG_KEYS):40} "
+            f"rps {rps_delta:+6.1f}%  p95 {p95_delta:+6.1f}%"
+        )
+
+
+def metadata(args):
+    import torch
+
+    try:
+        commit = subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        commit = None
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "cpus": os.cpu_count(),
+        "args": vars(args),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Classifier benchmark")
+    parser.add_argument("--mode", choices=["inprocess", "http"], default="inprocess")
+    parser.add_argument("--backend", default="torch")
+    parser.add_argument("--model-dir", default="pharma_model")
+    parser.add_argument("--data", default="pharma_mentions.csv")
+    parser.add_argument("--lengths", default=",".join(LENGTH_BUCKETS))
+    parser.add_argument("--concurrency", type=int_list, default=[1, 4, 16])
+    parser.add_argument("--batch-sizes", type=int_list, default=[1, 8, 32])
+    parser.add_argument("--threads", type=int_list, default=sorted({1, os.cpu_count()}))
+    parser.add_argument("--requests", type=int, default=200, help="Requests per configuration")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--max-wait-ms", type=float, default=10)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="Previous results file to diff against")
+    args = parser.parse_args()
+    args.lengths = [l for l in args.lengths.split(",") if l]
+
+    print(f"🏁 Benchmarking {args.mode} ({args.backend})")
+    results = bench_inprocess(args) if args.mode == "inprocess" else bench_http(args)
+
+    with open(args.output, "w") as f:
+        json.dump({"meta": metadata(args), "results": results}, f, indent=2)
+    print(f"\n✅ Wrote {len(results)} results to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
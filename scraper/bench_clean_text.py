@@ -0,0 +1,76 @@
+"""
+Micro-benchmark of clean_text on pharma_mentions.csv-style inputs.
+
+Compares the original BeautifulSoup(html.parser)-for-every-row cleaner
+with the current clean_text (plain-text fast path + lxml) and with
+clean_texts spread over a process pool, on plain rows (PubMed /
+ClinicalTrials style) and on rows wrapped in feed-style markup.
+
+Usage:
+    python bench_clean_text.py --data pharma_mentions.csv --repeat 20
+"""
+import argparse
+import os
+import time
+
+import pandas as pd
+from bs4 import BeautifulSoup
+
+import pharma_scraper
+
+
+def baseline_clean_text(text):
+    """clean_text as it was: a full html.parser tree for every row"""
+    if not text:
+        return ""
+    return " ".join(BeautifulSoup(text, "html.parser").get_text().split())
+
+
+def as_markup(text):
+    """Wrap a row the way FDA / WHO / NewsAPI descriptions arrive"""
+    escaped = text.replace("&", "&amp;").replace("<", "&lt;")
+    return f"<p>{escaped}</p> <a href=\"https://example.org\">Read more</a>&nbsp;&raquo;"
+
+
+def timed(fn, texts):
+    started = time.perf_counter()
+    out = fn(texts)
+    return out, (time.perf_counter() - started) / len(texts) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="clean_text micro-benchmark")
+    parser.add_argument("--data", default="pharma_mentions.csv")
+    parser.add_argument("--repeat", type=int, default=20, help="Copies of the dataset per input kind")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    rows = pd.read_csv(args.data)["text"].dropna().astype(str).tolist()
+    inputs = {
+        "plain": rows * args.repeat,
+        "markup": [as_markup(t) for t in rows] * args.repeat,
+    }
+
+    pharma_scraper.CLEAN_POOL_WORKERS = args.workers
+    pharma_scraper.CLEAN_POOL_MIN_BATCH = 0  # force the pool for the pool variant
+    variants = {
+        "baseline (html.parser)": lambda texts: [baseline_clean_text(t) for t in texts],
+        "clean_text": lambda texts: [pharma_scraper.clean_text(t) for t in texts],
+        f"clean_texts ({args.workers} procs)": pharma_scraper.clean_texts,
+    }
+
+    parser_name = "lxml" if pharma_scraper.lxml is not None else "html.parser"
+    print(f"🏁 clean_text benchmark, markup parser: {parser_name}")
+    for kind, texts in inputs.items():
+        print(f"\n   {kind}: {len(texts)} rows")
+        reference = [baseline_clean_text(t) for t in texts]  # also warms up
+        base_us = None
+        for name, fn in variants.items():
+            out, us = timed(fn, texts)
+            base_us = base_us or us
+            agree = sum(a == b for a, b in zip(out, reference)) / len(texts)
+            print(f"   {name:26} {us:8.1f} µs/row  {base_us / us:6.1f}x  {agree:7.2%} identical")
+
+
+if __name__ == "__main__":
+    main()
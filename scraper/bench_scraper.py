@@ -0,0 +1,157 @@
+"""
+End-to-end scraper benchmark against recorded fixtures.
+
+Runs every source of pharma_scraper against a local fixtures.py replay
+server (with optional latency and error injection) and reports items per
+second, the time each source took, and how the time spent in clean_text
+compares with the time spent waiting for responses. Each run starts from
+empty scraper state, so every fixture is fetched.
+
+Usage:
+    python fixtures.py record --dir fixtures      # once, with network
+    python bench_scraper.py --fixtures fixtures --latency 0.2 --jitter 0.1 --runs 3
+"""
+import argparse
+import asyncio
+import functools
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+import pharma_scraper
+from fixtures import FixtureServer, rewrite_urls
+from scraper_state import ScraperState
+
+
+class CleanTimer:
+    """Wraps clean_text / clean_texts to total the wall time spent cleaning"""
+
+    def __init__(self, module):
+        self.module = module
+        self.seconds = 0.0
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _timed(self, fn):
+        # functools.wraps keeps the wrappers picklable for the clean_texts pool
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if getattr(self._local, "inside", False):  # clean_text called from clean_texts
+                return fn(*args, **kwargs)
+            self._local.inside = True
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._local.inside = False
+                with self._lock:
+                    self.seconds += time.perf_counter() - started
+                    self.calls += 1
+        return wrapper
+
+    def __enter__(self):
+        self._originals = self.module.clean_text, self.module.clean_texts
+        self.module.clean_text = self._timed(self._originals[0])
+        self.module.clean_texts = self._timed(self._originals[1])
+        return self
+
+    def __exit__(self, *exc):
+        self.module.clean_text, self.module.clean_texts = self._originals
+
+
+async def run_once():
+    state = ScraperState(":memory:")
+    with CleanTimer(pharma_scraper) as timer:
+        started = time.perf_counter()
+        results, hosts = await pharma_scraper.scrape_all(state)
+        elapsed = time.perf_counter() - started
+    state.close()
+
+    items = sum(r["items"] for r in results)
+    return {
+        "items": items,
+        "seconds": round(elapsed, 3),
+        "items_per_second": round(items / elapsed, 1),
+        "clean_text_seconds": round(timer.seconds, 3),
+        "response_wait_seconds": round(sum(h["response_wait_seconds"] for h in hosts.values()), 3),
+        "requests": sum(h["requests"] for h in hosts.values()),
+        "retries": sum(h["retries"] for h in hosts.values()),
+        "sources": {r["source"]: {"items": r["items"], "seconds": r["seconds"], "error": r["error"]} for r in results},
+    }
+
+
+async def bench(args):
+    server = FixtureServer(
+        args.fixtures, latency=args.latency, jitter=args.jitter,
+        error_rate=args.error_rate, seed=args.seed,
+    )
+    base = await server.start()
+    rewrite_urls(vars(pharma_scraper), base)
+    pharma_scraper.NEAR_DUP_INDEX = ""
+    os.environ.setdefault("NEWS_API_KEY", "replay")  # the key is not part of the fixtures
+
+    runs = []
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            for i in range(args.runs):
+                pharma_scraper.OUTPUT_FILE = os.path.join(tmp, f"run{i}.csv")
+                runs.append(await run_once())
+                r = runs[-1]
+                print(f"   run {i + 1}: {r['items']} items in {r['seconds']:.2f}s "
+                      f"({r['items_per_second']:.1f} items/s, {r['requests']} requests, {r['retries']} retries)")
+        finally:
+            await server.stop()
+    return runs, dict(server.stats)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end scraper benchmark on recorded fixtures")
+    parser.add_argument("--fixtures", default="fixtures")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.1, help="Seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write the results here")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.fixtures):
+        parser.error(f"{args.fixtures}/ not found; record it first with: python fixtures.py record")
+
+    print(f"🏁 Scraper benchmark on {args.fixtures}/: latency {args.latency}s "
+          f"+ up to {args.jitter}s, error rate {args.error_rate:.0%}")
+    runs, server_stats = asyncio.run(bench(args))
+
+    def median(key):
+        return statistics.median(r[key] for r in runs)
+
+    seconds = median("seconds")
+    print(f"\n📊 Median of {len(runs)} runs: {median('items'):.0f} items in {seconds:.2f}s "
+          f"= {median('items_per_second'):.1f} items/s")
+    for name in runs[0]["sources"]:
+        per_source = [r["sources"][name] for r in runs]
+        errors = {s["error"] for s in per_source if s["error"]}
+        status = f"❌ {errors.pop()}" if errors else "✅"
+        print(f"   {name:15} {statistics.median(s['items'] for s in per_source):6.0f} items "
+              f"{statistics.median(s['seconds'] for s in per_source):7.2f}s  {status}")
+
+    clean, wait = median("clean_text_seconds"), median("response_wait_seconds")
+    print(f"   clean_text       {clean:7.3f}s ({clean / seconds:.1%} of wall time)")
+    print(f"   response wait    {wait:7.3f}s summed over {median('requests'):.0f} concurrent requests"
+          + (f" ({wait / clean:.0f}x clean_text)" if clean else ""))
+    print(f"   fixture server   {server_stats}")
+    if server_stats.get("misses"):
+        print("⚠️ Some requests had no fixture; re-record to benchmark the full scrape")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "runs": runs, "server": server_stats}, f, indent=2)
+        print(f"💾 Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""
+Offline bulk classification for backfills and re-labeling after retraining.
+
+Streams a CSV or JSONL file of any size in fixed-size chunks. Within each
+chunk texts are sorted by token length so every batch is padded only to its
+own longest member, then results are written back in input order - either
+to an output file or straight into MongoDB.
+
+Usage:
+    python bulk_classify.py data/raw_texts.csv --output labeled.jsonl
+    python bulk_classify.py events.jsonl --mongo-uri mongodb://localhost:27017
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from inference_backend import BACKENDS, MAX_SEQUENCE_LENGTH, load_backend
+
+
+# ------------------ Input ------------------
+def read_rows(path):
+    """Yield dict rows from a CSV or JSONL file without loading it whole"""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith((".jsonl", ".ndjson")):
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f)
+
+
+def read_chunks(path, chunk_size):
+    chunk = []
+    for row in read_rows(path):
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# ------------------ Output ------------------
+class FileSink:
+    def __init__(self, path, append=False):
+        self.path = path
+        self.is_jsonl = path.endswith((".jsonl", ".ndjson"))
+        self.has_header = append and os.path.exists(path) and os.path.getsize(path) > 0
+        self.file = open(path, "a" if append else "w", newline="", encoding="utf-8")
+        self.writer = None
+
+    def write(self, rows):
+        if self.is_jsonl:
+            for row in rows:
+                self.file.write(json.dumps(row, default=str) + "\n")
+        else:
+            if self.writer is None:
+                self.writer = csv.DictWriter(self.file, fieldnames=list(rows[0].keys()), extrasaction="ignore")
+                if not self.has_header:
+                    self.writer.writeheader()
+            self.writer.writerows(rows)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_timestamp(value):
+    """Naive UTC datetime from an ISO 8601 or RFC 2822 (RSS) timestamp, else None"""
+    if isinstance(value, datetime):
+        stamp = value
+    elif not value:
+        return None
+    else:
+        try:
+            stamp = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            try:
+                stamp = parsedate_to_datetime(str(value))
+            except (TypeError, ValueError):
+                return None
+    if stamp.tzinfo is not None:
+        stamp = stamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return stamp
+
+
+def external_id(row, source):
+    """Stable event key: the item's URL or id, else a hash of source and text"""
+    if row.get("externalId") or row.get("url") or row.get("id"):
+        return row.get("externalId") or row.get("url") or row.get("id")
+    text = " ".join(row["text"].split())
+    return "bulk:" + hashlib.sha1(f"{source}\x00{text}".encode("utf-8")).hexdigest()
+
+
+def event_filter(row, source):
+    """Match a row to its stored event: by ``_id`` when exported from Mongo, else by externalId"""
+    from bson import ObjectId
+
+    oid = row.get("_id")
+    if isinstance(oid, dict):  # extended JSON export
+        oid = oid.get("$oid")
+    if oid and ObjectId.is_valid(oid):
+        return {"_id": ObjectId(oid)}
+    return {"externalId": external_id(row, source)}
+
+
+class MongoSink:
+    """
+    Writes into the backend's Event collection the way pipeline.EventSink
+    does: labels mapped to the Prisma Category enum, upserted on
+    ``externalId``, ``createdAt`` set on insert. Re-running a backfill
+    relabels existing events instead of duplicating them, and new events
+    keep their source timestamp as ``createdAt`` (undated rows get now).
+
+    With ``upsert=False`` only the labels of events already stored are
+    updated; rows matching no event are counted in ``unmatched``.
+    """
+
+    def __init__(self, uri, db_name, collection, upsert=True):
+        from pymongo import MongoClient
+        from pymongo.errors import OperationFailure
+
+        self.client = MongoClient(uri)
+        self.col = self.client[db_name][collection]
+        self.upsert = upsert
+        self.unmatched = 0
+        if upsert:
+            try:
+                self.col.create_index("externalId", unique=True, sparse=True)
+            except OperationFailure:
+                pass  # already declared by the Prisma schema
+
+    def write(self, rows):
+        from pymongo import UpdateOne
+
+        from pipeline import label_to_category
+
+        now = datetime.utcnow()
+        ops = []
+        for row in rows:
+            source = row.get("source") or "bulk_classify"
+            fields = {"category": label_to_category(row["label"]), "confidence": row["confidence"]}
+            if not self.upsert:
+                ops.append(UpdateOne(event_filter(row, source), {"$set": fields}))
+                continue
+
+            created = {
+                "text": row["text"],
+                "source": source,
+                "createdAt": parse_timestamp(row.get("timestamp")) or now,
+            }
+            ops.append(UpdateOne(
+                {"externalId": external_id(row, source)},
+                {"$set": fields, "$setOnInsert": created},
+                upsert=True,
+            ))
+        if ops:
+            result = self.col.bulk_write(ops, ordered=False)
+            if not self.upsert:
+                self.unmatched += len(ops) - result.matched_count
+
+    def close(self):
+        self.client.close()
+
+
+# ------------------ Inference ------------------
+def classify_chunk(backend, texts, batch_size):
+    """
+    Classify one chunk with length-sorted dynamic padding.
+
+    Returns results in the same order as ``texts``.
+    """
+    encoded = backend.tokenizer(
+        texts,
+        truncation=True,
+        max_length=MAX_SEQUENCE_LENGTH,
+    )
+    order = sorted(range(len(texts)), key=lambda i: len(encoded["input_ids"][i]))
+
+    results = [None] * len(texts)
+    for start in range(0, len(order), batch_size):
+        idx = order[start:start + batch_size]
+        batch = backend.tokenizer.pad(
+            {
+                "input_ids": [encoded["input_ids"][i] for i in idx],
+                "attention_mask": [encoded["attention_mask"][i] for i in idx],
+            },
+            return_tensors=backend.return_tensors,
+        )
+        for i, result in zip(idx, backend.predict_inputs(batch)):
+            results[i] = result
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-classify a CSV/JSONL file")
+    parser.add_argument("input", help="CSV or JSONL file with a text column")
+    parser.add_argument("--output", help="Output .csv or .jsonl file")
+    parser.add_argument("--mongo-uri", help="Write classified events to MongoDB instead")
+    parser.add_argument("--db", default="medithon", help="The backend's database")
+    parser.add_argument("--collection", default="Event")
+    parser.add_argument("--text-column", default="text")
+    parser.add_argument("--model-dir", default="pharma_model")
+    parser.add_argument("--backend", default="torch", choices=BACKENDS)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument(
+        "--chunk-size", type=int, default=4096,
+        help="Rows held in memory at once; texts are length-sorted within a chunk"
+    )
+    args = parser.parse_args()
+
+    if bool(args.output) == bool(args.mongo_uri):
+        parser.error("pass exactly one of --output or --mongo-uri")
+
+    backend = load_backend(args.backend, args.model_dir)
+    sink = (
+        MongoSink(args.mongo_uri, args.db, args.collection)
+        if args.mongo_uri else FileSink(args.output)
+    )
+    print(f"🚀 Classifying {args.input} ({os.path.getsize(args.input) / 1e6:.1f} MB) with '{backend.name}'")
+
+    total = 0
+    skipped = 0
+    started = time.perf_counter()
+
+    try:
+        for chunk in read_chunks(args.input, args.chunk_size):
+            rows = [r for r in chunk if (r.get(args.text_column) or "").strip()]
+            skipped += len(chunk) - len(rows)
+            if not rows:
+                continue
+
+            texts = [r[args.text_column] for r in rows]
+            for row, result in zip(rows, classify_chunk(backend, texts, args.batch_size)):
+                if args.text_column != "text":
+                    row["text"] = row.pop(args.text_column)
+                row["label"] = result["label"]
+                row["confidence"] = result["confidence"]
+
+            sink.write(rows)
+            total += len(rows)
+
+            elapsed = time.perf_counter() - started
+            print(f"   {total} rows | {total / elapsed:.1f} rows/s", file=sys.stderr)
+    finally:
+        sink.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"✅ Classified {total} rows in {elapsed:.1f}s ({total / max(elapsed, 1e-9):.1f} rows/s), skipped {skipped} empty")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Cheap first tier for the classifier cascade: TF-IDF + logistic regression.
+
+Inputs whose top-class probability reaches the threshold are answered by
+this model; everything else falls through to DistilBERT.
+
+Usage:
+    python cascade_model.py train                      # pharma_mentions.csv -> cascade_model.pkl
+    python cascade_model.py evaluate --thresholds 0.5,0.7,0.9
+"""
+import argparse
+import hashlib
+import os
+import time
+
+import numpy as np
+
+DEFAULT_PATH = "cascade_model.pkl"
+
+
+def build_pipeline():
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import make_pipeline
+
+    return make_pipeline(
+        TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True, min_df=1, strip_accents="unicode"),
+        LogisticRegression(max_iter=2000, C=4.0),
+    )
+
+
+def load_dataset(path):
+    import pandas as pd
+
+    df = pd.read_csv(path).dropna(subset=["text", "label"])
+    return df["text"].astype(str).tolist(), df["label"].astype(str).tolist()
+
+
+class CascadeTier:
+    def __init__(self, path=DEFAULT_PATH, threshold=0.8):
+        import joblib
+
+        self.path = path
+        self.threshold = threshold
+        self.pipeline = joblib.load(path)
+        self.labels = self.pipeline.classes_
+
+        st = os.stat(path)
+        self.version = hashlib.sha1(
+            f"{st.st_size}:{st.st_mtime_ns}:{threshold}".encode()
+        ).hexdigest()[:8]
+
+    def predict(self, texts):
+        """
+        Return one result per text, or None where the tier isn't confident
+        enough and the transformer has to decide.
+        """
+        probs = self.pipeline.predict_proba(texts)
+        best = probs.argmax(axis=1)
+
+        results = []
+        for i, label_id in enumerate(best):
+            confidence = float(probs[i, label_id])
+            if confidence < self.threshold:
+                results.append(None)
+            else:
+                results.append({
+                    "label": str(self.labels[label_id]),
+                    "confidence": round(confidence, 3),
+                })
+        return results
+
+
+# ------------------ Commands ------------------
+def train(args):
+    from sklearn.metrics import accuracy_score
+    from sklearn.model_selection import train_test_split
+    import joblib
+
+    texts, labels = load_dataset(args.data)
+    print(f"📊 Training TF-IDF tier on {len(texts)} rows, {len(set(labels))} labels")
+
+    x_train, x_test, y_train, y_test = train_test_split(
+        texts, labels, test_size=args.holdout, random_state=args.seed
+    )
+    holdout = build_pipeline().fit(x_train, y_train)
+    print(f"   Holdout accuracy: {accuracy_score(y_test, holdout.predict(x_test)):.2%}")
+
+    started = time.perf_counter()
+    pipeline = build_pipeline().fit(texts, labels)
+    joblib.dump(pipeline, args.output)
+    print(f"✅ Saved {args.output} (fit in {time.perf_counter() - started:.2f}s)")
+
+
+def evaluate(args):
+    """Compare cascade vs pure DistilBERT on a held-out split"""
+    from sklearn.model_selection import train_test_split
+    from inference_backend import load_backend
+
+    texts, labels = load_dataset(args.data)
+    x_train, x_test, y_train, y_test = train_test_split(
+        texts, labels, test_size=args.holdout, random_state=args.seed
+    )
+    pipeline = build_pipeline().fit(x_train, y_train)
+    gold = np.array(y_test)
+
+    backend = load_backend(args.backend, args.model_dir)
+    started = time.perf_counter()
+    transformer = []
+    for i in range(0, len(x_test), 32):
+        transformer.extend(r["label"] for r in backend.predict(x_test[i:i + 32]))
+    transformer_seconds = time.perf_counter() - started
+    transformer = np.array(transformer)
+
+    started = time.perf_counter()
+    probs = pipeline.predict_proba(x_test)
+    tfidf_seconds = time.perf_counter() - started
+    tfidf_labels = pipeline.classes_[probs.argmax(axis=1)]
+    tfidf_conf = probs.max(axis=1)
+
+    print(f"📊 Held-out rows: {len(x_test)} (DistilBERT may have seen them in training)")
+    print(f"   DistilBERT accuracy: {(transformer == gold).mean():.2%} in {transformer_seconds:.2f}s")
+    print(f"   TF-IDF accuracy:     {(tfidf_labels == gold).mean():.2%} in {tfidf_seconds:.3f}s\n")
+    print(f"   {'threshold':>9} {'tier-1 %':>9} {'agree w/ BERT':>14} {'cascade acc':>12} {'est. CPU':>9}")
+
+    for threshold in args.thresholds:
+        resolved = tfidf_conf >= threshold
+        cascade = np.where(resolved, tfidf_labels, transformer)
+        cpu = tfidf_seconds + transformer_seconds * (1 - resolved.mean())
+        print(
+            f"   {threshold:>9.2f} {resolved.mean():>9.1%} {(cascade == transformer).mean():>14.1%} "
+            f"{(cascade == gold).mean():>12.1%} {cpu / transformer_seconds:>8.0%}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TF-IDF cascade tier")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    for name in ("train", "evaluate"):
+        p = sub.add_parser(name)
+        p.add_argument("--data", default="pharma_mentions.csv")
+        p.add_argument("--holdout", type=float, default=0.2)
+        p.add_argument("--seed", type=int, default=42)
+
+    sub.choices["train"].add_argument("--output", default=DEFAULT_PATH)
+
+    ev = sub.choices["evaluate"]
+    ev.add_argument("--model-dir", default="pharma_model")
+    ev.add_argument("--backend", default="torch")
+    ev.add_argument(
+        "--thresholds", default=[0.5, 0.6, 0.7, 0.8, 0.9],
+        type=lambda v: [float(t) for t in v.split(",")],
+    )
+
+    args = parser.parse_args()
+    if args.command == "train":
+        train(args)
+    else:
+        evaluate(args)
+
+
+if __name__ == "__main__":
+    main()
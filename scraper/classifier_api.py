@@ -1,39 +1,739 @@
-from fastapi import FastAPI
+import glob
+import hmac
+import json
+import os
+import random
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+from fastapi import Depends, FastAPI, Header, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel
-from transformers import DistilBertTokenizerFast, DistilBertForSequenceClassification
-import torch
 
-app = FastAPI(title="Pharma Text Classifier")
+from batcher import BatcherStoppedError, MicroBatcher, QueueFullError
+from cascade_model import CascadeTier
+from classifier_metrics import Counter, Gauge, Histogram, Registry, SamplingProfiler
+from inference_backend import load_backend, model_fingerprint
+from near_dup import NearDuplicateIndex, text_key
+from prediction_cache import PredictionCache
+
+# ------------------ Configuration ------------------
+MODEL_DIR = os.getenv("CLASSIFIER_MODEL_DIR", "pharma_model")
+# torch | torch-int8 | onnx | onnx-int8 (see inference_backend.py)
+INFERENCE_BACKEND = os.getenv("CLASSIFIER_BACKEND", "torch")
+TORCH_THREADS = int(os.getenv("CLASSIFIER_TORCH_THREADS", "0"))  # 0 keeps torch's default
+MAX_BATCH_SIZE = int(os.getenv("CLASSIFIER_MAX_BATCH_SIZE", "32"))
+MAX_WAIT_MS = float(os.getenv("CLASSIFIER_MAX_WAIT_MS", "10"))
+MAX_QUEUE_SIZE = int(os.getenv("CLASSIFIER_MAX_QUEUE_SIZE", "1024"))
+REQUEST_TIMEOUT = float(os.getenv("CLASSIFIER_REQUEST_TIMEOUT", "30"))
+CACHE_SIZE = int(os.getenv("CLASSIFIER_CACHE_SIZE", "10000"))  # 0 disables the cache
+CACHE_TTL = float(os.getenv("CLASSIFIER_CACHE_TTL", "86400"))
+CACHE_PATH = os.getenv("CLASSIFIER_CACHE_PATH")  # e.g. prediction_cache.sqlite
+# Poll MODEL_DIR and hot-swap in a new version when it changes (0 disables)
+WATCH_SECONDS = float(os.getenv("CLASSIFIER_WATCH_SECONDS", "30"))
+# TF-IDF first tier (see cascade_model.py); unset serves everything with DistilBERT
+CASCADE_MODEL = os.getenv("CLASSIFIER_CASCADE_MODEL")  # e.g. cascade_model.pkl
+CASCADE_THRESHOLD = float(os.getenv("CLASSIFIER_CASCADE_THRESHOLD", "0.8"))
+# Fraction of TF-IDF answers re-checked by DistilBERT in the background
+CASCADE_SHADOW_RATE = float(os.getenv("CLASSIFIER_CASCADE_SHADOW_RATE", "0.05"))
+# Near-duplicate index behind /dedupe (see near_dup.py); unset disables it
+NEAR_DUP_INDEX = os.getenv("CLASSIFIER_NEAR_DUP_INDEX")  # e.g. near_dup.sqlite
+# Relative to this directory, so it is the scraper's index whatever the cwd
+NEAR_DUP_INDEX = NEAR_DUP_INDEX and os.path.join(os.path.dirname(os.path.abspath(__file__)), NEAR_DUP_INDEX)
+NEAR_DUP_THRESHOLD = float(os.getenv("CLASSIFIER_NEAR_DUP_THRESHOLD", "0.7"))
+# Set by serve.py so each pre-forked worker can publish its own statistics
+STATS_DIR = os.getenv("CLASSIFIER_STATS_DIR")
+STATS_INTERVAL = float(os.getenv("CLASSIFIER_STATS_INTERVAL", "5"))
+# How long /classify waits for a loading model before answering 503; kept
+# short, every waiting request holds one of the threadpool's threads
+READY_TIMEOUT = float(os.getenv("CLASSIFIER_READY_TIMEOUT", "2"))
+# /admin/models/* need this value in an X-Admin-Token header; unset disables them
+ADMIN_TOKEN = os.getenv("CLASSIFIER_ADMIN_TOKEN")
+# /admin/models/load only loads MODEL_DIR or directories under this root
+MODELS_ROOT = os.getenv("CLASSIFIER_MODELS_ROOT", "model_versions")
+# Sequence lengths (in tokens) exercised before the service reports ready
+WARMUP_LENGTHS = [
+    int(n) for n in os.getenv("CLASSIFIER_WARMUP_LENGTHS", "16,64,128,256,512").split(",") if n
+]
+
+WORKER_ID = 0  # overwritten per worker by serve.py
+
+# ------------------ Model lifecycle ------------------
+class LoadedModel:
+    """A backend plus the version of the model directory it was loaded from"""
+
+    def __init__(self, model_dir):
+        started = time.perf_counter()
+        self.model_dir = model_dir
+        # Fingerprint first so files changing mid-load trigger another swap
+        self.version = model_fingerprint(model_dir)
+        self.backend = load_backend(INFERENCE_BACKEND, model_dir)
+        self.loaded_at = time.time()
+        self.load_seconds = round(time.perf_counter() - started, 3)
+
+    def describe(self):
+        return {
+            "model_dir": self.model_dir,
+            "version": self.version,
+            "backend": self.backend.name,
+            "loaded_at": self.loaded_at,
+            "load_seconds": self.load_seconds,
+        }
+
+
+current = None   # model serving traffic
+previous = None  # kept in memory for instant rollback
+cache = None
+cascade = None
+
+swap_lock = threading.Lock()
+swap_state = {"loading": None, "last_error": None, "swaps": 0}
+
+ready = threading.Event()
+startup_error = None
+timings = {
+    "load_seconds": None,
+    "warmup_seconds": None,
+    "first_inference_ms": None,
+}
+
+
+# ------------------ Metrics ------------------
+registry = Registry()
+STAGE_SECONDS = registry.register(Histogram(
+    "classifier_stage_seconds",
+    "Latency of each stage: parse, cascade, queue, tokenize, forward, postprocess, serialize",
+    label="stage",
+))
+REQUEST_SECONDS = registry.register(Histogram(
+    "classifier_request_seconds", "End-to-end request latency", label="endpoint"
+))
+INPUTS = registry.register(Counter("classifier_inputs_total", "Texts run through the model"))
+TOKENS = registry.register(Counter(
+    "classifier_tokens_total", "Tokens processed by the model, excluding padding"
+))
+TRUNCATED = registry.register(Counter(
+    "classifier_inputs_truncated_total", "Inputs cut off at the maximum sequence length"
+))
+
+profiler = SamplingProfiler(thread_prefixes=("classifier-batcher", "AnyIO worker"))
+
+
+def observe_stage(stage, seconds):
+    STAGE_SECONDS.observe(seconds, stage)
+
+
+def observe_tokens(token_counts, max_length):
+    INPUTS.inc(len(token_counts))
+    TOKENS.inc(int(token_counts.sum()))
+    TRUNCATED.inc(int((token_counts >= max_length).sum()))
+
+
+class NotReadyError(Exception):
+    """Raised when the model is still loading or warming up"""
+
+
+def cache_version():
+    """Everything that can change a prediction: the model and the cascade tier"""
+    version = current.version
+    if cascade is not None:
+        version += f"+{cascade.version}"
+    return version
+
+
+def cache_snapshot():
+    """The cache version and the model versions whose results belong to it"""
+    with swap_lock:
+        versions = {current.version}
+        if cascade is not None:
+            versions.add(f"tfidf-{cascade.version}")
+        return cache.model_version, versions
+
+
+def load_model():
+    """Load the backend, cascade tier and prediction cache once per process"""
+    global current, cache, cascade
+    if current is not None:
+        return
+
+    if TORCH_THREADS:
+        import torch
+        torch.set_num_threads(TORCH_THREADS)
+
+    current = LoadedModel(MODEL_DIR)
+    if CASCADE_MODEL:
+        cascade = CascadeTier(CASCADE_MODEL, threshold=CASCADE_THRESHOLD)
+        print(f"🪜 Cascade enabled: {CASCADE_MODEL} answers inputs with confidence >= {CASCADE_THRESHOLD}")
+    cache = PredictionCache(
+        cache_version(),
+        max_entries=CACHE_SIZE,
+        ttl_seconds=CACHE_TTL,
+        path=CACHE_PATH,
+    ) if CACHE_SIZE > 0 else None
+    timings["load_seconds"] = current.load_seconds
+
+    print(f"✅ Loaded {MODEL_DIR} ({current.version}) with the '{current.backend.name}' backend in {current.load_seconds}s")
+
+
+def warmup(backend):
+    """Run the representative sequence lengths through a model once"""
+    started = time.perf_counter()
+    for length in WARMUP_LENGTHS:
+        text = " ".join(["drug"] * max(1, length - 2))  # [CLS] + tokens + [SEP]
+        for batch_size in sorted({1, min(8, MAX_BATCH_SIZE)}):
+            backend.predict([text] * batch_size)
+    timings["warmup_seconds"] = round(time.perf_counter() - started, 3)
+
+    print(f"🔥 Warmed up on lengths {WARMUP_LENGTHS} in {timings['warmup_seconds']}s")
+
+
+def instrument(backend):
+    # Only real traffic is measured, so this happens after warmup
+    backend.on_stage = observe_stage
+    backend.on_tokens = observe_tokens
+
+
+def start_model():
+    global startup_error
+    try:
+        load_model()
+        warmup(current.backend)
+        instrument(current.backend)
+        ready.set()
+    except Exception as e:
+        startup_error = str(e)
+        print(f"❌ Classifier failed to start: {e}")
+        return
+
+    if WATCH_SECONDS > 0:
+        threading.Thread(target=watch_model_dir, name="model-watcher", daemon=True).start()
+
+
+def predict(texts):
+    model = current  # a swap during this batch doesn't affect it
+    results = model.backend.predict(texts)
+    for result in results:
+        result["model_version"] = model.version
+    return results
+
+
+# ------------------ Hot swap ------------------
+def activate(model):
+    global current, previous
+    with swap_lock:
+        previous, current = current, model
+        swap_state["swaps"] += 1
+        if cache is not None:
+            cache.set_model_version(cache_version())
+
+
+def load_and_swap(model_dir):
+    """Load, warm up and atomically activate a model; runs in the background"""
+    try:
+        model = LoadedModel(model_dir)
+        warmup(model.backend)
+        instrument(model.backend)
+        old_version = current.version
+        activate(model)
+        print(f"🔁 Swapped model {old_version} -> {model.version} ({model_dir})")
+    except Exception as e:
+        swap_state["last_error"] = f"{model_dir}: {e}"
+        print(f"❌ Failed to load {model_dir}, still serving {current.version}: {e}")
+    finally:
+        swap_state["loading"] = None
+
+
+def start_swap(model_dir):
+    with swap_lock:
+        if swap_state["loading"]:
+            return False
+        swap_state["loading"] = model_dir
+        swap_state["last_error"] = None
+
+    threading.Thread(
+        target=load_and_swap, args=(model_dir,), name="model-swap", daemon=True
+    ).start()
+    return True
+
+
+def rollback():
+    global current, previous
+    with swap_lock:
+        if previous is None:
+            return False
+        current, previous = previous, current
+        swap_state["swaps"] += 1
+        if cache is not None:
+            cache.set_model_version(cache_version())
+    print(f"⏪ Rolled back to model {current.version}")
+    return True
+
+
+def watch_model_dir():
+    """Hot-swap MODEL_DIR once its contents settle on a new version"""
+    watched = current.version
+    pending = None
+    while True:
+        time.sleep(WATCH_SECONDS)
+        try:
+            fingerprint = model_fingerprint(MODEL_DIR)
+        except OSError:
+            continue  # directory is being replaced
+
+        if fingerprint == watched:
+            pending = None
+            continue
+        # Require two identical readings so a half-written save isn't loaded
+        if fingerprint != pending:
+            pending = fingerprint
+            continue
+
+        if start_swap(MODEL_DIR):
+            print(f"👀 {MODEL_DIR} changed on disk, loading {fingerprint}")
+            watched = fingerprint
+            pending = None
+
+
+batcher = MicroBatcher(
+    predict,
+    max_batch_size=MAX_BATCH_SIZE,
+    max_wait_ms=MAX_WAIT_MS,
+    max_queue_size=MAX_QUEUE_SIZE,
+    on_queue_wait=lambda seconds: observe_stage("queue", seconds),
+)
+
+registry.register(Gauge(
+    "classifier_queue_depth", "Texts waiting for a batch slot",
+    lambda: batcher.stats()["queue_depth"],
+))
+registry.register(Gauge(
+    "classifier_cache_hits_total", "Prediction cache hits",
+    lambda: cache.hits if cache is not None else 0, metric_type="counter",
+))
+registry.register(Gauge(
+    "classifier_cache_misses_total", "Prediction cache misses",
+    lambda: cache.misses if cache is not None else 0, metric_type="counter",
+))
+
+registry.register(Gauge(
+    "classifier_cascade_tfidf_total", "Inputs resolved by the TF-IDF tier",
+    lambda: cascade_stats["tfidf"], metric_type="counter",
+))
+registry.register(Gauge(
+    "classifier_cascade_transformer_total", "Inputs passed on to DistilBERT by the cascade",
+    lambda: cascade_stats["transformer"], metric_type="counter",
+))
+
+def run_transformer(texts):
+    futures = batcher.submit_many(texts)
+    try:
+        return [f.result(timeout=REQUEST_TIMEOUT) for f in futures]
+    except TimeoutError:
+        for f in futures:
+            f.cancel()
+        raise
+
+
+# ------------------ Cascade ------------------
+cascade_stats = {"tfidf": 0, "transformer": 0, "shadow_checked": 0, "shadow_agreed": 0}
+_cascade_lock = threading.Lock()
+
+
+def record_shadow(tfidf_label, future):
+    if future.cancelled() or future.exception() is not None:
+        return
+    with _cascade_lock:
+        cascade_stats["shadow_checked"] += 1
+        cascade_stats["shadow_agreed"] += future.result()["label"] == tfidf_label
+
+
+def run_cascade(texts):
+    """Answer confident inputs with the TF-IDF tier and the rest with DistilBERT"""
+    started = time.perf_counter()
+    results = cascade.predict(texts)
+    observe_stage("cascade", time.perf_counter() - started)
+
+    hard = [i for i, r in enumerate(results) if r is None]
+    easy = len(texts) - len(hard)
+
+    for i, result in enumerate(results):
+        if result is None:
+            continue
+        result["tier"] = "tfidf"
+        result["model_version"] = f"tfidf-{cascade.version}"
+        # Sampled shadow check keeps a live estimate of cascade agreement
+        if random.random() < CASCADE_SHADOW_RATE:
+            try:
+                future = batcher.submit(texts[i])
+            except QueueFullError:
+                continue
+            future.add_done_callback(lambda f, label=result["label"]: record_shadow(label, f))
+
+    if hard:
+        for i, result in zip(hard, run_transformer([texts[i] for i in hard])):
+            results[i] = {**result, "tier": "transformer"}
+
+    with _cascade_lock:
+        cascade_stats["tfidf"] += easy
+        cascade_stats["transformer"] += len(hard)
+    return results
+
+
+def wait_ready():
+    """Wait briefly for the model; fail at once if it failed to start"""
+    deadline = time.monotonic() + READY_TIMEOUT
+    while not ready.is_set():
+        remaining = deadline - time.monotonic()
+        if startup_error or remaining <= 0:
+            raise NotReadyError(startup_error or "Model is still loading")
+        ready.wait(timeout=min(remaining, 0.1))
+
+
+def classify_texts(texts):
+    """Serve cached predictions and send only the misses to the batcher"""
+    wait_ready()
+
+    started = time.perf_counter()
+    results = [None] * len(texts)
+    misses = list(range(len(texts)))
+
+    if cache is not None:
+        version, serving = cache_snapshot()
+        misses = []
+        for i, text in enumerate(texts):
+            results[i] = cache.get(text)
+            if results[i] is None:
+                misses.append(i)
+
+    if not misses:
+        return results
 
-# ------------------ Load model ------------------
-model = DistilBertForSequenceClassification.from_pretrained("pharma_model")
-tokenizer = DistilBertTokenizerFast.from_pretrained("pharma_model")
+    miss_texts = [texts[i] for i in misses]
+    fresh = run_cascade(miss_texts) if cascade is not None else run_transformer(miss_texts)
 
-model.eval()  # inference mode
+    if cache is not None:
+        # A batch can still run on the model a swap just replaced; its
+        # results must not be cached under the new version
+        keep = [i for i, r in enumerate(fresh) if r.get("model_version") in serving]
+        cache.put_many([miss_texts[i] for i in keep], [fresh[i] for i in keep], model_version=version)
+
+    if timings["first_inference_ms"] is None:
+        timings["first_inference_ms"] = round(1000 * (time.perf_counter() - started), 2)
+
+    for i, result in zip(misses, fresh):
+        results[i] = result
+    return results
+
+
+# ------------------ Near-duplicates ------------------
+# Independent of the model, so it answers while the model is still loading.
+# Pre-forked workers share the SQLite file and see each other's entries.
+near_dups = (
+    NearDuplicateIndex(NEAR_DUP_INDEX, threshold=NEAR_DUP_THRESHOLD) if NEAR_DUP_INDEX else None
+)
+
+
+# ------------------ Worker statistics ------------------
+def process_memory():
+    """Resident and proportional set size in MB (PSS splits shared pages)"""
+    memory = {}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("Rss", "Pss", "Shared_Clean", "Shared_Dirty"):
+                    memory[key.lower() + "_mb"] = round(int(value.split()[0]) / 1024, 1)
+    except OSError:
+        import resource
+        memory["max_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return memory
+
+
+def worker_stats():
+    import torch
+
+    return {
+        "worker": WORKER_ID,
+        "pid": os.getpid(),
+        "torch_threads": torch.get_num_threads(),
+        "ready": ready.is_set(),
+        "model_version": current.version if current is not None else None,
+        "timings": timings,
+        "memory": process_memory(),
+        "batcher": batcher.stats(),
+        "cache": cache.stats() if cache is not None else None,
+    }
+
+
+def publish_worker_stats():
+    path = os.path.join(STATS_DIR, f"worker-{WORKER_ID}.json")
+    while True:
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(worker_stats(), f)
+        os.replace(tmp, path)
+        time.sleep(STATS_INTERVAL)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Loading happens off the event loop so /health answers immediately and
+    # /ready flips only once the model is loaded and warm
+    batcher.start()
+    threading.Thread(target=start_model, name="model-loader", daemon=True).start()
+    if STATS_DIR:
+        threading.Thread(
+            target=publish_worker_stats, name="stats-publisher", daemon=True
+        ).start()
+    yield
+    batcher.stop()
+
+
+app = FastAPI(title="Pharma Text Classifier", lifespan=lifespan)
 
 # ------------------ Request schema ------------------
 class TextInput(BaseModel):
     text: str
 
-# ------------------ Endpoint ------------------
+
+class BatchInput(BaseModel):
+    texts: List[str]
+
+# ------------------ Endpoints ------------------
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    request.state.received_at = time.perf_counter()
+    response = await call_next(request)
+
+    if request.url.path.startswith("/classify") and request.method == "POST":
+        REQUEST_SECONDS.observe(time.perf_counter() - request.state.received_at, request.url.path)
+        profiler.request_done()
+    return response
+
+
+def run_classification(texts, request):
+    observe_stage("parse", time.perf_counter() - request.state.received_at)
+    try:
+        return classify_texts(texts)
+    except (QueueFullError, BatcherStoppedError) as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except NotReadyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except TimeoutError:
+        raise HTTPException(status_code=504, detail="Classification timed out")
+
+
+def serialize(content):
+    started = time.perf_counter()
+    response = JSONResponse(content)
+    observe_stage("serialize", time.perf_counter() - started)
+    return response
+
+
 @app.post("/classify")
-def classify(payload: TextInput):
-    inputs = tokenizer(
-        payload.text,
-        return_tensors="pt",
-        truncation=True
-    )
+def classify(payload: TextInput, request: Request):
+    return serialize(run_classification([payload.text], request)[0])
+
+
+@app.post("/classify/batch")
+def classify_batch(payload: BatchInput, request: Request):
+    # More texts than the queue holds would be rejected on every retry
+    if len(payload.texts) > MAX_QUEUE_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch of {len(payload.texts)} texts exceeds the limit of {MAX_QUEUE_SIZE}",
+        )
+    return serialize({"results": run_classification(payload.texts, request)})
+
+
+# Probes are async so they never queue behind requests holding the threadpool
+@app.get("/health")
+async def health():
+    """Liveness: the process is up, whether or not the model is loaded"""
+    return {"status": "alive", "pid": os.getpid()}
+
+
+@app.get("/ready")
+async def readiness():
+    """Readiness: the model is loaded and warmed up"""
+    body = {
+        "ready": ready.is_set(),
+        "backend": INFERENCE_BACKEND,
+        "model_version": current.version if current is not None else None,
+        "timings": timings,
+    }
+    if startup_error:
+        body["error"] = startup_error
+    return JSONResponse(body, status_code=200 if ready.is_set() else 503)
+
+
+@app.get("/classify/stats")
+def classify_stats():
+    """Per-batch fill statistics for tuning throughput vs latency"""
+    return {"worker": WORKER_ID, "pid": os.getpid(), **batcher.stats()}
+
 
-    with torch.no_grad():
-        outputs = model(**inputs)
+@app.get("/workers")
+def workers():
+    """Latest statistics published by every worker of a serve.py pool"""
+    if not STATS_DIR:
+        return {"workers": [worker_stats()]}
 
-    probs = torch.softmax(outputs.logits, dim=1)
-    pred_id = torch.argmax(probs, dim=1).item()
+    stats = []
+    for path in sorted(glob.glob(os.path.join(STATS_DIR, "worker-*.json"))):
+        with open(path) as f:
+            stats.append(json.load(f))
+    return {"workers": stats}
 
-    label = model.config.id2label[pred_id]
-    confidence = probs[0][pred_id].item()
 
+@app.get("/cache/stats")
+def cache_stats():
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+
+class ModelLoadInput(BaseModel):
+    model_dir: str = MODEL_DIR
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (CLASSIFIER_ADMIN_TOKEN is not set)")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Missing or wrong X-Admin-Token")
+
+
+def allowed_model_dir(model_dir):
+    """Resolved path of MODEL_DIR or a directory under MODELS_ROOT, else None"""
+    path = os.path.realpath(model_dir)
+    root = os.path.realpath(MODELS_ROOT)
+    if path == os.path.realpath(MODEL_DIR):
+        return path
+    if path != root and os.path.commonpath([path, root]) == root:
+        return path
+    return None
+
+
+@app.get("/admin/models", dependencies=[Depends(require_admin)])
+def models():
+    """Serving and rollback models plus the state of any background load"""
+    return {
+        "current": current.describe() if current is not None else None,
+        "previous": previous.describe() if previous is not None else None,
+        **swap_state,
+    }
+
+
+@app.post("/admin/models/load", status_code=202, dependencies=[Depends(require_admin)])
+def load_new_model(payload: ModelLoadInput):
+    """Load, warm up and swap in a model directory without downtime"""
+    if not ready.is_set():
+        raise HTTPException(status_code=503, detail="Initial model is still loading")
+    model_dir = allowed_model_dir(payload.model_dir)
+    if model_dir is None:
+        raise HTTPException(status_code=403, detail=f"{payload.model_dir} is not under {MODELS_ROOT}")
+    if not os.path.isdir(model_dir):
+        raise HTTPException(status_code=404, detail=f"{payload.model_dir} is not a directory")
+    if not start_swap(model_dir):
+        raise HTTPException(status_code=409, detail=f"Already loading {swap_state['loading']}")
+    return {"loading": payload.model_dir, "current": current.version}
+
+
+@app.post("/admin/models/rollback", dependencies=[Depends(require_admin)])
+def rollback_model():
+    if not rollback():
+        raise HTTPException(status_code=409, detail="No previous model to roll back to")
+    return models()
+
+
+class DedupeInput(BaseModel):
+    text: str
+    key: Optional[str] = None  # defaults to a hash of the text
+
+
+@app.post("/dedupe")
+def dedupe(payload: DedupeInput):
+    """
+    Check a text against earlier ones before classifying it. Nothing is
+    recorded: callers POST /dedupe/record once the item is stored, so an
+    item whose classification or save fails is not a duplicate next time.
+    """
+    if near_dups is None:
+        return {"enabled": False, "duplicate": False}
+
+    key = payload.key or text_key(payload.text)
+    match = near_dups.check(key, payload.text, add=False)
+    if match is None:
+        return {"enabled": True, "duplicate": False, "key": key}
+    return {
+        "enabled": True,
+        "duplicate": True,
+        "key": key,
+        "duplicate_of": match[0],
+        "similarity": match[1],
+    }
+
+
+@app.post("/dedupe/record")
+def dedupe_record(payload: DedupeInput):
+    """Record a stored text, so later near-duplicates of it are reported"""
+    if near_dups is None:
+        return {"enabled": False, "recorded": False}
+
+    key = payload.key or text_key(payload.text)
+    near_dups.add(key, payload.text)
+    near_dups.commit()
+    return {"enabled": True, "recorded": True, "key": key}
+
+
+@app.get("/dedupe/stats")
+def dedupe_stats():
+    if near_dups is None:
+        return {"enabled": False}
+    return {"enabled": True, **near_dups.stats()}
+
+
+@app.get("/cascade/stats")
+def cascade_report():
+    """Share of inputs each tier resolved and live agreement with DistilBERT"""
+    if cascade is None:
+        return {"enabled": False}
+
+    with _cascade_lock:
+        stats = dict(cascade_stats)
+    total = stats["tfidf"] + stats["transformer"]
     return {
-        "label": label,
-        "confidence": round(confidence, 3)
+        "enabled": True,
+        "threshold": CASCADE_THRESHOLD,
+        "shadow_rate": CASCADE_SHADOW_RATE,
+        **stats,
+        "tfidf_fraction": round(stats["tfidf"] / total, 3) if total else 0.0,
+        "transformer_fraction": round(stats["transformer"] / total, 3) if total else 0.0,
+        "shadow_agreement": round(
+            stats["shadow_agreed"] / stats["shadow_checked"], 3
+        ) if stats["shadow_checked"] else None,
     }
+
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus text exposition of the per-stage metrics"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.post("/debug/profile")
+def start_profile(requests: int = 100, interval_ms: float = 5):
+    """Sample inference stacks for the next ``requests`` classify calls"""
+    if not profiler.enable(requests=requests, interval_ms=interval_ms):
+        raise HTTPException(status_code=409, detail="Profiler is already running")
+    return profiler.report()
+
+
+@app.get("/debug/profile")
+def profile_report(top: int = 20, folded: bool = False):
+    if folded:
+        return PlainTextResponse(profiler.folded())
+    return profiler.report(top=top)
@@ -0,0 +1,216 @@
+"""
+Per-stage inference metrics in Prometheus text format, plus an on-demand
+sampling profiler.
+
+Stages: parse, cascade, queue, tokenize, forward, postprocess, serialize.
+"""
+import sys
+import threading
+import time
+from collections import Counter as TallyCounter
+from contextlib import contextmanager
+
+# Seconds; spans sub-millisecond tokenization up to slow long-sequence batches
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS, label=None):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.label = label
+        self._series = {}  # label value -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, label_value=None):
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, label_value=None):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, label_value)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_value, (counts, total, count) in sorted(self._series.items(), key=lambda s: str(s[0])):
+                base = {self.label: label_value} if self.label else {}
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_format_labels({**base, 'le': bound})} {bucket_count}")
+                lines.append(f"{self.name}_bucket{_format_labels({**base, 'le': '+Inf'})} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(base)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(base)} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def render(self):
+        return [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} counter",
+            f"{self.name} {self.value}",
+        ]
+
+
+class Gauge:
+    """Value read from a callback at scrape time"""
+
+    def __init__(self, name, help_text, read, metric_type="gauge"):
+        self.name = name
+        self.help = help_text
+        self.read = read
+        self.metric_type = metric_type
+
+    def render(self):
+        return [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} {self.metric_type}",
+            f"{self.name} {self.read()}",
+        ]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# ------------------ Sampling profiler ------------------
+# Leaf frames of threads parked waiting for work
+IDLE_FRAMES = {"threading.py:wait", "queue.py:get"}
+
+
+class SamplingProfiler:
+    """
+    Periodically samples the Python stacks of the selected threads.
+
+    Enabled for a bounded number of requests; results are folded stacks
+    ("frame;frame;frame count") that flamegraph tools read directly.
+    """
+
+    def __init__(self, thread_prefixes=("",)):
+        """
+        Args:
+            thread_prefixes: Only threads whose names start with one of
+                these are sampled (the default samples every thread)
+        """
+        self.thread_prefixes = tuple(thread_prefixes)
+        self._lock = threading.Lock()
+        self._remaining = 0
+        self._interval = 0.005
+        self._thread = None
+        self.samples = TallyCounter()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def active(self):
+        return self._remaining > 0
+
+    def enable(self, requests=100, interval_ms=5):
+        with self._lock:
+            if self.active:
+                return False
+            self._remaining = requests
+            self._interval = interval_ms / 1000.0
+            self.samples = TallyCounter()
+            self.started_at = time.time()
+            self.finished_at = None
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+            return True
+
+    def request_done(self):
+        with self._lock:
+            if not self.active:
+                return
+            self._remaining -= 1
+            if self._remaining <= 0:
+                self.finished_at = time.time()
+
+    def _run(self):
+        me = threading.current_thread()
+        # a quick disable/enable starts a new sampler; this one then stops
+        while self.active and self._thread is me:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            stacks = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me.ident or not names.get(thread_id, "").startswith(self.thread_prefixes):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_name}")
+                    frame = frame.f_back
+                if stack and stack[0] not in IDLE_FRAMES:
+                    stacks.append(";".join(reversed(stack)))
+            with self._lock:
+                if self._thread is me:
+                    self.samples.update(stacks)
+            time.sleep(self._interval)
+
+    def _snapshot(self):
+        with self._lock:
+            return dict(self.samples), {
+                "active": self.active,
+                "remaining_requests": max(self._remaining, 0),
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+            }
+
+    def report(self, top=20):
+        samples, state = self._snapshot()
+        own = TallyCounter()
+        for stack, count in samples.items():
+            own[stack.rsplit(";", 1)[-1]] += count
+
+        return {
+            **state,
+            "total_samples": sum(samples.values()),
+            "top_functions": [
+                {"frame": frame, "samples": count} for frame, count in own.most_common(top)
+            ],
+        }
+
+    def folded(self):
+        samples, _ = self._snapshot()
+        return "\n".join(f"{stack} {count}" for stack, count in TallyCounter(samples).most_common()) + "\n"
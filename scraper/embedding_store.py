@@ -0,0 +1,424 @@
+"""
+Frozen-encoder embedding store and head-only training.
+
+Each text's pooled DistilBERT embedding (the [CLS] hidden state the
+classification head reads) is computed once and kept in a float16 matrix
+memory-mapped from disk, keyed by a hash of the normalized text. Training a
+new head or re-scoring the whole history with it then never touches the
+encoder again.
+
+The store is tied to the encoder it was built with; fully retraining the
+model (train_model.py) changes the encoder and needs a fresh store.
+train-head records the encoder next to the head it saves (head.json), and
+rescore refuses a head whose encoder is not the store's.
+
+Usage:
+    python embedding_store.py embed pharma_mentions.csv
+    python embedding_store.py train-head --data pharma_mentions.csv --output-dir model_versions/head-0001
+    python embedding_store.py rescore events.jsonl --head model_versions/head-0001 --output rescored.jsonl
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+import numpy as np
+import torch
+from transformers import (
+    DistilBertConfig,
+    DistilBertForSequenceClassification,
+    DistilBertModel,
+    DistilBertTokenizerFast
+)
+
+from inference_backend import MAX_SEQUENCE_LENGTH, model_fingerprint, softmax
+from prediction_cache import normalize_text
+
+DEFAULT_STORE = "embeddings"
+INITIAL_CAPACITY = 4096
+HEAD_META = "head.json"  # written next to a train-head model: the encoder its head was fit on
+
+
+def content_key(text):
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def encoder_fingerprint(encoder_dir):
+    """
+    Hash of the encoder weights. A copied or re-saved model keeps its store,
+    and a head trained by train-head (same encoder) can score from it.
+    """
+    model = DistilBertModel.from_pretrained(encoder_dir)
+    digest = hashlib.sha1()
+    for name, tensor in sorted(model.state_dict().items()):
+        digest.update(name.encode("utf-8"))
+        digest.update(tensor.cpu().numpy().tobytes())
+    return digest.hexdigest()[:12]
+
+
+# ------------------ Store ------------------
+class EmbeddingStore:
+    """
+    Append-only float16 matrix + SQLite index of content hash -> row.
+
+    Layout of ``path``: meta.json, vectors.f16 (capacity x dim), index.sqlite
+    """
+
+    def __init__(self, path=DEFAULT_STORE, encoder_dir=None):
+        """
+        Args:
+            path: Store directory (created if missing)
+            encoder_dir: Model whose encoder produces the vectors; its weights
+                are checked against the hash recorded when the store was created
+        """
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._meta_path = os.path.join(path, "meta.json")
+        self._vectors_path = os.path.join(path, "vectors.f16")
+
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path) as f:
+                self.meta = json.load(f)
+            weights = encoder_fingerprint(encoder_dir) if encoder_dir else None
+            if weights and "encoder_weights" not in self.meta:
+                # stores created before weights were hashed: adopt the hash if the files are unchanged
+                if self.meta.get("encoder_fingerprint") == model_fingerprint(encoder_dir):
+                    self.meta["encoder_weights"] = weights
+            if weights and self.meta.get("encoder_weights") != weights:
+                raise RuntimeError(
+                    f"{path} was built with a different encoder ({self.meta['encoder_dir']}); "
+                    f"use a new store for {encoder_dir}"
+                )
+        else:
+            if not encoder_dir:
+                raise FileNotFoundError(f"No embedding store at {path}")
+            self.meta = {
+                "dim": DistilBertConfig.from_pretrained(encoder_dir).dim,
+                "count": 0,
+                "capacity": 0,
+                "encoder_dir": encoder_dir,
+                "encoder_weights": encoder_fingerprint(encoder_dir),
+            }
+
+        self.dim = self.meta["dim"]
+        self.db = sqlite3.connect(os.path.join(path, "index.sqlite"))
+        self.db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, row INTEGER NOT NULL)")
+        self.vectors = None
+        self._reserve(max(self.meta["capacity"], INITIAL_CAPACITY))
+
+    def __len__(self):
+        return self.meta["count"]
+
+    def _reserve(self, capacity):
+        if self.vectors is not None and capacity <= self.meta["capacity"]:
+            return
+        if self.vectors is not None:
+            self.vectors.flush()
+            self.vectors = None
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(capacity * self.dim * 2)
+        self.vectors = np.memmap(self._vectors_path, dtype=np.float16, mode="r+", shape=(capacity, self.dim))
+        self.meta["capacity"] = capacity
+
+    def rows(self, keys):
+        """Row index per key, -1 where the key isn't stored"""
+        found = {}
+        unique = list(set(keys))
+        for start in range(0, len(unique), 900):  # SQLite parameter limit
+            part = unique[start:start + 900]
+            found.update(self.db.execute(
+                f"SELECT key, row FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+            ).fetchall())
+        return np.array([found.get(k, -1) for k in keys], dtype=np.int64)
+
+    def add(self, keys, vectors):
+        count = self.meta["count"]
+        needed = count + len(keys)
+        if needed > self.meta["capacity"]:
+            self._reserve(max(needed, self.meta["capacity"] * 2))
+
+        self.vectors[count:needed] = vectors.astype(np.float16)
+        self.db.executemany(
+            "INSERT OR IGNORE INTO embeddings (key, row) VALUES (?, ?)",
+            zip(keys, range(count, needed)),
+        )
+        self.meta["count"] = needed
+
+    def get(self, rows):
+        return np.asarray(self.vectors[rows], dtype=np.float32)
+
+    def flush(self):
+        self.vectors.flush()
+        self.db.commit()
+        with open(self._meta_path, "w") as f:
+            json.dump(self.meta, f, indent=2)
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+
+# ------------------ Encoder ------------------
+class Encoder:
+    def __init__(self, model_dir):
+        self.tokenizer = DistilBertTokenizerFast.from_pretrained(model_dir)
+        self.model = DistilBertModel.from_pretrained(model_dir)
+        self.model.eval()
+
+    def embed(self, texts, batch_size=64):
+        """[CLS] hidden states, length-sorted so batches pad only to their longest"""
+        encoded = self.tokenizer(texts, truncation=True, max_length=MAX_SEQUENCE_LENGTH)
+        order = sorted(range(len(texts)), key=lambda i: len(encoded["input_ids"][i]))
+
+        out = np.empty((len(texts), self.model.config.dim), dtype=np.float32)
+        for start in range(0, len(order), batch_size):
+            idx = order[start:start + batch_size]
+            batch = self.tokenizer.pad(
+                {
+                    "input_ids": [encoded["input_ids"][i] for i in idx],
+                    "attention_mask": [encoded["attention_mask"][i] for i in idx],
+                },
+                return_tensors="pt",
+            )
+            with torch.no_grad():
+                hidden = self.model(**batch).last_hidden_state
+            out[idx] = hidden[:, 0].numpy()
+        return out
+
+
+def ensure_embeddings(store, encoder, texts, batch_size=64):
+    """Encode texts missing from the store; return their row indices"""
+    keys = [content_key(t) for t in texts]
+    rows = store.rows(keys)
+
+    missing = {}
+    for key, text, row in zip(keys, texts, rows):
+        if row < 0 and key not in missing:
+            missing[key] = text
+
+    if missing:
+        started = time.perf_counter()
+        store.add(list(missing), encoder.embed(list(missing.values()), batch_size))
+        store.flush()
+        print(f"🧮 Encoded {len(missing)} new texts in {time.perf_counter() - started:.1f}s")
+        rows = store.rows(keys)
+    return rows
+
+
+# ------------------ Head ------------------
+class ClassificationHead(torch.nn.Module):
+    """Same layers as DistilBertForSequenceClassification on top of [CLS]"""
+
+    def __init__(self, dim, num_labels, dropout=0.2):
+        super().__init__()
+        self.pre_classifier = torch.nn.Linear(dim, dim)
+        self.dropout = torch.nn.Dropout(dropout)
+        self.classifier = torch.nn.Linear(dim, num_labels)
+
+    def forward(self, pooled):
+        hidden = torch.relu(self.pre_classifier(pooled))
+        return self.classifier(self.dropout(hidden))
+
+
+def load_head(model_dir):
+    model = DistilBertForSequenceClassification.from_pretrained(model_dir)
+    head = ClassificationHead(model.config.dim, model.config.num_labels)
+    head.pre_classifier.load_state_dict(model.pre_classifier.state_dict())
+    head.classifier.load_state_dict(model.classifier.state_dict())
+    head.eval()
+    return head, model.config.id2label
+
+
+def check_head_encoder(model_dir, store):
+    """Refuse to score with a head fit on another encoder's vectors"""
+    try:
+        with open(os.path.join(model_dir, HEAD_META)) as f:
+            weights = json.load(f)["encoder_weights"]
+    except (FileNotFoundError, KeyError, json.JSONDecodeError):
+        raise RuntimeError(f"{model_dir} has no {HEAD_META}; rescore only runs with heads from train-head")
+    if weights != store.meta.get("encoder_weights"):
+        raise RuntimeError(
+            f"The head in {model_dir} was fit on encoder {weights}, "
+            f"but {store.path} holds vectors of encoder {store.meta.get('encoder_weights')}"
+        )
+
+
+def score(head, vectors, batch_size=4096):
+    with torch.no_grad():
+        logits = np.concatenate([
+            head(torch.from_numpy(vectors[i:i + batch_size])).numpy()
+            for i in range(0, len(vectors), batch_size)
+        ])
+    return softmax(logits)
+
+
+def fit_head(vectors, label_ids, num_labels, epochs, lr, seed):
+    torch.manual_seed(seed)
+    head = ClassificationHead(vectors.shape[1], num_labels)
+    optimizer = torch.optim.AdamW(head.parameters(), lr=lr)
+    x = torch.from_numpy(vectors)
+    y = torch.from_numpy(label_ids)
+
+    head.train()
+    for _ in range(epochs):
+        for idx in torch.randperm(len(x)).split(64):
+            optimizer.zero_grad()
+            loss = torch.nn.functional.cross_entropy(head(x[idx]), y[idx])
+            loss.backward()
+            optimizer.step()
+    head.eval()
+    return head
+
+
+# ------------------ Commands ------------------
+def read_texts(path, text_column="text"):
+    from bulk_classify import read_rows
+
+    return [r for r in read_rows(path) if (r.get(text_column) or "").strip()]
+
+
+def embed(args):
+    store = EmbeddingStore(args.store, args.encoder_dir)
+    rows = read_texts(args.input, args.text_column)
+    ensure_embeddings(store, Encoder(args.encoder_dir), [r[args.text_column] for r in rows], args.batch_size)
+    store.close()
+    print(f"✅ {args.store} holds {len(store)} embeddings")
+
+
+def train_head(args):
+    rows = [r for r in read_texts(args.data) if r.get("label")]
+    texts = [r["text"] for r in rows]
+    labels = sorted({r["label"] for r in rows})
+    label2id = {l: i for i, l in enumerate(labels)}
+    label_ids = np.array([label2id[r["label"]] for r in rows], dtype=np.int64)
+
+    store = EmbeddingStore(args.store, args.encoder_dir)
+    vectors = store.get(ensure_embeddings(store, Encoder(args.encoder_dir), texts, args.batch_size))
+    store.close()
+    encoder_weights = store.meta["encoder_weights"]
+
+    rng = np.random.default_rng(args.seed)
+    order = rng.permutation(len(rows))
+    cut = int(len(rows) * (1 - args.holdout))
+    train_idx, test_idx = order[:cut], order[cut:]
+
+    started = time.perf_counter()
+    head = fit_head(vectors[train_idx], label_ids[train_idx], len(labels), args.epochs, args.lr, args.seed)
+    print(f"📊 Head fit on {len(train_idx)} rows in {time.perf_counter() - started:.2f}s")
+    if len(test_idx):
+        accuracy = (score(head, vectors[test_idx]).argmax(axis=1) == label_ids[test_idx]).mean()
+        print(f"   Holdout accuracy: {accuracy:.2%}")
+
+    started = time.perf_counter()
+    head = fit_head(vectors, label_ids, len(labels), args.epochs, args.lr, args.seed)
+    print(f"📊 Final head fit on {len(rows)} rows in {time.perf_counter() - started:.2f}s")
+
+    # Full model directory (stored encoder + new head) so it can be served as-is
+    model = DistilBertForSequenceClassification.from_pretrained(
+        args.encoder_dir,
+        num_labels=len(labels),
+        id2label={i: l for l, i in label2id.items()},
+        label2id=label2id,
+        ignore_mismatched_sizes=True,
+    )
+    model.pre_classifier.load_state_dict(head.pre_classifier.state_dict())
+    model.classifier.load_state_dict(head.classifier.state_dict())
+    model.save_pretrained(args.output_dir)
+    DistilBertTokenizerFast.from_pretrained(args.encoder_dir).save_pretrained(args.output_dir)
+    with open(os.path.join(args.output_dir, HEAD_META), "w") as f:
+        json.dump({"encoder_dir": args.encoder_dir, "encoder_weights": encoder_weights}, f, indent=2)
+    print(f"✅ Saved {args.output_dir}")
+
+
+def rescore(args):
+    from bulk_classify import FileSink, MongoSink, read_chunks
+
+    head, id2label = load_head(args.head)
+    store = EmbeddingStore(args.store, args.encoder_dir)
+    try:
+        check_head_encoder(args.head, store)
+    except RuntimeError:
+        store.close()
+        raise
+    encoder = None
+    # MongoSink maps labels to the backend's categories
+    sink = (
+        MongoSink(args.mongo_uri, args.db, args.collection, upsert=False)
+        if args.mongo_uri else FileSink(args.output)
+    )
+
+    total = 0
+    started = time.perf_counter()
+    try:
+        for chunk in read_chunks(args.input, args.chunk_size):
+            rows = [r for r in chunk if (r.get(args.text_column) or "").strip()]
+            if not rows:
+                continue
+            texts = [r[args.text_column] for r in rows]
+
+            row_ids = store.rows([content_key(t) for t in texts])
+            if (row_ids < 0).any():
+                encoder = encoder or Encoder(args.encoder_dir)
+                row_ids = ensure_embeddings(store, encoder, texts, args.batch_size)
+
+            probs = score(head, store.get(row_ids))
+            for row, p in zip(rows, probs):
+                if args.text_column != "text":
+                    row["text"] = row.pop(args.text_column)
+                row["label"] = id2label[int(p.argmax())]
+                row["confidence"] = round(float(p.max()), 3)
+
+            sink.write(rows)
+            total += len(rows)
+    finally:
+        sink.close()
+        store.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"✅ Re-scored {total} rows in {elapsed:.1f}s ({total / max(elapsed, 1e-9):.1f} rows/s)")
+    if getattr(sink, "unmatched", 0):
+        print(f"⚠️ {sink.unmatched} rows matched no stored event and were not written")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding store and head-only training")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_embed = sub.add_parser("embed", help="Encode texts missing from the store")
+    p_embed.add_argument("input", help="CSV or JSONL file with a text column")
+    p_embed.add_argument("--text-column", default="text")
+
+    p_train = sub.add_parser("train-head", help="Train a new head on stored embeddings")
+    p_train.add_argument("--data", default="pharma_mentions.csv")
+    p_train.add_argument("--output-dir", required=True)
+    p_train.add_argument("--epochs", type=int, default=20)
+    p_train.add_argument("--lr", type=float, default=1e-3)
+    p_train.add_argument("--holdout", type=float, default=0.2)
+    p_train.add_argument("--seed", type=int, default=42)
+
+    p_rescore = sub.add_parser("rescore", help="Classify a file from stored embeddings")
+    p_rescore.add_argument("input", help="CSV or JSONL file with a text column")
+    p_rescore.add_argument("--head", required=True, help="Model directory whose head is used")
+    p_rescore.add_argument("--output", help="Output .csv or .jsonl file")
+    p_rescore.add_argument("--mongo-uri", help="Update the labels of the stored events in MongoDB instead")
+    p_rescore.add_argument("--db", default="medithon", help="The backend's database")
+    p_rescore.add_argument("--collection", default="Event")
+    p_rescore.add_argument("--text-column", default="text")
+    p_rescore.add_argument("--chunk-size", type=int, default=8192)
+
+    for p in (p_embed, p_train, p_rescore):
+        p.add_argument("--store", default=DEFAULT_STORE)
+        p.add_argument("--encoder-dir", default="pharma_model")
+        p.add_argument("--batch-size", type=int, default=64)
+
+    args = parser.parse_args()
+    if args.command == "rescore" and bool(args.output) == bool(args.mongo_uri):
+        parser.error("pass exactly one of --output or --mongo-uri")
+
+    {"embed": embed, "train-head": train_head, "rescore": rescore}[args.command](args)
+
+
+if __name__ == "__main__":
+    main()
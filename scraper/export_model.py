@@ -0,0 +1,77 @@
+"""
+Export the fine-tuned classifier to ONNX for the onnx / onnx-int8 backends.
+
+Usage:
+    python export_model.py                        # pharma_model -> pharma_model/onnx/
+    python export_model.py --model-dir other_model --no-quantize
+"""
+import argparse
+import os
+
+import torch
+from transformers import DistilBertForSequenceClassification, DistilBertTokenizerFast
+
+from inference_backend import ONNX_FILES, ONNX_SUBDIR
+
+
+def export_onnx(model_dir, output_path, opset=17):
+    model = DistilBertForSequenceClassification.from_pretrained(model_dir)
+    tokenizer = DistilBertTokenizerFast.from_pretrained(model_dir)
+    model.eval()
+    model.config.return_dict = False
+
+    sample = tokenizer(
+        ["FDA approves new drug", "Phase 3 clinical trial results announced today"],
+        return_tensors="pt",
+        padding=True
+    )
+
+    torch.onnx.export(
+        model,
+        (sample["input_ids"], sample["attention_mask"]),
+        output_path,
+        input_names=["input_ids", "attention_mask"],
+        output_names=["logits"],
+        dynamic_axes={
+            "input_ids": {0: "batch", 1: "sequence"},
+            "attention_mask": {0: "batch", 1: "sequence"},
+            "logits": {0: "batch"},
+        },
+        opset_version=opset,
+        dynamo=False,
+    )
+
+
+def quantize_onnx(input_path, output_path):
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(input_path, output_path, weight_type=QuantType.QInt8)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export pharma_model to ONNX")
+    parser.add_argument("--model-dir", default="pharma_model")
+    parser.add_argument("--opset", type=int, default=17)
+    parser.add_argument(
+        "--no-quantize", action="store_true",
+        help="Skip writing the int8-quantized graph"
+    )
+    args = parser.parse_args()
+
+    out_dir = os.path.join(args.model_dir, ONNX_SUBDIR)
+    os.makedirs(out_dir, exist_ok=True)
+
+    fp32_path = os.path.join(out_dir, ONNX_FILES["onnx"])
+    print(f"📦 Exporting {args.model_dir} -> {fp32_path}")
+    export_onnx(args.model_dir, fp32_path, opset=args.opset)
+
+    if not args.no_quantize:
+        int8_path = os.path.join(out_dir, ONNX_FILES["onnx-int8"])
+        print(f"🗜️ Quantizing -> {int8_path}")
+        quantize_onnx(fp32_path, int8_path)
+
+    print("✅ Export complete. Verify with: python parity_check.py --backend onnx")
+
+
+if __name__ == "__main__":
+    main()
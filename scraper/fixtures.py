@@ -0,0 +1,281 @@
+"""
+Record/replay fixtures for the scraper sources and a local stand-in server.
+
+Every upstream host is mounted under a path prefix of one local aiohttp
+server, so https://newsapi.org/v2/everything is scraped as
+http://127.0.0.1:8799/newsapi.org/v2/everything. In record mode the server
+forwards each request upstream (under the scraper's own per-host rate
+limits) and saves the response under fixtures/<host>/; in replay mode it
+serves the saved responses with optional latency and error injection, so
+the scraper runs and can be benchmarked without network access.
+
+API keys never reach a fixture: they are dropped from the request
+parameters that key and describe a recording. Dates in parameters (the
+ClinicalTrials "since" filter moves with the day a run starts) are left out
+of the key, so a recording still replays on later days.
+
+Usage:
+    python fixtures.py record --dir fixtures
+    python fixtures.py serve --dir fixtures --port 8799 --latency 0.2 --error-rate 0.05
+    FIXTURE_SERVER=http://127.0.0.1:8799 python pharma_scraper.py
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import tempfile
+import time
+from collections import Counter
+from urllib.parse import parse_qsl, urlsplit
+
+from aiohttp import web
+
+SECRET_PARAMS = {"apiKey", "api_key", "email", "tool"}
+FORWARD_HEADERS = ("Accept", "Content-Type", "User-Agent")
+SAVED_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}")
+UPSTREAM_SCHEME = "https"
+# Scraper -> fixture server: no throttling, quick retries of injected errors
+FIXTURE_POLICY = {"rate": 1000, "burst": 1000, "retries": 3, "backoff": 0.05}
+
+
+def rewrite_urls(namespace, base):
+    """
+    Point a scraper module's ``*_URL`` constants at a fixture server.
+
+    ``namespace`` is the module's globals (``vars(pharma_scraper)``). The
+    server's host also gets FIXTURE_POLICY and a connection limit that
+    covers all upstream hosts it stands in for.
+    """
+    base = base.rstrip("/")
+    names = [
+        name for name, value in namespace.items()
+        if name.endswith("_URL") and isinstance(value, str) and value.startswith("http")
+        and not value.startswith(base)
+    ]
+    for name in names:
+        url = urlsplit(namespace[name])
+        namespace[name] = f"{base}/{url.netloc}{url.path}" + (f"?{url.query}" if url.query else "")
+
+    host = urlsplit(base).hostname
+    namespace["HOST_POLICIES"] = {**namespace.get("HOST_POLICIES", {}), host: FIXTURE_POLICY}
+    if "HTTP_LIMIT_PER_HOST" in namespace:
+        namespace["HTTP_LIMIT_PER_HOST"] *= max(1, len(names))
+    return names
+
+
+def fixture_key(method, host, path, params, body=b""):
+    params = [(k, DATE_PATTERN.sub("<date>", v)) for k, v in params]
+    raw = json.dumps([method, host, path, params, hashlib.sha1(body).hexdigest()])
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class FixtureServer:
+    def __init__(self, directory="fixtures", mode="replay", latency=0.0, jitter=0.0,
+                 error_rate=0.0, error_status=503, seed=0):
+        """
+        Args:
+            directory: Fixture root, one subdirectory per upstream host
+            mode: "record" (proxy upstream and save) or "replay"
+            latency: Seconds added before every replayed response
+            jitter: Extra random delay of up to this many seconds
+            error_rate: Share of replayed requests answered with error_status
+            error_status: Status of injected errors (a retryable 503 by default)
+            seed: Seed of the jitter and error injection
+        """
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown mode: {mode}")
+        self.directory = directory
+        self.mode = mode
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.rng = random.Random(seed)
+        self.stats = Counter()
+        self.client = None
+        self._fixtures = {}
+        self._runner = None
+
+    async def start(self, host="127.0.0.1", port=0):
+        """Start serving; returns the base URL to pass to rewrite_urls"""
+        if self.mode == "record":
+            import pharma_scraper
+            from http_utils import HttpClient
+
+            self.client = HttpClient(pharma_scraper.HOST_POLICIES, pharma_scraper.DEFAULT_POLICY)
+            await self.client.__aenter__()
+
+        app = web.Application(client_max_size=32 * 1024 ** 2)
+        app.router.add_route("*", "/{tail:.+}", self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+        if self.client is not None:
+            await self.client.__aexit__(None, None, None)
+
+    # ------------------ Storage ------------------
+    def _path(self, host, key):
+        return os.path.join(self.directory, host, f"{key}.json")
+
+    def load(self, host, key):
+        if (host, key) not in self._fixtures:
+            try:
+                with open(self._path(host, key), encoding="utf-8") as f:
+                    self._fixtures[host, key] = json.load(f)
+            except FileNotFoundError:
+                self._fixtures[host, key] = None
+        return self._fixtures[host, key]
+
+    def save(self, host, key, fixture):
+        path = self._path(host, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(fixture, f, indent=1)
+        os.replace(tmp, path)
+        self._fixtures[host, key] = fixture
+
+    # ------------------ Handler ------------------
+    async def handle(self, request):
+        host, _, path = request.match_info["tail"].partition("/")
+        body = await request.read()
+        form = []
+        if request.content_type == "application/x-www-form-urlencoded":
+            form, body = parse_qsl(body.decode("utf-8")), b""
+        params = sorted((k, v) for k, v in [*request.query.items(), *form] if k not in SECRET_PARAMS)
+        key = fixture_key(request.method, host, path, params, body)
+        self.stats["requests"] += 1
+
+        if self.mode == "record":
+            fixture = await self.record(request, host, path, params, key)
+        else:
+            fixture = self.load(host, key)
+            if fixture is None:
+                self.stats["misses"] += 1
+                print(f"⚠️ No fixture for {request.method} {host}/{path} {params}")
+                return web.json_response({"error": "no fixture recorded"}, status=404)
+
+            delay = self.latency + (self.rng.uniform(0, self.jitter) if self.jitter else 0)
+            if delay:
+                await asyncio.sleep(delay)
+            if self.error_rate and self.rng.random() < self.error_rate:
+                self.stats["injected_errors"] += 1
+                return web.Response(status=self.error_status)
+            self.stats["replayed"] += 1
+
+        headers = fixture["headers"]
+        if (
+            headers.get("ETag") and request.headers.get("If-None-Match") == headers["ETag"]
+            or headers.get("Last-Modified")
+            and request.headers.get("If-Modified-Since") == headers["Last-Modified"]
+        ):
+            self.stats["not_modified"] += 1
+            return web.Response(status=304, headers=headers)
+
+        return web.Response(
+            status=fixture["status"],
+            body=fixture["body"].encode("utf-8", "surrogateescape"),
+            headers=headers,
+        )
+
+    async def record(self, request, host, path, params, key):
+        url = f"{UPSTREAM_SCHEME}://{host}/{path}"
+        # Conditional headers are not forwarded: a recording needs the full body
+        headers = {h: request.headers[h] for h in FORWARD_HEADERS if h in request.headers}
+        async with self.client.request(
+            request.method, url, params=list(request.query.items()),
+            data=await request.read() or None, headers=headers,
+        ) as r:
+            fixture = {
+                "request": {"method": request.method, "url": url, "params": params},
+                "status": r.status,
+                "headers": {h: r.headers[h] for h in SAVED_HEADERS if h in r.headers},
+                "body": (await r.read()).decode("utf-8", "surrogateescape"),
+                "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            }
+
+        if r.status < 400:
+            self.save(host, key, fixture)
+            self.stats["recorded"] += 1
+        else:
+            print(f"⚠️ {host}/{path} answered {r.status}, not recorded")
+        return fixture
+
+
+# ------------------ Commands ------------------
+async def record(args):
+    import pharma_scraper
+    from scraper_state import ScraperState
+
+    server = FixtureServer(args.dir, mode="record")
+    base = await server.start(args.host, args.port)
+    rewrite_urls(vars(pharma_scraper), base)
+    # Fresh state and no dedupe, so every item is requested and recorded
+    pharma_scraper.NEAR_DUP_INDEX = ""
+    pharma_scraper.OUTPUT_FILE = os.path.join(args.dir, "recorded_mentions.csv")
+    if os.path.exists(pharma_scraper.OUTPUT_FILE):
+        os.remove(pharma_scraper.OUTPUT_FILE)
+
+    print(f"🎙️ Recording through {base} into {args.dir}/")
+    state = ScraperState(":memory:")
+    started = time.perf_counter()
+    try:
+        results, _ = await pharma_scraper.scrape_all(state)
+    finally:
+        state.close()
+        await server.stop()
+    pharma_scraper.report(results, time.perf_counter() - started, server.client.report())
+    print(f"💾 {server.stats['recorded']} responses recorded")
+
+
+async def serve(args):
+    server = FixtureServer(
+        args.dir, latency=args.latency, jitter=args.jitter,
+        error_rate=args.error_rate, error_status=args.error_status, seed=args.seed,
+    )
+    base = await server.start(args.host, args.port)
+    print(f"🚀 Replaying {args.dir}/ on {base}  (FIXTURE_SERVER={base} python pharma_scraper.py)")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+        print(f"📊 {dict(server.stats)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record/replay fixtures of the scraper sources")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_record = sub.add_parser("record", help="Run the scraper once against the live sources and save responses")
+    p_serve = sub.add_parser("serve", help="Serve recorded responses")
+    p_serve.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    p_serve.add_argument("--jitter", type=float, default=0.0, help="Extra random delay, up to this many seconds")
+    p_serve.add_argument("--error-rate", type=float, default=0.0, help="Share of responses replaced by errors")
+    p_serve.add_argument("--error-status", type=int, default=503)
+    p_serve.add_argument("--seed", type=int, default=0)
+
+    for p in (p_record, p_serve):
+        p.add_argument("--dir", default="fixtures")
+        p.add_argument("--host", default="127.0.0.1")
+        p.add_argument("--port", type=int, default=8799)
+
+    args = parser.parse_args()
+    try:
+        asyncio.run({"record": record, "serve": serve}[args.command](args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
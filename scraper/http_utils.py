@@ -0,0 +1,166 @@
+"""
+Shared helpers for the async scrapers: a token-bucket rate limiter and a
+pooled HTTP client with per-host rate limits and retry/backoff.
+"""
+import asyncio
+import random
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+import aiohttp
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Async rate limiter: ``rate`` requests per second with bursts of up to
+    ``capacity`` requests. Waiters are served in arrival order.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class HostPolicy:
+    def __init__(self, rate=5, burst=1, retries=3, backoff=0.5, max_backoff=30):
+        """
+        Args:
+            rate: Requests per second to this host
+            burst: Requests allowed back to back before the rate applies
+            retries: Extra attempts on connection errors and RETRY_STATUSES
+            backoff: First retry delay in seconds, doubled per attempt (with jitter)
+            max_backoff: Cap on a single delay, including Retry-After
+        """
+        self.limiter = TokenBucket(rate, burst)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def delay(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff)
+        return min(self.backoff * 2 ** attempt * random.uniform(0.5, 1.5), self.max_backoff)
+
+
+def retry_after_seconds(response):
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+class HttpClient:
+    """
+    One pooled keep-alive aiohttp session shared by every source.
+
+    Usage:
+        async with HttpClient({"newsapi.org": {"rate": 1}}) as client:
+            data = await client.json(url, params=...)
+            async with client.request("GET", url) as r:   # streaming
+                ...
+    """
+
+    def __init__(self, policies=None, default_policy=None, limit=32, limit_per_host=8, timeout=60):
+        self.policy_config = dict(policies or {})
+        self.default_policy = dict(default_policy or {})
+        self.policies = {}
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=10)
+        self.session = None
+        self.stats = defaultdict(
+            lambda: {
+                "requests": 0, "retries": 0, "failures": 0,
+                "limiter_wait_seconds": 0.0, "response_wait_seconds": 0.0,
+            }
+        )
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.limit, limit_per_host=self.limit_per_host, keepalive_timeout=30
+        )
+        self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    def policy(self, host):
+        if host not in self.policies:
+            self.policies[host] = HostPolicy(**self.policy_config.get(host, self.default_policy))
+        return self.policies[host]
+
+    @asynccontextmanager
+    async def request(self, method, url, **kwargs):
+        """Rate-limited request, retried until a response worth reading arrives"""
+        host = urlsplit(url).hostname
+        policy = self.policy(host)
+        stats = self.stats[host]
+
+        for attempt in range(policy.retries + 1):
+            started = time.perf_counter()
+            await policy.limiter.acquire()
+            stats["limiter_wait_seconds"] += time.perf_counter() - started
+            stats["requests"] += 1
+
+            sent = time.perf_counter()
+            try:
+                response = await self.session.request(method, url, **kwargs)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                stats["response_wait_seconds"] += time.perf_counter() - sent
+                if attempt == policy.retries:
+                    stats["failures"] += 1
+                    raise
+                delay = policy.delay(attempt)
+            else:
+                # Time to response headers; bodies are read by the caller
+                stats["response_wait_seconds"] += time.perf_counter() - sent
+                if response.status not in RETRY_STATUSES or attempt == policy.retries:
+                    try:
+                        yield response
+                    finally:
+                        response.release()
+                    return
+                delay = policy.delay(attempt, retry_after_seconds(response))
+                response.release()
+
+            stats["retries"] += 1
+            await asyncio.sleep(delay)
+
+    async def json(self, url, method="GET", **kwargs):
+        async with self.request(method, url, **kwargs) as r:
+            r.raise_for_status()
+            return await r.json(content_type=None)
+
+    async def text(self, url, method="GET", **kwargs):
+        async with self.request(method, url, **kwargs) as r:
+            r.raise_for_status()
+            return await r.text()
+
+    def report(self):
+        return {
+            host: {
+                **s,
+                "limiter_wait_seconds": round(s["limiter_wait_seconds"], 2),
+                "response_wait_seconds": round(s["response_wait_seconds"], 2),
+            }
+            for host, s in sorted(self.stats.items())
+        }
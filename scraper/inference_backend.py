@@ -0,0 +1,192 @@
+"""
+Pluggable CPU inference backends for the pharma classifier.
+
+    torch       eager PyTorch (reference)
+    torch-int8  PyTorch with dynamic int8 quantization of the Linear layers
+    onnx        exported ONNX graph run by onnxruntime
+    onnx-int8   int8-quantized ONNX graph run by onnxruntime
+
+The ONNX artifacts are produced by ``export_model.py`` and live next to the
+weights in ``<model_dir>/onnx/``.
+"""
+import hashlib
+import os
+import time
+
+import numpy as np
+import torch
+from transformers import (
+    DistilBertConfig,
+    DistilBertForSequenceClassification,
+    DistilBertTokenizerFast
+)
+
+BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+
+ONNX_SUBDIR = "onnx"
+ONNX_FILES = {
+    "onnx": "model.onnx",
+    "onnx-int8": "model.int8.onnx",
+}
+
+MAX_SEQUENCE_LENGTH = 512  # DistilBERT position embeddings
+
+
+def model_fingerprint(model_dir):
+    """
+    Short hash identifying the contents of a model directory.
+
+    Uses file names, sizes and modification times rather than reading the
+    weights, so it is cheap enough to poll.
+    """
+    digest = hashlib.sha1()
+    for root, dirs, files in os.walk(model_dir):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            st = os.stat(path)
+            rel = os.path.relpath(path, model_dir)
+            digest.update(f"{rel}:{st.st_size}:{st.st_mtime_ns};".encode())
+    return digest.hexdigest()[:12]
+
+
+def softmax(logits):
+    shifted = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+class InferenceBackend:
+    """Tokenizer + forward pass; subclasses only implement ``forward``"""
+
+    name = None
+    return_tensors = "pt"
+
+    # Optional instrumentation hooks, set by the serving layer
+    on_stage = None   # callable(stage, seconds)
+    on_tokens = None  # callable(token counts per input, max_length)
+
+    def __init__(self, model_dir):
+        self.model_dir = model_dir
+        self.tokenizer = DistilBertTokenizerFast.from_pretrained(model_dir)
+
+    def tokenize(self, texts):
+        return self.tokenizer(
+            texts,
+            return_tensors=self.return_tensors,
+            truncation=True,
+            max_length=MAX_SEQUENCE_LENGTH,
+            padding=True
+        )
+
+    def forward(self, inputs):
+        """Return logits as a numpy array of shape (batch, num_labels)"""
+        raise NotImplementedError
+
+    def _observe(self, stage, started):
+        if self.on_stage is not None:
+            self.on_stage(stage, time.perf_counter() - started)
+
+    def predict(self, texts):
+        """Classify a list of texts in one padded forward pass"""
+        started = time.perf_counter()
+        inputs = self.tokenize(texts)
+        self._observe("tokenize", started)
+
+        if self.on_tokens is not None:
+            self.on_tokens(np.asarray(inputs["attention_mask"]).sum(axis=1), MAX_SEQUENCE_LENGTH)
+
+        return self.predict_inputs(inputs)
+
+    def predict_inputs(self, inputs):
+        """Classify already-tokenized (and padded) inputs"""
+        started = time.perf_counter()
+        logits = self.forward(inputs)
+        self._observe("forward", started)
+
+        started = time.perf_counter()
+        probs = softmax(logits)
+        pred_ids = probs.argmax(axis=1)
+
+        results = [
+            {
+                "label": self.id2label[int(pred_id)],
+                "confidence": round(float(probs[i, pred_id]), 3)
+            }
+            for i, pred_id in enumerate(pred_ids)
+        ]
+        self._observe("postprocess", started)
+        return results
+
+
+class TorchBackend(InferenceBackend):
+    name = "torch"
+
+    def __init__(self, model_dir):
+        super().__init__(model_dir)
+        self.model = DistilBertForSequenceClassification.from_pretrained(model_dir)
+        self.model.eval()  # inference mode
+        self.id2label = self.model.config.id2label
+
+    def forward(self, inputs):
+        with torch.no_grad():
+            return self.model(**inputs).logits.numpy()
+
+
+class QuantizedTorchBackend(TorchBackend):
+    name = "torch-int8"
+
+    def __init__(self, model_dir):
+        super().__init__(model_dir)
+        self.model = torch.ao.quantization.quantize_dynamic(
+            self.model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+
+
+class OnnxBackend(InferenceBackend):
+    name = "onnx"
+    return_tensors = "np"
+
+    def __init__(self, model_dir, variant="onnx"):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise RuntimeError(
+                "onnxruntime is not installed (pip install onnxruntime)"
+            )
+
+        super().__init__(model_dir)
+        self.name = variant
+
+        path = os.path.join(model_dir, ONNX_SUBDIR, ONNX_FILES[variant])
+        if not os.path.exists(path):
+            raise FileNotFoundError(
+                f"{path} not found - run `python export_model.py --model-dir {model_dir}` first"
+            )
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            path, options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        config = DistilBertConfig.from_pretrained(model_dir)
+        self.id2label = config.id2label
+
+    def forward(self, inputs):
+        feed = {
+            k: v.astype(np.int64) for k, v in inputs.items() if k in self.input_names
+        }
+        return self.session.run(["logits"], feed)[0]
+
+
+def load_backend(name="torch", model_dir="pharma_model"):
+    """Instantiate one of ``BACKENDS`` for the given model directory"""
+    if name == "torch":
+        return TorchBackend(model_dir)
+    if name == "torch-int8":
+        return QuantizedTorchBackend(model_dir)
+    if name in ONNX_FILES:
+        return OnnxBackend(model_dir, variant=name)
+    raise ValueError(f"Unknown inference backend '{name}' (choose from {', '.join(BACKENDS)})")
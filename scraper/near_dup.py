@@ -0,0 +1,329 @@
+"""
+Near-duplicate detection with MinHash LSH over word shingles.
+
+The same press release reaches us through several feeds with small wording
+differences. Each text gets a MinHash signature over its word bigrams;
+signatures are split into LSH bands so a lookup only compares against the
+few documents sharing a band bucket, and candidates are confirmed by their
+estimated Jaccard similarity.
+
+The index is optionally persisted to SQLite (signatures only, the buckets
+are rebuilt on load), so the similarity threshold can change between runs.
+
+Usage:
+    python near_dup.py dedupe pharma_mentions.csv --output deduped.csv --threshold 0.7
+    python near_dup.py stats --index near_dup.sqlite
+"""
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+import numpy as np
+
+NUM_PERM = 128
+SHINGLE_SIZE = 2
+PRIME = 4294967311  # smallest prime above 2**32; keeps a*x+b inside uint64
+
+_WORD = re.compile(r"\w+")
+
+
+def text_key(text):
+    """Default document key: hash of the whitespace-normalized text"""
+    return hashlib.sha1(" ".join(text.split()).encode("utf-8")).hexdigest()[:16]
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def lsh_params(threshold, num_perm, fn_weight=0.7):
+    """
+    (bands, rows) minimizing the weighted false positive / false negative
+    area of the LSH S-curve around the threshold. Missed duplicates cost
+    more than extra candidates, which are verified anyway.
+    """
+    s = np.linspace(0, 1, 201)
+    best, best_cost = None, None
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        p = 1 - (1 - s ** rows) ** bands
+        fp = np.where(s < threshold, p, 0).mean()
+        fn = np.where(s >= threshold, 1 - p, 0).mean()
+        cost = (1 - fn_weight) * fp + fn_weight * fn
+        if best_cost is None or cost < best_cost:
+            best, best_cost = (bands, rows), cost
+    return best
+
+
+class NearDuplicateIndex:
+    def __init__(self, path=None, threshold=0.7, num_perm=NUM_PERM, shingle_size=SHINGLE_SIZE, seed=1):
+        """
+        Args:
+            path: Optional SQLite file; entries added by other processes
+                sharing it are picked up on every ``check``
+            threshold: Estimated Jaccard similarity at or above which two
+                texts are duplicates
+            num_perm: MinHash signature length (fixed for a persisted index)
+            shingle_size: Words per shingle (fixed for a persisted index)
+            seed: Seed of the hash permutations (fixed for a persisted index)
+        """
+        self.path = path
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.seed = seed
+        self.bands, self.rows = lsh_params(threshold, num_perm)
+
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, 2 ** 32 - 1, num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, 2 ** 32 - 1, num_perm, dtype=np.uint64)
+
+        self._ids = {}          # key -> position
+        self._keys = []
+        self._signatures = []
+        self._buckets = [{} for _ in range(self.bands)]  # band bytes -> [positions]
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_pid = None
+        self._last_rowid = 0
+
+        self.lookups = 0
+        self.duplicates = 0
+        self.lookup_seconds = 0.0
+
+        if path:
+            self._open_store()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return key in self._ids
+
+    # ------------------ Persistence ------------------
+    def _connect(self):
+        # SQLite handles must not cross fork(); workers reconnect on first use
+        if self._db is None or self._db_pid != os.getpid():
+            self._db = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            self._db_pid = os.getpid()
+        return self._db
+
+    def _open_store(self):
+        db = self._connect()
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS signatures ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " key TEXT UNIQUE NOT NULL,"
+            " signature BLOB NOT NULL)"
+        )
+        db.execute("CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+        settings = {"num_perm": self.num_perm, "shingle_size": self.shingle_size, "seed": self.seed}
+        for name, value in settings.items():
+            db.execute("INSERT OR IGNORE INTO settings (name, value) VALUES (?, ?)", (name, value))
+        stored = dict(db.execute("SELECT name, value FROM settings").fetchall())
+        db.commit()
+        if stored != settings:
+            raise ValueError(f"{self.path} was built with {stored}, not {settings}")
+
+        self.refresh()
+
+    def refresh(self):
+        """Load entries other processes added since the last refresh"""
+        if not self.path:
+            return
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT id, key, signature FROM signatures WHERE id > ? ORDER BY id",
+                (self._last_rowid,),
+            ).fetchall()
+            for rowid, key, blob in rows:
+                self._last_rowid = rowid
+                if key not in self._ids:
+                    self._insert(key, np.frombuffer(blob, dtype=np.uint32))
+
+    def commit(self):
+        if self.path:
+            with self._lock:
+                self._connect().commit()
+
+    def close(self):
+        if self._db is not None:
+            self._db.commit()
+            self._db.close()
+            self._db = None
+
+    # ------------------ Index ------------------
+    def signature(self, text):
+        """MinHash signature of the text, or None when it has no words"""
+        hashes = np.fromiter(
+            (zlib.crc32(s.encode("utf-8")) for s in shingles(text, self.shingle_size)),
+            dtype=np.uint64,
+        )
+        if not hashes.size:
+            return None
+        return ((np.outer(hashes, self._a) + self._b) % PRIME).min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, signature):
+        r = self.rows
+        return [signature[i * r:(i + 1) * r].tobytes() for i in range(self.bands)]
+
+    def _insert(self, key, signature):
+        position = len(self._keys)
+        self._ids[key] = position
+        self._keys.append(key)
+        self._signatures.append(signature)
+        for bucket, band in zip(self._buckets, self._band_keys(signature)):
+            bucket.setdefault(band, []).append(position)
+
+    def query(self, signature):
+        """Most similar indexed key at or above the threshold, as (key, similarity)"""
+        candidates = set()
+        for bucket, band in zip(self._buckets, self._band_keys(signature)):
+            candidates.update(bucket.get(band, ()))
+        if not candidates:
+            return None
+
+        candidates = list(candidates)
+        similarity = (np.stack([self._signatures[c] for c in candidates]) == signature).mean(axis=1)
+        best = int(similarity.argmax())
+        if similarity[best] < self.threshold:
+            return None
+        return self._keys[candidates[best]], round(float(similarity[best]), 3)
+
+    def add(self, key, text, signature=None):
+        if signature is None:
+            signature = self.signature(text)
+        if signature is None:
+            return
+        with self._lock:
+            if key in self._ids:
+                return
+            self._insert(key, signature)
+            if self.path:
+                self._connect().execute(
+                    "INSERT OR IGNORE INTO signatures (key, signature) VALUES (?, ?)",
+                    (key, signature.tobytes()),
+                )
+
+    def check(self, key, text, add=True):
+        """
+        Return (duplicate_key, similarity) if the text matches something
+        already indexed, otherwise None (and index it when ``add``).
+        """
+        started = time.perf_counter()
+        self.refresh()
+
+        with self._lock:
+            self.lookups += 1
+            signature = None
+            if key in self._ids:
+                match = (key, 1.0)
+            else:
+                signature = self.signature(text)
+                match = self.query(signature) if signature is not None else None
+
+        if match is not None:
+            self.duplicates += 1
+        elif add:
+            self.add(key, text, signature)
+
+        self.lookup_seconds += time.perf_counter() - started
+        return match
+
+    def stats(self):
+        return {
+            "documents": len(self),
+            "threshold": self.threshold,
+            "bands": self.bands,
+            "rows_per_band": self.rows,
+            "lookups": self.lookups,
+            "duplicates": self.duplicates,
+            "avg_lookup_us": round(self.lookup_seconds / self.lookups * 1e6, 1) if self.lookups else 0.0,
+        }
+
+
+def drop_near_duplicates(index, rows, text_column="text", key_fn=None):
+    """
+    Filter dict rows through the index, keeping the first of each group.
+
+    Returns (kept rows, dropped count). Rows are keyed by a hash of their
+    text unless ``key_fn`` says otherwise.
+    """
+    kept = []
+    for row in rows:
+        text = row.get(text_column) or ""
+        key = key_fn(row) if key_fn else text_key(text)
+        if index.check(key, text) is None:
+            kept.append(row)
+    index.commit()
+    return kept, len(rows) - len(kept)
+
+
+# ------------------ Commands ------------------
+def dedupe(args):
+    from bulk_classify import FileSink, read_rows
+
+    index = NearDuplicateIndex(args.index, threshold=args.threshold)
+    sink = FileSink(args.output) if args.output else None
+
+    total = dropped = 0
+    started = time.perf_counter()
+    for row in read_rows(args.input):
+        total += 1
+        text = row.get(args.text_column) or ""
+        match = index.check(text_key(text), text)
+        if match is not None:
+            dropped += 1
+            if args.verbose:
+                print(f"   dup of {match[0]} ({match[1]:.2f}): {text[:80]}")
+        elif sink is not None:
+            sink.write([row])
+    index.close()
+    if sink is not None:
+        sink.close()
+
+    elapsed = time.perf_counter() - started
+    stats = index.stats()
+    print(
+        f"✅ {total} rows, {dropped} near-duplicates dropped in {elapsed:.2f}s "
+        f"({stats['avg_lookup_us']} µs/lookup, {stats['bands']} bands x {stats['rows_per_band']} rows)"
+    )
+
+
+def stats(args):
+    index = NearDuplicateIndex(args.index, threshold=args.threshold)
+    print(index.stats())
+    index.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MinHash LSH near-duplicate index")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_dedupe = sub.add_parser("dedupe", help="Drop near-duplicate rows from a CSV/JSONL file")
+    p_dedupe.add_argument("input")
+    p_dedupe.add_argument("--output", help="Write the kept rows here")
+    p_dedupe.add_argument("--text-column", default="text")
+    p_dedupe.add_argument("--verbose", action="store_true")
+
+    p_stats = sub.add_parser("stats")
+
+    for p in (p_dedupe, p_stats):
+        p.add_argument("--index", help="SQLite file to persist the index (in-memory if omitted)")
+        p.add_argument("--threshold", type=float, default=0.7)
+
+    args = parser.parse_args()
+    {"dedupe": dedupe, "stats": stats}[args.command](args)
+
+
+if __name__ == "__main__":
+    main()
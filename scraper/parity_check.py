@@ -0,0 +1,72 @@
+"""
+Compare an optimized inference backend against eager PyTorch.
+
+Reports label agreement and confidence deltas on pharma_mentions.csv so a
+faster backend can be adopted without silently losing accuracy.
+
+Usage:
+    python parity_check.py --backend onnx-int8
+    python parity_check.py --backend torch-int8 --min-agreement 0.98
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from inference_backend import BACKENDS, load_backend
+
+
+def run(backend, texts, batch_size):
+    results = []
+    started = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        results.extend(backend.predict(texts[i:i + batch_size]))
+    return results, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backend parity check")
+    parser.add_argument("--backend", required=True, choices=[b for b in BACKENDS if b != "torch"])
+    parser.add_argument("--model-dir", default="pharma_model")
+    parser.add_argument("--data", default="pharma_mentions.csv")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument(
+        "--min-agreement", type=float, default=0.99,
+        help="Exit non-zero if label agreement falls below this fraction"
+    )
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.data).dropna(subset=["text"])
+    texts = df["text"].astype(str).tolist()
+    print(f"📊 Comparing torch vs {args.backend} on {len(texts)} rows")
+
+    reference, ref_seconds = run(load_backend("torch", args.model_dir), texts, args.batch_size)
+    candidate, cand_seconds = run(load_backend(args.backend, args.model_dir), texts, args.batch_size)
+
+    ref_labels = np.array([r["label"] for r in reference])
+    cand_labels = np.array([r["label"] for r in candidate])
+    deltas = np.abs(
+        np.array([r["confidence"] for r in reference])
+        - np.array([r["confidence"] for r in candidate])
+    )
+    agreement = float((ref_labels == cand_labels).mean())
+
+    print(f"\n   Label agreement:     {agreement:.2%} ({int((ref_labels != cand_labels).sum())} disagreements)")
+    print(f"   Confidence delta:    mean {deltas.mean():.4f}, p95 {np.percentile(deltas, 95):.4f}, max {deltas.max():.4f}")
+
+    if "label" in df.columns:
+        gold = df["label"].astype(str).to_numpy()
+        print(f"   Accuracy vs labels:  torch {(ref_labels == gold).mean():.2%}, {args.backend} {(cand_labels == gold).mean():.2%}")
+
+    print(f"   Time:                torch {ref_seconds:.2f}s, {args.backend} {cand_seconds:.2f}s ({ref_seconds / cand_seconds:.2f}x)")
+
+    if agreement < args.min_agreement:
+        print(f"\n❌ Agreement below {args.min_agreement:.2%}")
+        sys.exit(1)
+    print("\n✅ Parity check passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,42 @@
 import os
 import csv
 import asyncio
-import aiohttp
 import datetime
 import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlencode
 import feedparser
-import requests
 from dotenv import load_dotenv
 from bs4 import BeautifulSoup
 
+try:
+    import lxml.html
+except ImportError:  # BeautifulSoup's html.parser is used instead
+    lxml = None
+
+from http_utils import HttpClient
+from near_dup import NearDuplicateIndex, drop_near_duplicates
+from scraper_state import ScraperState
+
 load_dotenv()
 
 OUTPUT_FILE = "pharma_mentions.csv"
+SCRAPER_DIR = os.path.dirname(os.path.abspath(__file__))
+# Persistent near-duplicate index shared across runs, e.g. near_dup.sqlite;
+# off unless set, and a relative path is kept next to this file, not the cwd
+NEAR_DUP_INDEX = os.getenv("NEAR_DUP_INDEX", "")
+NEAR_DUP_INDEX = NEAR_DUP_INDEX and os.path.join(SCRAPER_DIR, NEAR_DUP_INDEX)
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.7"))
+# ETag/Last-Modified per feed and ids of items already ingested
+STATE_FILE = os.getenv("SCRAPER_STATE", "scraper_state.sqlite")
+# Batches at least this large are cleaned in a process pool
+CLEAN_POOL_MIN_BATCH = int(os.getenv("CLEAN_POOL_MIN_BATCH", "2000"))
+CLEAN_POOL_WORKERS = int(os.getenv("CLEAN_POOL_WORKERS", str(os.cpu_count() or 1)))
+# Base URL of a fixtures.py server to scrape instead of the live sources
+FIXTURE_SERVER = os.getenv("FIXTURE_SERVER")
+
+near_dups = None
 
 # ------------------ Utils ------------------
 def now():
@@ -21,24 +46,85 @@ def clean_text(text: str) -> str:
     """Remove HTML tags and normalize whitespace"""
     if not text:
         return ""
+    # Plain text (most PubMed / ClinicalTrials payloads) needs no parser
+    if "<" not in text and "&" not in text:
+        return " ".join(text.split())
+    if lxml is not None:
+        try:
+            return " ".join(
+                lxml.html.fragment_fromstring(text, create_parent="div").text_content().split()
+            )
+        except (ValueError, lxml.etree.ParserError):
+            pass
     soup = BeautifulSoup(text, "html.parser")
     return " ".join(soup.get_text().split())
 
+_clean_pool = None
+
+def clean_texts(texts):
+    """clean_text over a batch, spread across processes when it is large"""
+    global _clean_pool
+
+    if len(texts) < CLEAN_POOL_MIN_BATCH or CLEAN_POOL_WORKERS < 2:
+        return [clean_text(t) for t in texts]
+    if _clean_pool is None:
+        _clean_pool = ProcessPoolExecutor(CLEAN_POOL_WORKERS)
+    chunksize = max(1, len(texts) // (CLEAN_POOL_WORKERS * 4))
+    return list(_clean_pool.map(clean_text, texts, chunksize=chunksize))
+
 def save_rows(rows):
+    global near_dups
+
+    if NEAR_DUP_INDEX and rows:
+        if near_dups is None:
+            near_dups = NearDuplicateIndex(NEAR_DUP_INDEX, threshold=NEAR_DUP_THRESHOLD)
+        rows, dropped = drop_near_duplicates(near_dups, rows)
+        if dropped:
+            print(f"♻️ Dropped {dropped} near-duplicate rows")
+
     if not rows:
         return
 
     file_exists = os.path.exists(OUTPUT_FILE)
     with open(OUTPUT_FILE, "a", newline="", encoding="utf-8") as f:
         writer = csv.DictWriter(
-            f, fieldnames=["text", "source", "timestamp", "url"]
+            f, fieldnames=["text", "source", "timestamp", "url"], extrasaction="ignore"
         )
         if not file_exists:
             writer.writeheader()
         writer.writerows(rows)
 
+# ------------------ HTTP ------------------
+# Requests per second and retry policy per host; anything else gets DEFAULT_POLICY
+NCBI_API_KEY = os.getenv("NCBI_API_KEY")
+HOST_POLICIES = {
+    "newsapi.org": {"rate": 1},
+    # NCBI allows 3 requests/s without an API key and 10 with one
+    "eutils.ncbi.nlm.nih.gov": {"rate": 10 if NCBI_API_KEY else 3},
+    "clinicaltrials.gov": {"rate": 5},
+    "www.fda.gov": {"rate": 2},
+    "www.who.int": {"rate": 2},
+}
+DEFAULT_POLICY = {"rate": 5}
+HTTP_LIMIT_PER_HOST = 8  # pooled connections per host
+
+async def conditional_get(client, state, source, url, params=None, as_json=False):
+    """GET that returns None when the server answers 304 Not Modified"""
+    key = url
+    if params:
+        key += "?" + urlencode(sorted((k, v) for k, v in params.items() if k != "apiKey"))
+
+    async with client.request("GET", url, params=params, headers=state.validators(key)) as r:
+        state.record_response(source, key, r)
+        if r.status == 304:
+            return None
+        r.raise_for_status()
+        return await r.json(content_type=None) if as_json else await r.text()
+
 # ------------------ Google News ------------------
-async def scrape_news():
+NEWS_API_URL = "https://newsapi.org/v2/everything"
+
+async def scrape_news(client, state):
     key = os.getenv("NEWS_API_KEY")
     if not key:
         print("⚠️ NEWS_API_KEY missing, skipping Google News")
@@ -51,44 +137,80 @@ async def scrape_news():
         "adverse drug reaction"
     ]
 
-    rows = []
-    try:
-        async with aiohttp.ClientSession() as session:
-            for q in queries:
-                for page in range(1, 3):
-                    params = {
-                        "q": q,
-                        "language": "en",
-                        "pageSize": 25,
-                        "page": page,
-                        "apiKey": key
+    count = 0
+    for q in queries:
+        for page in range(1, 3):
+            params = {
+                "q": q,
+                "language": "en",
+                "pageSize": 25,
+                "page": page,
+                "apiKey": key
+            }
+            data = await conditional_get(client, state, "Google News", NEWS_API_URL, params, as_json=True)
+            if data is None:
+                continue
+
+            for a in data.get("articles", []):
+                if a.get("description") and state.is_new("Google News", a.get("url")):
+                    yield {
+                        "text": clean_text(a["description"]),
+                        "source": "Google News",
+                        "timestamp": a.get("publishedAt"),
+                        "url": a.get("url"),
+                        "id": a.get("url")
                     }
-
-                    async with session.get(
-                        "https://newsapi.org/v2/everything",
-                        params=params,
-                        timeout=30
-                    ) as r:
-                        data = await r.json()
-
-                    for a in data.get("articles", []):
-                        if a.get("description"):
-                            rows.append({
-                                "text": clean_text(a["description"]),
-                                "source": "Google News",
-                                "timestamp": a.get("publishedAt"),
-                                "url": a.get("url")
-                            })
-
-                    await asyncio.sleep(1)
-
-        save_rows(rows[:120])
-
-    except Exception as e:
-        print("❌ Google News failed:", e)
+                    count += 1
+                    if count >= 120:
+                        return
 
 # ------------------ PubMed ------------------
-def scrape_pubmed():
+EUTILS_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
+PUBMED_RETMAX = int(os.getenv("PUBMED_RETMAX", "15"))  # abstracts per search term
+PUBMED_BATCH_SIZE = 200  # PMIDs per efetch request
+
+def pubmed_url(pid):
+    return f"https://pubmed.ncbi.nlm.nih.gov/{pid}/"
+
+def ncbi_params(**params):
+    if NCBI_API_KEY:
+        params["api_key"] = NCBI_API_KEY
+    return params
+
+def pubmed_article(elem):
+    """Title + abstract of one <PubmedArticle> element"""
+    pmid = elem.findtext("MedlineCitation/PMID")
+    title = elem.find("MedlineCitation/Article/ArticleTitle")
+    parts = ["".join(title.itertext())] if title is not None else []
+    parts += ["".join(a.itertext()) for a in elem.iterfind("MedlineCitation/Article/Abstract/AbstractText")]
+    return pmid, " ".join(parts)
+
+async def pubmed_search(client, term):
+    data = await client.json(
+        f"{EUTILS_URL}/esearch.fcgi",
+        params=ncbi_params(db="pubmed", term=term, retmode="json", retmax=PUBMED_RETMAX)
+    )
+    return data["esearchresult"]["idlist"]
+
+async def pubmed_fetch(client, pmids):
+    """One efetch for a batch of PMIDs, parsed while the response streams in"""
+    articles = []
+    parser = ET.XMLPullParser(events=("end",))
+    async with client.request(
+        "POST",
+        f"{EUTILS_URL}/efetch.fcgi",
+        data=ncbi_params(db="pubmed", id=",".join(pmids), retmode="xml", rettype="abstract")
+    ) as r:
+        r.raise_for_status()
+        async for chunk in r.content.iter_chunked(64 * 1024):
+            parser.feed(chunk)
+            for _, elem in parser.read_events():
+                if elem.tag == "PubmedArticle":
+                    articles.append(pubmed_article(elem))
+                    elem.clear()
+    return articles
+
+async def scrape_pubmed(client, state):
     print("🔎 Scraping PubMed...")
     terms = [
         "drug clinical trial",
@@ -97,146 +219,252 @@ def scrape_pubmed():
         "drug safety study"
     ]
 
-    rows = []
-
-    try:
-        for term in terms:
-            r = requests.get(
-                "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi",
-                params={
-                    "db": "pubmed",
-                    "term": term,
-                    "retmode": "json",
-                    "retmax": 15
-                },
-                timeout=(5, 30)
-            )
-
-            ids = r.json()["esearchresult"]["idlist"]
-
-            for pid in ids:
-                try:
-                    fr = requests.get(
-                        "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi",
-                        params={
-                            "db": "pubmed",
-                            "id": pid,
-                            "retmode": "text",
-                            "rettype": "abstract"
-                        },
-                        timeout=(5, 60)
-                    )
-
-                    rows.append({
-                        "text": clean_text(fr.text[:1000]),
-                        "source": "PubMed",
-                        "timestamp": now(),
-                        "url": f"https://pubmed.ncbi.nlm.nih.gov/{pid}/"
-                    })
-
-                    time.sleep(0.4)
-
-                except:
-                    continue
-
-        save_rows(rows[:60])
+    id_lists = await asyncio.gather(*(pubmed_search(client, t) for t in terms))
+    pmids = [
+        pid for pid in dict.fromkeys(pid for ids in id_lists for pid in ids)
+        if state.is_new("PubMed", pubmed_url(pid))
+    ]
 
-    except Exception as e:
-        print("❌ PubMed failed:", e)
+    batches = [pmids[i:i + PUBMED_BATCH_SIZE] for i in range(0, len(pmids), PUBMED_BATCH_SIZE)]
+    for fetch in asyncio.as_completed([pubmed_fetch(client, b) for b in batches]):
+        try:
+            articles = await fetch
+        except Exception as e:
+            print("⚠️ PubMed efetch batch failed:", e)
+            continue
+
+        articles = [(pid, text) for pid, text in articles if text]
+        cleaned = await asyncio.to_thread(clean_texts, [text[:1000] for _, text in articles])
+
+        for (pid, _), text in zip(articles, cleaned):
+            yield {
+                "text": text,
+                "source": "PubMed",
+                "timestamp": now(),
+                "url": pubmed_url(pid),
+                "id": pubmed_url(pid)
+            }
 
 # ------------------ FDA Alerts ------------------
-def scrape_fda():
-    print("🔎 Scraping FDA alerts...")
-    try:
-        feed = feedparser.parse(
-            "https://www.fda.gov/about-fda/contact-fda/stay-informed/rss-feeds/drug-safety-and-availability/rss.xml"
-        )
+FDA_FEED_URL = "https://www.fda.gov/about-fda/contact-fda/stay-informed/rss-feeds/drug-safety-and-availability/rss.xml"
 
-        rows = []
-        for entry in feed.entries[:50]:
-            rows.append({
-                "text": clean_text(entry.summary),
-                "source": "FDA Alerts",
-                "timestamp": entry.get("published"),
-                "url": entry.link
-            })
-
-        save_rows(rows)
+async def scrape_fda(client, state):
+    print("🔎 Scraping FDA alerts...")
+    text = await conditional_get(client, state, "FDA Alerts", FDA_FEED_URL)
+    if text is None:
+        return
 
-    except Exception as e:
-        print("❌ FDA RSS failed:", e)
+    for entry in feedparser.parse(text).entries[:50]:
+        if not state.is_new("FDA Alerts", entry.get("id") or entry.link):
+            continue
+        yield {
+            "text": clean_text(entry.summary),
+            "source": "FDA Alerts",
+            "timestamp": entry.get("published"),
+            "url": entry.link,
+            "id": entry.get("id") or entry.link
+        }
 
 # ------------------ ClinicalTrials.gov (SAFE) ------------------
-def scrape_clinical_trials():
-    print("🔎 Scraping ClinicalTrials.gov...")
-    rows = []
-
-    try:
-        r = requests.get(
-            "https://clinicaltrials.gov/api/v2/studies",
-            params={
-                "query.term": "drug",
-                "pageSize": 100
-            },
-            timeout=(5, 30)
-        )
-
-        # Validate JSON response
-        if "application/json" not in r.headers.get("Content-Type", ""):
-            print("⚠️ ClinicalTrials returned non-JSON, skipping")
-            return
+CLINICAL_TRIALS_URL = "https://clinicaltrials.gov/api/v2/studies"
+CT_QUERY = os.getenv("CT_QUERY", "drug")
+CT_FIELDS = "NCTId,BriefSummary,LastUpdatePostDate"  # what we store, plus the crawl position
+CT_PAGE_SIZE = int(os.getenv("CT_PAGE_SIZE", "100"))
+CT_MAX_STUDIES = int(os.getenv("CT_MAX_STUDIES", "300"))  # per run; 0 pages through everything
+# Only studies updated on or after this date (YYYY-MM-DD). Defaults to the
+# newest update date reached by the last crawl that got to the final page,
+# or CT_LOOKBACK_DAYS ago on the first run
+CT_SINCE = os.getenv("CT_SINCE")
+CT_LOOKBACK_DAYS = int(os.getenv("CT_LOOKBACK_DAYS", "2"))
+
+def study_updated(study):
+    return (study.get("protocolSection", {}).get("statusModule", {})
+            .get("lastUpdatePostDateStruct", {}).get("date"))
+
+async def clinical_trials_pages(client, state, since):
+    """
+    Yield each page's studies, oldest update first, following nextPageToken.
+
+    Studies updated while a crawl is in progress land after its last page,
+    so a crawl spread over several runs misses nothing. The cursor is
+    checkpointed before every page is handed out, so a run stopping anywhere
+    resumes on that page; the final page records the newest update date seen
+    as the next crawl's ``since``.
+    """
+    cursor_name = f"clinicaltrials:{CT_QUERY}"
+    saved = state.cursor(cursor_name)
+    token = saved.get("token") if saved.get("since") == since else None
+    if token:
+        print(f"   ClinicalTrials: resuming crawl since {since}")
+
+    params = {
+        "query.term": CT_QUERY,
+        "fields": CT_FIELDS,
+        "pageSize": CT_PAGE_SIZE,
+        "sort": "LastUpdatePostDate:asc",
+        "filter.advanced": f"AREA[LastUpdatePostDate]RANGE[{since},MAX]",
+    }
+
+    newest = since
+    while True:
+        page_params = dict(params, pageToken=token) if token else params
+        async with client.request("GET", CLINICAL_TRIALS_URL, params=page_params) as r:
+            r.raise_for_status()
+            # Validate JSON response
+            if "application/json" not in r.headers.get("Content-Type", ""):
+                print("⚠️ ClinicalTrials returned non-JSON, skipping")
+                return
+            data = await r.json()
 
-        data = r.json()
         studies = data.get("studies", [])
+        newest = max([newest] + [d for d in map(study_updated, studies) if d])
+        state.set_cursor("ClinicalTrials", cursor_name, token=token, since=since)
+        yield studies
 
-        for s in studies:
-            summary = (
-                s.get("protocolSection", {})
-                .get("descriptionModule", {})
-                .get("briefSummary", "")
-            )
+        token = data.get("nextPageToken")
+        if not token:
+            state.set_cursor("ClinicalTrials", cursor_name, token=None, since=since, last_completed=newest)
+            return
 
-            if summary:
-                rows.append({
-                    "text": clean_text(summary[:1000]),
-                    "source": "ClinicalTrials",
-                    "timestamp": now(),
-                    "url": "https://clinicaltrials.gov/"
-                })
+def clinical_trials_since(state):
+    """CT_SINCE, else the crawl in progress, else where the last crawl ended"""
+    if CT_SINCE:
+        return CT_SINCE
+    saved = state.cursor(f"clinicaltrials:{CT_QUERY}")
+    if saved.get("token") and saved.get("since"):
+        return saved["since"]
+    if saved.get("last_completed"):
+        return saved["last_completed"]
+    return (datetime.date.today() - datetime.timedelta(days=CT_LOOKBACK_DAYS)).isoformat()
+
+async def scrape_clinical_trials(client, state):
+    print("🔎 Scraping ClinicalTrials.gov...")
 
-        save_rows(rows[:80])
+    since = clinical_trials_since(state)
+    count = 0
 
-    except Exception as e:
-        print("❌ ClinicalTrials failed:", e)
+    async for studies in clinical_trials_pages(client, state, since):
+        page = []
+        for s in studies:
+            protocol = s.get("protocolSection", {})
+            summary = protocol.get("descriptionModule", {}).get("briefSummary", "")
+            nct_id = protocol.get("identificationModule", {}).get("nctId")
+            url = f"https://clinicaltrials.gov/study/{nct_id}" if nct_id else "https://clinicaltrials.gov/"
+            if summary and (not nct_id or state.is_new("ClinicalTrials", url)):
+                page.append((url, nct_id, summary[:1000]))
+
+        cleaned = await asyncio.to_thread(clean_texts, [summary for _, _, summary in page])
+        for (url, nct_id, _), text in zip(page, cleaned):
+            yield {
+                "text": text,
+                "source": "ClinicalTrials",
+                "timestamp": now(),
+                "url": url,
+                "id": url if nct_id else None
+            }
+            count += 1
+            # Stopping mid-page leaves the cursor on this page; the next run
+            # re-reads it and skips the studies already seen
+            if CT_MAX_STUDIES and count >= CT_MAX_STUDIES:
+                return
 
 # ------------------ WHO News ------------------
-def scrape_who():
-    print("🔎 Scraping WHO news...")
-    try:
-        feed = feedparser.parse("https://www.who.int/rss-feeds/news-english.xml")
+WHO_FEED_URL = "https://www.who.int/rss-feeds/news-english.xml"
 
-        rows = []
-        for entry in feed.entries[:40]:
-            rows.append({
-                "text": clean_text(entry.summary),
-                "source": "WHO News",
-                "timestamp": entry.get("published"),
-                "url": entry.link
-            })
+async def scrape_who(client, state):
+    print("🔎 Scraping WHO news...")
+    text = await conditional_get(client, state, "WHO News", WHO_FEED_URL)
+    if text is None:
+        return
 
-        save_rows(rows)
+    for entry in feedparser.parse(text).entries[:40]:
+        if not state.is_new("WHO News", entry.get("id") or entry.link):
+            continue
+        yield {
+            "text": clean_text(entry.summary),
+            "source": "WHO News",
+            "timestamp": entry.get("published"),
+            "url": entry.link,
+            "id": entry.get("id") or entry.link
+        }
+
+# ------------------ Engine ------------------
+# Every source is an async generator of rows; all of them run concurrently
+SOURCES = {
+    "Google News": scrape_news,
+    "PubMed": scrape_pubmed,
+    "FDA Alerts": scrape_fda,
+    "ClinicalTrials": scrape_clinical_trials,
+    "WHO News": scrape_who,
+}
+
+FLUSH_EVERY = 500  # rows buffered per source before they are saved
+
+def flush(name, rows, state, validators=False):
+    """Save rows; feed validators are kept back until the source has finished"""
+    save_rows(rows)
+    state.mark_seen(name, [r["id"] for r in rows if r.get("id")])
+    state.commit(name, validators=validators)
+
+async def run_source(name, source, client, state):
+    started = time.perf_counter()
+    rows = []
+    total = 0
+    error = None
 
+    try:
+        async for row in source(client, state):
+            rows.append(row)
+            total += 1
+            if len(rows) >= FLUSH_EVERY:
+                flush(name, rows, state)
+                rows = []
     except Exception as e:
-        print("❌ WHO RSS failed:", e)
+        error = str(e) or type(e).__name__
+        print(f"❌ {name} failed:", error)
+
+    # a source that raised mid-feed must not answer 304 next run
+    flush(name, rows, state, validators=error is None)
+    return {
+        "source": name,
+        "items": total,
+        **state.counts[name],
+        "seconds": round(time.perf_counter() - started, 2),
+        "error": error,
+    }
+
+def report(results, elapsed, hosts):
+    print(f"\n📊 Scraped {sum(r['items'] for r in results)} items in {elapsed:.1f}s "
+          f"(sources sum to {sum(r['seconds'] for r in results):.1f}s)")
+    for r in results:
+        status = f"❌ {r['error']}" if r["error"] else "✅"
+        print(f"   {r['source']:15} {r['items']:5} new {r['skipped']:5} seen "
+              f"{r['not_modified']:3} not modified {r['seconds']:7.2f}s  {status}")
+    for host, s in hosts.items():
+        print(f"   {host:28} {s['requests']:4} requests {s['retries']:3} retries "
+              f"{s['failures']:3} failures {s['limiter_wait_seconds']:6.2f}s rate-limited "
+              f"{s['response_wait_seconds']:6.2f}s awaiting responses")
 
 # ------------------ Runner ------------------
+async def scrape_all(state):
+    """Run every source concurrently; returns per-source results and per-host stats"""
+    async with HttpClient(HOST_POLICIES, DEFAULT_POLICY, limit_per_host=HTTP_LIMIT_PER_HOST) as client:
+        results = await asyncio.gather(
+            *(run_source(name, source, client, state) for name, source in SOURCES.items())
+        )
+    return results, client.report()
+
 async def main():
-    await scrape_news()
-    scrape_pubmed()
-    scrape_fda()
-    scrape_clinical_trials()
-    scrape_who()
-    print("✅ Clean pharma dataset generated (300+ rows)")
+    if FIXTURE_SERVER:
+        from fixtures import rewrite_urls
+        rewrite_urls(globals(), FIXTURE_SERVER)
+
+    started = time.perf_counter()
+    state = ScraperState(STATE_FILE or ":memory:")
+    results, hosts = await scrape_all(state)
+    state.close()
+    report(results, time.perf_counter() - started, hosts)
+    print("✅ Clean pharma dataset generated")
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,438 @@
+"""
+Streaming scraper -> classifier -> store pipeline.
+
+Instead of appending to pharma_mentions.csv and classifying in a separate
+pass, every source streams its rows into a bounded queue. Classification
+workers post them to the classifier API's /classify/batch in batches, and
+a sink bulk-writes the classified events into the backend's Event
+collection (upserted by externalId, like saveEvent), or appends them to a
+JSONL file when MongoDB is not configured or unreachable.
+
+A full queue blocks the stage in front of it, so a slow classifier or
+database throttles fetching instead of buffering without bound. Items are
+marked seen, and their texts added to the near-duplicate index, only once
+they are stored. A source's feed validators and cursors are saved only
+when every item it fetched was stored, so anything lost to a failed batch
+is fetched again on the next run. If a stage fails outright, the other
+stages are cancelled instead of waiting on its queue.
+
+Usage:
+    CLASSIFIER_API_URL=http://localhost:8000 DATABASE_URL=mongodb://... python pipeline.py
+    python pipeline.py --output pharma_events.jsonl --batch-size 64 --queue-size 512
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+import pharma_scraper
+from http_utils import HttpClient
+from near_dup import NearDuplicateIndex, text_key
+from scraper_state import ScraperState
+
+CLASSIFIER_API_URL = os.getenv("CLASSIFIER_API_URL", "http://localhost:8000")
+DATABASE_URL = os.getenv("DATABASE_URL")
+# The classifier batches requests itself; only retry its 503s quickly
+CLASSIFIER_POLICY = {"rate": 1000, "burst": 1000, "retries": 5, "backoff": 0.5}
+
+DONE = object()  # end-of-stream marker, one per consumer
+
+
+# ------------------ Stages ------------------
+class StageStats:
+    def __init__(self, name, queue=None):
+        """
+        Args:
+            name: Stage name in the report
+            queue: The queue this stage consumes, sampled for its depth
+        """
+        self.name = name
+        self.queue = queue
+        self.items = 0
+        self.batches = 0
+        self.errors = 0
+        self.busy_seconds = 0.0     # fetching / classifying / writing
+        self.blocked_seconds = 0.0  # waiting for room downstream (backpressure)
+        self.depth_total = 0
+        self.depth_max = 0
+        self.samples = 0
+
+    def sample(self):
+        if self.queue is not None:
+            depth = self.queue.qsize()
+            self.depth_total += depth
+            self.depth_max = max(self.depth_max, depth)
+            self.samples += 1
+
+    def summary(self, elapsed):
+        return {
+            "stage": self.name,
+            "items": self.items,
+            "items_per_second": round(self.items / elapsed, 1) if elapsed else 0.0,
+            "batches": self.batches,
+            "errors": self.errors,
+            "busy_seconds": round(self.busy_seconds, 2),
+            "blocked_seconds": round(self.blocked_seconds, 2),
+            "queue_depth_mean": round(self.depth_total / self.samples, 1) if self.samples else None,
+            "queue_depth_max": self.depth_max if self.queue is not None else None,
+        }
+
+
+async def put(queue, item, stats):
+    started = time.perf_counter()
+    await queue.put(item)
+    stats.blocked_seconds += time.perf_counter() - started
+
+
+async def take_batch(queue, size, max_wait):
+    """
+    Up to ``size`` items, waiting at most ``max_wait`` seconds after the
+    first one. Returns (items, finished) where finished means DONE was read.
+    """
+    item = await queue.get()
+    if item is DONE:
+        return [], True
+
+    items = [item]
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_wait
+    while len(items) < size:
+        try:
+            item = queue.get_nowait()
+        except asyncio.QueueEmpty:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+        if item is DONE:
+            return items, True
+        items.append(item)
+    return items, False
+
+
+async def fetch_stage(name, source, client, state, out, stats, near_dups=None, in_flight=None):
+    """
+    Run one source into the classify queue; returns its result like run_source.
+
+    Rows are checked against the stored texts in ``near_dups`` without being
+    added (the sink adds them once stored) and against this run's rows in the
+    in-memory ``in_flight`` index.
+    """
+    started = time.perf_counter()
+    items = dropped = 0
+    error = None
+
+    try:
+        rows = source(client, state)
+        while True:
+            fetch_started = time.perf_counter()
+            try:
+                row = await rows.__anext__()
+            except StopAsyncIteration:
+                break
+            finally:
+                stats.busy_seconds += time.perf_counter() - fetch_started
+
+            if near_dups is not None:
+                key = text_key(row["text"])
+                if (
+                    near_dups.check(key, row["text"], add=False) is not None
+                    or in_flight.check(key, row["text"]) is not None
+                ):
+                    dropped += 1
+                    continue
+            await put(out, row, stats)
+            items += 1
+            stats.items += 1
+    except Exception as e:
+        error = str(e) or type(e).__name__
+        stats.errors += 1
+        print(f"❌ {name} failed:", error)
+
+    if dropped:
+        print(f"♻️ {name}: dropped {dropped} near-duplicate rows")
+    return {
+        "source": name,
+        "items": items,
+        **state.counts[name],
+        "seconds": round(time.perf_counter() - started, 2),
+        "error": error,
+    }
+
+
+async def classify_stage(client, url, inbox, out, stats, batch_size, max_wait):
+    """Label rows through the classifier API's /classify/batch"""
+    finished = False
+    while not finished:
+        rows, finished = await take_batch(inbox, batch_size, max_wait)
+        if not rows:
+            continue
+
+        started = time.perf_counter()
+        try:
+            data = await client.json(
+                url, method="POST", json={"texts": [r["text"] for r in rows]}
+            )
+            results = [(r["label"], r["confidence"]) for r in data["results"]]
+            if len(results) != len(rows):
+                raise ValueError(f"{len(results)} results for {len(rows)} texts")
+        except Exception as e:
+            # Not marked seen, so the next run fetches these rows again
+            stats.errors += len(rows)
+            print(f"⚠️ Classifying a batch of {len(rows)} failed:", str(e) or type(e).__name__)
+            continue
+        finally:
+            stats.busy_seconds += time.perf_counter() - started
+
+        stats.batches += 1
+        for row, (label, confidence) in zip(rows, results):
+            row["label"] = label
+            row["confidence"] = confidence
+            await put(out, row, stats)
+            stats.items += 1
+
+
+async def sink_stage(sink, inbox, state, stats, batch_size, max_wait, near_dups=None, stored=None):
+    """
+    Bulk-write classified rows; once stored, mark them seen, add their texts
+    to ``near_dups`` and count them per source in ``stored``.
+    """
+    finished = False
+    while not finished:
+        rows, finished = await take_batch(inbox, batch_size, max_wait)
+        if not rows:
+            continue
+
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(sink.write, rows)
+        except Exception as e:
+            stats.errors += len(rows)
+            print(f"⚠️ Writing {len(rows)} events failed:", str(e) or type(e).__name__)
+            continue
+        finally:
+            stats.busy_seconds += time.perf_counter() - started
+
+        stats.batches += 1
+        stats.items += len(rows)
+        by_source = defaultdict(list)
+        for row in rows:
+            if row.get("id"):
+                by_source[row["source"]].append(row["id"])
+            if near_dups is not None:
+                near_dups.add(text_key(row["text"]), row["text"])
+            if stored is not None:
+                stored[row["source"]] += 1
+        for source, ids in by_source.items():
+            state.mark_seen(source, ids)
+        if near_dups is not None:
+            near_dups.commit()
+
+
+async def supervise(tasks):
+    """
+    Wait for every task; if one fails, cancel the others and re-raise, so a
+    dead consumer cannot leave its producers blocked on a full queue.
+    """
+    done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+    failed = [t for t in done if not t.cancelled() and t.exception() is not None]
+    if failed:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        raise failed[0].exception()
+
+
+async def monitor(stages, every, interval=0.5):
+    """Sample queue depths; print a progress line every ``every`` seconds"""
+    started = time.perf_counter()
+    next_line = every
+    while True:
+        await asyncio.sleep(interval)
+        for s in stages:
+            s.sample()
+        elapsed = time.perf_counter() - started
+        if every and elapsed >= next_line:
+            next_line += every
+            print(f"⏱️ {elapsed:5.1f}s  " + "  ".join(
+                (f"[{s.queue.qsize()}/{s.queue.maxsize}] " if s.queue is not None else "")
+                + f"{s.name} {s.items} ({s.items / elapsed:.1f}/s)"
+                for s in stages
+            ))
+
+
+# ------------------ Sinks ------------------
+def label_to_category(label):
+    """Python twin of the backend's mapLabelToCategory"""
+    normalized = (label or "").lower().strip()
+    for key, category in (
+        ("side", "SIDE_EFFECTS"),
+        ("trial", "CLINICAL_TRIALS"),
+        ("regulation", "REGULATION_POLICY"),
+        ("competitor", "COMPETITOR_ACTIVITY"),
+        ("marketing", "MARKETING_PROMOTION"),
+    ):
+        if key in normalized:
+            return category
+    return "BRAND_PERCEPTION"
+
+
+class EventSink:
+    """Bulk writes into the backend's Event collection"""
+
+    def __init__(self, uri, collection="Event"):
+        from pymongo import MongoClient
+
+        self.client = MongoClient(uri, serverSelectionTimeoutMS=5000)
+        self.client.admin.command("ping")
+        self.col = self.client.get_default_database("medithon")[collection]
+        self.inserted = 0
+        self.updated = 0
+
+    def write(self, rows):
+        from pymongo import InsertOne, UpdateOne
+
+        now = datetime.datetime.utcnow()
+        ops = []
+        for row in rows:
+            event = {"category": label_to_category(row["label"]), "confidence": row["confidence"]}
+            created = {"text": row["text"], "source": row["source"], "createdAt": now}
+            if row.get("id"):
+                # Same upsert as saveEvent: a re-seen item only gets its new analysis
+                ops.append(UpdateOne(
+                    {"externalId": row["id"]},
+                    {"$set": event, "$setOnInsert": created},
+                    upsert=True,
+                ))
+            else:
+                ops.append(InsertOne({**created, **event}))
+
+        result = self.col.bulk_write(ops, ordered=False)
+        self.inserted += result.inserted_count + result.upserted_count
+        self.updated += result.modified_count
+
+    def close(self):
+        self.client.close()
+
+
+def open_sink(args):
+    if args.mongo_uri:
+        try:
+            sink = EventSink(args.mongo_uri, args.collection)
+            print(f"💾 Writing events to MongoDB collection '{args.collection}'")
+            return sink
+        except Exception as e:
+            print(f"⚠️ MongoDB unavailable ({type(e).__name__}), falling back to {args.output}")
+
+    from bulk_classify import FileSink
+
+    print(f"💾 Appending events to {args.output}")
+    return FileSink(args.output, append=True)
+
+
+# ------------------ Runner ------------------
+def report(stages, elapsed):
+    print(f"\n🚰 Pipeline stages over {elapsed:.1f}s")
+    for s in (stage.summary(elapsed) for stage in stages):
+        depth = (
+            f"queue {s['queue_depth_mean']:6.1f} avg {s['queue_depth_max']:4} max"
+            if s["queue_depth_mean"] is not None else " " * 24
+        )
+        print(f"   {s['stage']:9} {s['items']:6} items {s['items_per_second']:8.1f}/s  {depth}  "
+              f"{s['busy_seconds']:6.2f}s busy {s['blocked_seconds']:6.2f}s blocked {s['errors']:4} errors")
+
+
+async def run(args):
+    if pharma_scraper.FIXTURE_SERVER:
+        from fixtures import rewrite_urls
+        rewrite_urls(vars(pharma_scraper), pharma_scraper.FIXTURE_SERVER)
+
+    classify_url = f"{args.classifier_url.rstrip('/')}/classify/batch"
+    policies = {**pharma_scraper.HOST_POLICIES, urlsplit(classify_url).hostname: CLASSIFIER_POLICY}
+    near_dups = in_flight = None
+    if pharma_scraper.NEAR_DUP_INDEX:
+        near_dups = NearDuplicateIndex(pharma_scraper.NEAR_DUP_INDEX, threshold=pharma_scraper.NEAR_DUP_THRESHOLD)
+        in_flight = NearDuplicateIndex(threshold=pharma_scraper.NEAR_DUP_THRESHOLD)
+    state = ScraperState(pharma_scraper.STATE_FILE or ":memory:")
+    sink = open_sink(args)
+
+    to_classify = asyncio.Queue(args.queue_size)
+    to_store = asyncio.Queue(args.queue_size)
+    fetch = StageStats("fetch")
+    classify = StageStats("classify", to_classify)
+    store = StageStats("sink", to_store)
+    stored = defaultdict(int)  # source -> rows written by the sink
+    results = []
+
+    async def produce():
+        results.extend(await asyncio.gather(*(
+            fetch_stage(name, source, client, state, to_classify, fetch, near_dups, in_flight)
+            for name, source in pharma_scraper.SOURCES.items()
+        )))
+        for _ in classifiers:
+            await to_classify.put(DONE)
+        await asyncio.gather(*classifiers)
+        await to_store.put(DONE)
+
+    started = time.perf_counter()
+    async with HttpClient(
+        policies, pharma_scraper.DEFAULT_POLICY, limit_per_host=pharma_scraper.HTTP_LIMIT_PER_HOST
+    ) as client:
+        watcher = asyncio.create_task(monitor([fetch, classify, store], args.report_every))
+        sink_task = asyncio.create_task(sink_stage(
+            sink, to_store, state, store, args.sink_batch, args.flush_seconds, near_dups, stored
+        ))
+        classifiers = [
+            asyncio.create_task(classify_stage(
+                client, classify_url, to_classify, to_store, classify, args.batch_size, args.max_wait
+            ))
+            for _ in range(args.classify_workers)
+        ]
+
+        try:
+            await supervise([asyncio.create_task(produce()), sink_task, *classifiers])
+        finally:
+            watcher.cancel()
+            sink.close()
+            # Stored items are always kept; validators and cursors only for
+            # sources whose every fetched item was stored
+            finished = {r["source"]: r for r in results}
+            for name in pharma_scraper.SOURCES:
+                result = finished.get(name)
+                complete = result is not None and stored[name] == result["items"]
+                state.commit(name, cursors=complete, validators=complete and result["error"] is None)
+            state.close()
+            if near_dups is not None:
+                near_dups.close()
+
+    elapsed = time.perf_counter() - started
+    pharma_scraper.report(results, elapsed, client.report())
+    report([fetch, classify, store], elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream scraped items through the classifier into MongoDB")
+    parser.add_argument("--classifier-url", default=CLASSIFIER_API_URL)
+    parser.add_argument("--mongo-uri", default=DATABASE_URL, help="Defaults to DATABASE_URL, like the backend")
+    parser.add_argument("--collection", default="Event")
+    parser.add_argument("--output", default="pharma_events.jsonl", help="File sink used without MongoDB")
+    parser.add_argument("--queue-size", type=int, default=256, help="Capacity of each stage's input queue")
+    parser.add_argument("--batch-size", type=int, default=32, help="Texts per /classify/batch request")
+    parser.add_argument("--max-wait", type=float, default=0.2, help="Seconds a partial batch waits for more items")
+    parser.add_argument("--classify-workers", type=int, default=2, help="Concurrent /classify/batch requests")
+    parser.add_argument("--sink-batch", type=int, default=200, help="Events per bulk write")
+    parser.add_argument("--flush-seconds", type=float, default=2.0, help="Longest a partial bulk write waits")
+    parser.add_argument("--report-every", type=float, default=5.0, help="Progress line interval (0 disables)")
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
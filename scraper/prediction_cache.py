@@ -0,0 +1,220 @@
+"""
+Bounded LRU + TTL cache of classifier predictions.
+
+Keys are a hash of the whitespace-normalized text plus the model version,
+so a retrained model never serves stale labels. Entries can optionally be
+written through to a local SQLite file so the cache survives restarts. The
+file may be shared by several API workers: it runs in WAL mode, every write
+is best-effort (a locked or broken file only costs persistence), and each
+worker only deletes what it knows to be dead.
+"""
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+DB_TIMEOUT = 5  # seconds a write waits for another worker's write to finish
+
+
+def normalize_text(text):
+    return " ".join(text.split())
+
+
+def cache_key(text, model_version):
+    payload = f"{model_version}\x00{normalize_text(text)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class PredictionCache:
+    def __init__(self, model_version, max_entries=10000, ttl_seconds=86400, path=None):
+        """
+        Args:
+            model_version: Fingerprint of the model producing the results
+            max_entries: LRU capacity (in memory and on disk)
+            ttl_seconds: Entry lifetime; 0 keeps entries until evicted
+            path: Optional SQLite file for persistence across restarts
+        """
+        self.model_version = model_version
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.path = path
+
+        self._entries = OrderedDict()  # key -> (expires_at, result)
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_pid = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+        if path:
+            self._open_store()
+
+    # ------------------ Persistence ------------------
+    def _connect(self):
+        # SQLite handles must not cross fork(); workers reconnect on first use
+        if self._db is None or self._db_pid != os.getpid():
+            self._db = sqlite3.connect(self.path, timeout=DB_TIMEOUT, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")  # readers never block the writer
+            self._db_pid = os.getpid()
+        return self._db
+
+    def _write(self, sql, rows):
+        """Run a write; on failure the entry is just not persisted"""
+        try:
+            db = self._connect()
+            db.executemany(sql, rows)
+            db.commit()
+        except sqlite3.Error as e:
+            with contextlib.suppress(sqlite3.Error, AttributeError):
+                self._db.rollback()
+            print(f"⚠️ Prediction cache could not write {self.path}: {e}")
+
+    def _open_store(self):
+        try:
+            self._connect().execute(
+                "CREATE TABLE IF NOT EXISTS predictions ("
+                " key TEXT PRIMARY KEY,"
+                " model_version TEXT NOT NULL,"
+                " result TEXT NOT NULL,"
+                " expires_at REAL NOT NULL)"
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️ Prediction cache could not open {self.path}, not persisting: {e}")
+            self.path = None
+            return
+
+        # Anything written by another model version or already expired is dead
+        self._write(
+            "DELETE FROM predictions WHERE model_version != ? OR (expires_at > 0 AND expires_at < ?)",
+            [(self.model_version, time.time())],
+        )
+
+        try:
+            rows = self._db.execute(
+                "SELECT key, result, expires_at FROM predictions"
+                " WHERE model_version = ? ORDER BY rowid DESC LIMIT ?",
+                (self.model_version, self.max_entries),
+            ).fetchall()
+        except sqlite3.Error as e:
+            print(f"⚠️ Prediction cache could not read {self.path}: {e}")
+            rows = []
+        for key, result, expires_at in reversed(rows):
+            self._entries[key] = (expires_at, json.loads(result))
+
+        print(f"💾 Prediction cache restored {len(rows)} entries from {self.path}")
+
+    def _persist(self, items):
+        if not self.path or not items:
+            return
+        self._write(
+            "INSERT OR REPLACE INTO predictions (key, model_version, result, expires_at) VALUES (?, ?, ?, ?)",
+            [(k, self.model_version, json.dumps(r), exp) for k, exp, r in items],
+        )
+        # Bounded by write order across all workers rather than by this
+        # worker's LRU, which knows nothing of what the others still use.
+        # A replaced row takes a new rowid, so this keeps the newest writes.
+        self._write(
+            "DELETE FROM predictions WHERE rowid <= (SELECT MAX(rowid) FROM predictions) - ?",
+            [(self.max_entries,)],
+        )
+
+    def _forget_expired(self, key):
+        if not self.path:
+            return
+        # Another worker may have refreshed the row since
+        self._write("DELETE FROM predictions WHERE key = ? AND expires_at > 0 AND expires_at < ?",
+                    [(key, time.time())])
+
+    # ------------------ Lookup ------------------
+    def get(self, text):
+        """Return a copy of the cached result, or None on a miss"""
+        key = cache_key(text, self.model_version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, result = entry
+            if expires_at and expires_at < time.time():
+                del self._entries[key]
+                self._forget_expired(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(result)
+
+    def put_many(self, texts, results, model_version=None):
+        """
+        Store results; if ``model_version`` is given and the cache has since
+        moved to another version, the (stale) results are dropped.
+        """
+        expires_at = time.time() + self.ttl if self.ttl else 0
+        with self._lock:
+            if model_version is not None and model_version != self.model_version:
+                return
+            written = []
+            for text, result in zip(texts, results):
+                key = cache_key(text, self.model_version)
+                self._entries[key] = (expires_at, dict(result))
+                self._entries.move_to_end(key)
+                written.append((key, expires_at, result))
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+            self._persist(written)
+
+    def put(self, text, result):
+        self.put_many([text], [result])
+
+    # ------------------ Invalidation ------------------
+    def set_model_version(self, model_version):
+        """Drop every entry when the model producing results has changed"""
+        with self._lock:
+            if model_version == self.model_version:
+                return False
+            previous, self.model_version = self.model_version, model_version
+            self._entries.clear()
+            self.invalidations += 1
+            if self.path:
+                # Only the old version's rows; other workers may already
+                # be writing under the new one
+                self._write("DELETE FROM predictions WHERE model_version = ?", [(previous,)])
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self.path:
+                self._write("DELETE FROM predictions WHERE model_version = ?", [(self.model_version,)])
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "model_version": self.model_version,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "persistent": bool(self.path),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
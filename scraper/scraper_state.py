@@ -0,0 +1,182 @@
+"""
+Persistent scraper state: HTTP validators per feed URL, the set of items
+already ingested and the page cursors of paginated crawls.
+
+Feeds are fetched with If-None-Match / If-Modified-Since, so an unchanged
+feed answers 304 with no body. Seen item ids (URLs, GUIDs, PMIDs, NCT ids)
+are checked against an in-memory Bloom filter first; only its rare
+positives hit the exact SQLite index. Seen ids and cursors are written per
+source once its rows are saved, and feed validators only once the source
+has been read completely, so an interrupted run re-fetches instead of
+losing items.
+"""
+import hashlib
+import math
+import sqlite3
+import time
+from collections import defaultdict
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.001, bits=None):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray(bits) if bits is not None else bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        for p in self._positions(item):
+            self.bits[p >> 3] |= 1 << (p & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(item))
+
+
+class ScraperState:
+    def __init__(self, path="scraper_state.sqlite", capacity=1_000_000, error_rate=0.001):
+        """
+        Args:
+            path: SQLite file holding validators, seen ids and the filter
+            capacity: Items the Bloom filter is sized for; it is rebuilt at
+                double the size from the exact index once exceeded
+            error_rate: Bloom false positive rate at capacity
+        """
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript(
+            "CREATE TABLE IF NOT EXISTS feeds ("
+            " url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, updated_at REAL);"
+            "CREATE TABLE IF NOT EXISTS seen ("
+            " item_id TEXT PRIMARY KEY, source TEXT, first_seen REAL);"
+            "CREATE TABLE IF NOT EXISTS bloom ("
+            " id INTEGER PRIMARY KEY CHECK (id = 1), capacity INTEGER, error_rate REAL, bits BLOB);"
+            "CREATE TABLE IF NOT EXISTS cursors ("
+            " name TEXT PRIMARY KEY, token TEXT, since TEXT, last_completed TEXT, updated_at REAL);"
+        )
+        self.seen_count = self.db.execute("SELECT COUNT(*) FROM seen").fetchone()[0]
+
+        row = self.db.execute("SELECT capacity, error_rate, bits FROM bloom").fetchone()
+        if row is not None and row[0] > self.seen_count:
+            self.bloom = BloomFilter(row[0], row[1], row[2])
+        else:
+            self._rebuild_bloom(max(capacity, self.seen_count * 2), error_rate)
+
+        self._pending_feeds = defaultdict(dict)  # source -> url -> (etag, last_modified)
+        self._pending_seen = defaultdict(set)    # source -> item ids
+        self._pending_cursors = defaultdict(dict)  # source -> name -> cursor
+        self.counts = defaultdict(lambda: {"new": 0, "skipped": 0, "not_modified": 0})
+
+    def _rebuild_bloom(self, capacity, error_rate):
+        self.bloom = BloomFilter(capacity, error_rate)
+        for (item_id,) in self.db.execute("SELECT item_id FROM seen"):
+            self.bloom.add(item_id)
+
+    # ------------------ Conditional requests ------------------
+    def validators(self, url):
+        """Headers for a conditional GET of ``url``"""
+        row = self.db.execute("SELECT etag, last_modified FROM feeds WHERE url = ?", (url,)).fetchone()
+        headers = {}
+        if row and row[0]:
+            headers["If-None-Match"] = row[0]
+        if row and row[1]:
+            headers["If-Modified-Since"] = row[1]
+        return headers
+
+    def record_response(self, source, url, response):
+        if response.status == 304:
+            self.counts[source]["not_modified"] += 1
+            return
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if etag or last_modified:
+            self._pending_feeds[source][url] = (etag, last_modified)
+
+    # ------------------ Pagination cursors ------------------
+    def cursor(self, name):
+        """Saved position of a paginated crawl: token, since, last_completed"""
+        row = self.db.execute(
+            "SELECT token, since, last_completed FROM cursors WHERE name = ?", (name,)
+        ).fetchone()
+        return dict(zip(("token", "since", "last_completed"), row)) if row else {}
+
+    def set_cursor(self, source, name, **cursor):
+        """Record the next page to fetch; saved with the source's next commit"""
+        pending = self._pending_cursors[source]
+        pending[name] = {**(pending.get(name) or self.cursor(name)), **cursor}
+
+    # ------------------ Seen items ------------------
+    def is_new(self, source, item_id):
+        """True for items not ingested before; counts the rest as skipped"""
+        if not item_id:
+            return True
+        if item_id in self._pending_seen[source] or (
+            item_id in self.bloom
+            and self.db.execute("SELECT 1 FROM seen WHERE item_id = ?", (item_id,)).fetchone()
+        ):
+            self.counts[source]["skipped"] += 1
+            return False
+        return True
+
+    def mark_seen(self, source, item_ids):
+        ids = set(item_ids)
+        self._pending_seen[source] |= ids
+        self.counts[source]["new"] += len(ids)
+
+    def commit(self, source, cursors=True, validators=True):
+        """
+        Persist a source's seen items once its rows are saved.
+
+        Args:
+            source: Source name
+            cursors: Also persist its cursors; only when every row fetched
+                so far has been saved, or the next run skips the lost pages
+            validators: Also persist its feed validators; only once the
+                source has finished without error, or the next run gets 304
+                for a feed whose items were never all read
+        Whatever is not persisted stays pending.
+        """
+        now = time.time()
+        if validators:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO feeds (url, etag, last_modified, updated_at) VALUES (?, ?, ?, ?)",
+                [(url, etag, lm, now) for url, (etag, lm) in self._pending_feeds.pop(source, {}).items()],
+            )
+
+        if cursors:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO cursors (name, token, since, last_completed, updated_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                [
+                    (name, c.get("token"), c.get("since"), c.get("last_completed"), now)
+                    for name, c in self._pending_cursors.pop(source, {}).items()
+                ],
+            )
+
+        ids = self._pending_seen.pop(source, set())
+        before = self.db.total_changes
+        self.db.executemany(
+            "INSERT OR IGNORE INTO seen (item_id, source, first_seen) VALUES (?, ?, ?)",
+            [(item_id, source, now) for item_id in ids],
+        )
+        self.seen_count += self.db.total_changes - before
+        for item_id in ids:
+            self.bloom.add(item_id)
+
+        if self.seen_count > self.bloom.capacity:
+            # A large commit can pass twice the capacity at once
+            self._rebuild_bloom(max(self.bloom.capacity, self.seen_count) * 2, self.bloom.error_rate)
+        self.db.execute(
+            "INSERT OR REPLACE INTO bloom (id, capacity, error_rate, bits) VALUES (1, ?, ?, ?)",
+            (self.bloom.capacity, self.bloom.error_rate, bytes(self.bloom.bits)),
+        )
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
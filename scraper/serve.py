@@ -0,0 +1,192 @@
+"""
+Pre-fork multi-worker server for the pharma classifier.
+
+The model is loaded once in the parent process and then N workers are
+forked, so the weights are shared copy-on-write instead of duplicated per
+worker. Each worker pins itself to its own slice of CPU cores and sizes the
+torch thread pool to match, so workers don't oversubscribe the machine.
+
+Usage:
+    python serve.py --workers 4 --port 8000
+    python serve.py --workers 2 --threads-per-worker 4
+
+Per-worker statistics are published to --stats-dir and aggregated on
+GET /workers.
+
+Model hot swaps happen per worker: deploy by replacing the watched model
+directory (CLASSIFIER_WATCH_SECONDS) so every worker picks it up, rather
+than calling /admin/models/load, which only reaches one worker. Swapped-in
+weights are loaded by each worker and are no longer shared.
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import tempfile
+import time
+import traceback
+
+# A worker that exits sooner than this after starting counts as a crash loop;
+# its restarts back off exponentially up to RESTART_BACKOFF_MAX seconds
+MIN_UPTIME = 10.0
+RESTART_BACKOFF = 1.0
+RESTART_BACKOFF_MAX = 30.0
+
+
+def parse_args():
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+
+    parser = argparse.ArgumentParser(description="Multi-worker classifier server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=max(1, cpus // 2))
+    parser.add_argument(
+        "--threads-per-worker", type=int, default=None,
+        help="Torch intra-op threads per worker (default: cores / workers)"
+    )
+    parser.add_argument("--no-pin", action="store_true", help="Don't pin workers to CPU cores")
+    parser.add_argument("--stats-dir", default=None)
+    parser.add_argument(
+        "--max-restarts", type=int, default=5,
+        help="Consecutive quick crashes of a worker before the server gives up"
+    )
+    args = parser.parse_args()
+
+    if args.threads_per_worker is None:
+        args.threads_per_worker = max(1, cpus // args.workers)
+    if args.stats_dir is None:
+        args.stats_dir = tempfile.mkdtemp(prefix="classifier-stats-")
+    return args
+
+
+def bind_socket(host, port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def core_slice(worker_id, threads):
+    """CPU ids assigned to a worker, wrapping if there are more threads than cores"""
+    cores = sorted(os.sched_getaffinity(0))
+    start = (worker_id * threads) % len(cores)
+    return {cores[(start + i) % len(cores)] for i in range(threads)}
+
+
+def run_worker(worker_id, sock, args):
+    import torch
+    import uvicorn
+    import classifier_api
+
+    if not args.no_pin and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, core_slice(worker_id, args.threads_per_worker))
+
+    torch.set_num_threads(args.threads_per_worker)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # already initialised in this process
+
+    classifier_api.WORKER_ID = worker_id
+
+    config = uvicorn.Config(classifier_api.app, log_level="info")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def spawn(worker_id, sock, args):
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        code = 0
+        try:
+            run_worker(worker_id, sock, args)
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def main():
+    args = parse_args()
+    os.environ["CLASSIFIER_STATS_DIR"] = args.stats_dir
+
+    # Keep the parent single-threaded so no OpenMP pool exists at fork time
+    import torch
+    torch.set_num_threads(1)
+
+    import classifier_api
+    classifier_api.load_model()  # once, before forking; workers only warm up
+
+    # Move everything allocated so far out of the GC's reach, so collections
+    # in the workers don't write to (and un-share) those pages
+    gc.collect()
+    gc.freeze()
+
+    sock = bind_socket(args.host, args.port)
+    print(
+        f"🚀 Serving on http://{args.host}:{args.port} with {args.workers} workers "
+        f"x {args.threads_per_worker} torch threads (stats: {args.stats_dir})"
+    )
+
+    workers = {spawn(i, sock, args): i for i in range(args.workers)}
+    started = {i: time.monotonic() for i in range(args.workers)}
+    crashes = {i: 0 for i in range(args.workers)}  # consecutive quick exits
+    shutting_down = False
+    failed = False
+
+    def shutdown(signum, frame):
+        nonlocal shutting_down
+        shutting_down = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+
+        worker_id = workers.pop(pid, None)
+        if worker_id is None or shutting_down:
+            continue
+
+        uptime = time.monotonic() - started[worker_id]
+        crashes[worker_id] = crashes[worker_id] + 1 if uptime < MIN_UPTIME else 0
+        if crashes[worker_id] > args.max_restarts:
+            print(f"❌ Worker {worker_id} exited {crashes[worker_id]} times within {MIN_UPTIME:.0f}s "
+                  f"of starting (status {status}), stopping")
+            failed = True
+            shutdown(None, None)
+            continue
+
+        delay = min(RESTART_BACKOFF * 2 ** (crashes[worker_id] - 1), RESTART_BACKOFF_MAX) if crashes[worker_id] else 0
+        print(f"⚠️ Worker {worker_id} (pid {pid}) exited with status {status} after {uptime:.1f}s, "
+              f"restarting{f' in {delay:.0f}s' if delay else ''}")
+        time.sleep(delay)
+        if shutting_down:
+            continue
+        workers[spawn(worker_id, sock, args)] = worker_id
+        started[worker_id] = time.monotonic()
+
+    sock.close()
+    print("👋 All workers stopped")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
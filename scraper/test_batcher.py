@@ -0,0 +1,117 @@
+"""
+Tests for the micro-batcher's back-pressure and failure handling.
+
+Run from scraper/:
+    python -m pytest test_batcher.py
+"""
+import threading
+
+import pytest
+
+from batcher import BatcherStoppedError, MicroBatcher, QueueFullError
+
+
+def blocked_batcher(max_queue_size, predict_fn=None):
+    """A started batcher whose worker is stuck in its first batch"""
+    release = threading.Event()
+    entered = threading.Event()
+
+    def predict(texts):
+        entered.set()
+        release.wait(5)
+        return (predict_fn or (lambda ts: [t.upper() for t in ts]))(texts)
+
+    batcher = MicroBatcher(predict, max_batch_size=1, max_wait_ms=0, max_queue_size=max_queue_size)
+    batcher.start()
+    first = batcher.submit("first")
+    assert entered.wait(5)
+    return batcher, first, release
+
+
+def test_results_come_back_in_order():
+    batcher = MicroBatcher(lambda ts: [t.upper() for t in ts], max_batch_size=4, max_wait_ms=5)
+    batcher.start()
+    try:
+        futures = batcher.submit_many(["a", "b", "c", "d", "e"])
+        assert [f.result(5) for f in futures] == ["A", "B", "C", "D", "E"]
+    finally:
+        batcher.stop()
+
+
+def test_full_queue_rejects_and_counts():
+    batcher, first, release = blocked_batcher(max_queue_size=2)
+    try:
+        queued = batcher.submit_many(["a", "b"])
+        with pytest.raises(QueueFullError):
+            batcher.submit("c")
+        assert batcher.stats()["rejected"] == 1
+    finally:
+        release.set()
+    assert first.result(5) == "FIRST"
+    assert [f.result(5) for f in queued] == ["A", "B"]
+    batcher.stop()
+
+
+def test_submit_many_is_all_or_nothing():
+    batcher, _, release = blocked_batcher(max_queue_size=3)
+    try:
+        batcher.submit("a")
+        with pytest.raises(QueueFullError):
+            batcher.submit_many(["b", "c", "d"])
+        assert batcher.stats()["queue_depth"] == 1
+        assert len(batcher.submit_many(["b", "c"])) == 2
+    finally:
+        release.set()
+        batcher.stop()
+
+
+def test_concurrent_submit_many_never_partially_queues():
+    batcher, _, release = blocked_batcher(max_queue_size=10)
+    accepted, rejected = [], []
+
+    def submit():
+        try:
+            accepted.append(batcher.submit_many(["x"] * 3))
+        except QueueFullError:
+            rejected.append(1)
+
+    try:
+        threads = [threading.Thread(target=submit) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(accepted) == 3 and len(rejected) == 5
+        assert batcher.stats()["queue_depth"] == 9
+    finally:
+        release.set()
+        batcher.stop()
+
+
+def test_wrong_result_count_fails_every_future():
+    batcher = MicroBatcher(lambda ts: ts[:-1], max_batch_size=4, max_wait_ms=20)
+    batcher.start()
+    try:
+        futures = batcher.submit_many(["a", "b", "c"])
+        for f in futures:
+            with pytest.raises(RuntimeError, match="2 results for 3 texts"):
+                f.result(5)
+    finally:
+        batcher.stop()
+
+
+def test_stop_with_a_full_queue_fails_pending_items():
+    batcher, first, release = blocked_batcher(max_queue_size=2)
+    queued = batcher.submit_many(["a", "b"])
+    stopper = threading.Thread(target=batcher.stop, kwargs={"timeout": 5})
+    stopper.start()
+    release.set()
+    stopper.join(10)
+    assert not stopper.is_alive()
+    assert first.result(5) == "FIRST"
+    for f in queued:
+        # The worker may finish one more batch before it sees the stop
+        try:
+            assert f.result(5) in ("A", "B")
+        except BatcherStoppedError:
+            pass
@@ -0,0 +1,78 @@
+"""
+Tests for MinHash near-duplicate detection.
+
+Run from scraper/:
+    python -m pytest test_near_dup.py
+"""
+import pytest
+
+from near_dup import NearDuplicateIndex, drop_near_duplicates, shingles, text_key
+
+RELEASE = (
+    "The FDA approved a new treatment for chronic migraine today after a phase "
+    "three trial showed fewer headache days in adults receiving the injection monthly"
+)
+REWORDED = RELEASE.replace("today", "on Monday") + " according to the company"
+UNRELATED = "Patients reported a severe rash and nausea after switching to the generic tablet last week"
+
+
+def exact_jaccard(a, b):
+    a, b = shingles(a), shingles(b)
+    return len(a & b) / len(a | b)
+
+
+def test_signature_estimates_jaccard():
+    index = NearDuplicateIndex()
+    similarity = (index.signature(RELEASE) == index.signature(REWORDED)).mean()
+    assert abs(similarity - exact_jaccard(RELEASE, REWORDED)) < 0.15
+
+
+def test_reworded_copy_is_a_duplicate_and_unrelated_text_is_not():
+    index = NearDuplicateIndex(threshold=0.7)
+    assert index.check("release", RELEASE) is None
+    key, similarity = index.check("copy", REWORDED)
+    assert key == "release" and similarity >= 0.7
+    assert index.check("other", UNRELATED) is None
+    assert len(index) == 2  # the duplicate is not indexed
+
+
+def test_check_without_add_leaves_the_index_alone():
+    index = NearDuplicateIndex()
+    assert index.check("release", RELEASE, add=False) is None
+    assert "release" not in index
+    assert index.check("again", RELEASE) is None
+
+
+def test_texts_without_words_are_never_duplicates():
+    index = NearDuplicateIndex()
+    assert index.check("a", "   ") is None
+    assert index.check("b", "...") is None
+    assert len(index) == 0
+
+
+def test_drop_near_duplicates_keeps_the_first():
+    rows = [{"text": RELEASE}, {"text": UNRELATED}, {"text": REWORDED}, {"text": RELEASE}]
+    kept, dropped = drop_near_duplicates(NearDuplicateIndex(), rows)
+    assert kept == rows[:2] and dropped == 2
+
+
+def test_persisted_index_is_shared_between_processes(tmp_path):
+    path = str(tmp_path / "near_dup.sqlite")
+    writer = NearDuplicateIndex(path)
+    writer.add(text_key(RELEASE), RELEASE)
+    writer.commit()
+
+    reader = NearDuplicateIndex(path)
+    assert reader.check("copy", REWORDED, add=False)[0] == text_key(RELEASE)
+    writer.add("other", UNRELATED)
+    writer.commit()
+    assert reader.check("again", UNRELATED, add=False) == ("other", 1.0)
+    writer.close()
+    reader.close()
+
+
+def test_persisted_index_rejects_other_hash_settings(tmp_path):
+    path = str(tmp_path / "near_dup.sqlite")
+    NearDuplicateIndex(path).close()
+    with pytest.raises(ValueError):
+        NearDuplicateIndex(path, num_perm=64)
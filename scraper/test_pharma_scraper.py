@@ -0,0 +1,93 @@
+"""
+Tests for the ClinicalTrials crawl's resumable cursor.
+
+Run from scraper/:
+    python -m pytest test_pharma_scraper.py
+"""
+import asyncio
+import contextlib
+from types import SimpleNamespace
+
+import pharma_scraper
+from pharma_scraper import clinical_trials_pages, clinical_trials_since
+from scraper_state import ScraperState
+
+CURSOR = f"clinicaltrials:{pharma_scraper.CT_QUERY}"
+
+
+def study(nct_id, updated):
+    return {"protocolSection": {
+        "identificationModule": {"nctId": nct_id},
+        "statusModule": {"lastUpdatePostDateStruct": {"date": updated}},
+    }}
+
+
+class FakeClient:
+    """Three pages of studies linked by nextPageToken"""
+
+    PAGES = {
+        None: {"studies": [study("NCT1", "2026-01-02")], "nextPageToken": "t2"},
+        "t2": {"studies": [study("NCT2", "2026-01-03")], "nextPageToken": "t3"},
+        "t3": {"studies": [study("NCT3", "2026-01-04")]},
+    }
+
+    def __init__(self):
+        self.requests = []
+
+    @contextlib.asynccontextmanager
+    async def request(self, method, url, params=None):
+        self.requests.append(params)
+        page = self.PAGES[params.get("pageToken")]
+
+        async def json():
+            return page
+
+        yield SimpleNamespace(
+            raise_for_status=lambda: None,
+            headers={"Content-Type": "application/json"},
+            json=json,
+        )
+
+
+async def crawl(client, state, since, pages=None):
+    """nct ids of the pages read, stopping after ``pages`` like an interrupted run"""
+    read = []
+    crawler = clinical_trials_pages(client, state, since)
+    async for studies in crawler:
+        read.append([s["protocolSection"]["identificationModule"]["nctId"] for s in studies])
+        if pages is not None and len(read) == pages:
+            await crawler.aclose()
+            break
+    state.commit("ClinicalTrials")
+    return read
+
+
+def test_interrupted_crawl_resumes_on_the_page_in_progress(tmp_path):
+    state = ScraperState(str(tmp_path / "state.sqlite"))
+    assert asyncio.run(crawl(FakeClient(), state, "2026-01-01", pages=2)) == [["NCT1"], ["NCT2"]]
+    assert clinical_trials_since(state) == "2026-01-01"
+
+    client = FakeClient()
+    assert asyncio.run(crawl(client, state, "2026-01-01")) == [["NCT2"], ["NCT3"]]
+    assert client.requests[0]["pageToken"] == "t2"
+
+
+def test_finished_crawl_starts_the_next_from_the_newest_update(tmp_path):
+    state = ScraperState(str(tmp_path / "state.sqlite"))
+    asyncio.run(crawl(FakeClient(), state, "2026-01-01"))
+    assert state.cursor(CURSOR)["token"] is None
+    assert clinical_trials_since(state) == "2026-01-04"
+
+    client = FakeClient()
+    asyncio.run(crawl(client, state, clinical_trials_since(state), pages=1))
+    assert "pageToken" not in client.requests[0]
+    assert "RANGE[2026-01-04,MAX]" in client.requests[0]["filter.advanced"]
+
+
+def test_saved_token_is_ignored_for_another_since(tmp_path):
+    state = ScraperState(str(tmp_path / "state.sqlite"))
+    asyncio.run(crawl(FakeClient(), state, "2026-01-01", pages=2))
+
+    client = FakeClient()
+    asyncio.run(crawl(client, state, "2025-12-01", pages=1))
+    assert "pageToken" not in client.requests[0]
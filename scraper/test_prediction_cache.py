@@ -0,0 +1,119 @@
+"""
+Tests for the prediction cache: TTL, LRU bound, version invalidation and
+the shared SQLite store.
+
+Run from scraper/:
+    python -m pytest test_prediction_cache.py
+"""
+import sqlite3
+
+import prediction_cache
+from prediction_cache import PredictionCache
+
+RESULT = {"label": "SIDE_EFFECTS", "confidence": 0.9}
+
+
+def rows(path):
+    with sqlite3.connect(path) as db:
+        return db.execute("SELECT model_version, COUNT(*) FROM predictions GROUP BY model_version").fetchall()
+
+
+def test_hit_ignores_whitespace_and_returns_a_copy():
+    cache = PredictionCache("v1")
+    cache.put("a  headache\n", RESULT)
+    hit = cache.get(" a headache")
+    assert hit == RESULT
+    hit["label"] = "changed"
+    assert cache.get("a headache") == RESULT
+    assert (cache.hits, cache.misses) == (2, 0)
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(prediction_cache.time, "time", lambda: now[0])
+    cache = PredictionCache("v1", ttl_seconds=60)
+    cache.put("text", RESULT)
+    now[0] += 59
+    assert cache.get("text") == RESULT
+    now[0] += 2
+    assert cache.get("text") is None
+    assert cache.expirations == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = PredictionCache("v1", max_entries=2)
+    cache.put("a", RESULT)
+    cache.put("b", RESULT)
+    cache.get("a")
+    cache.put("c", RESULT)
+    assert cache.get("b") is None
+    assert cache.get("a") == RESULT and cache.get("c") == RESULT
+    assert cache.evictions == 1
+
+
+def test_version_change_invalidates_and_drops_stale_writes():
+    cache = PredictionCache("v1")
+    cache.put("text", RESULT)
+    assert cache.set_model_version("v2")
+    assert not cache.set_model_version("v2")
+    assert cache.get("text") is None
+    # A prediction that started under v1 finishes after the swap
+    cache.put_many(["text"], [RESULT], model_version="v1")
+    assert cache.get("text") is None
+    assert cache.invalidations == 1
+
+
+def test_entries_survive_a_restart(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    PredictionCache("v1", path=path).put_many(["a", "b"], [RESULT, RESULT])
+    restored = PredictionCache("v1", path=path)
+    assert restored.get("a") == RESULT and restored.get("b") == RESULT
+    assert PredictionCache("v2", path=path).get("a") is None
+
+
+def test_store_uses_wal(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    PredictionCache("v1", path=path)
+    with sqlite3.connect(path) as db:
+        assert db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_swap_only_deletes_the_old_versions_rows(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    old, new = PredictionCache("v1", path=path), PredictionCache("v1", path=path)
+    old.put("a", RESULT)
+    new.set_model_version("v2")
+    new.put("b", RESULT)
+    # Another worker still on v1 swaps later and must not wipe v2's rows
+    old.put("c", RESULT)
+    old.set_model_version("v2")
+    assert rows(path) == [("v2", 1)]
+
+
+def test_store_is_bounded_by_writes_not_one_workers_lru(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = PredictionCache("v1", max_entries=2, path=path)
+    cache.put_many(["a", "b"], [RESULT, RESULT])
+    cache.get("a")
+    cache.put("c", RESULT)  # evicts "b" from this worker only
+    assert cache.get("b") is None
+    with sqlite3.connect(path) as db:
+        assert db.execute("SELECT COUNT(*) FROM predictions").fetchone()[0] == 2
+    # The newest writes stay on disk for workers that still want "b"
+    assert PredictionCache("v1", max_entries=2, path=path).get("b") == RESULT
+
+
+def test_locked_store_does_not_fail_requests(tmp_path, monkeypatch):
+    monkeypatch.setattr(prediction_cache, "DB_TIMEOUT", 0.05)
+    path = str(tmp_path / "cache.sqlite")
+    cache = PredictionCache("v1", path=path)
+    blocker = sqlite3.connect(path)
+    blocker.execute("BEGIN EXCLUSIVE")
+    try:
+        cache.put("text", RESULT)
+        assert cache.set_model_version("v2")
+        cache.put("text", RESULT)
+        assert cache.get("text") == RESULT
+    finally:
+        blocker.rollback()
+        blocker.close()
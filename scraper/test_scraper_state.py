@@ -0,0 +1,109 @@
+"""
+Tests for the scraper's persistent state: the seen-item Bloom filter and
+exact index, feed validators and crawl cursors.
+
+Run from scraper/:
+    python -m pytest test_scraper_state.py
+"""
+from types import SimpleNamespace
+
+from scraper_state import BloomFilter, ScraperState
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000)
+    items = [f"https://example.com/item/{i}" for i in range(1000)]
+    for item in items:
+        bloom.add(item)
+    assert all(item in bloom for item in items)
+
+
+def test_bloom_filter_false_positive_rate_at_capacity():
+    bloom = BloomFilter(5000, error_rate=0.01)
+    for i in range(5000):
+        bloom.add(f"seen-{i}")
+    false_positives = sum(f"other-{i}" in bloom for i in range(20000))
+    assert false_positives / 20000 < 0.02
+
+
+def test_bloom_filter_round_trips_through_its_bits():
+    bloom = BloomFilter(100)
+    bloom.add("PMID:1")
+    copy = BloomFilter(100, bits=bytes(bloom.bits))
+    assert "PMID:1" in copy and "PMID:2" not in copy
+
+
+def test_items_are_seen_only_after_commit(tmp_path):
+    path = str(tmp_path / "state.sqlite")
+    state = ScraperState(path, capacity=100)
+    assert state.is_new("PubMed", "PMID:1")
+    state.mark_seen("PubMed", ["PMID:1"])
+    assert not state.is_new("PubMed", "PMID:1")  # pending within the run
+
+    # A run stopping before commit re-fetches the item next time
+    state.close()
+    assert ScraperState(path).is_new("PubMed", "PMID:1")
+
+    state = ScraperState(path, capacity=100)
+    state.mark_seen("PubMed", ["PMID:1"])
+    state.commit("PubMed")
+    state.close()
+    restored = ScraperState(path, capacity=100)
+    assert not restored.is_new("FDA", "PMID:1")
+    assert restored.counts["FDA"]["skipped"] == 1
+    assert restored.is_new("FDA", "PMID:2")
+
+
+def test_bloom_filter_grows_past_capacity(tmp_path):
+    path = str(tmp_path / "state.sqlite")
+    state = ScraperState(path, capacity=10)
+    state.mark_seen("RSS", [f"guid-{i}" for i in range(25)])
+    state.commit("RSS")
+    assert state.bloom.capacity >= 25
+    assert all(f"guid-{i}" in state.bloom for i in range(25))
+    state.close()
+
+    restored = ScraperState(path, capacity=10)
+    assert restored.seen_count == 25
+    assert not restored.is_new("RSS", "guid-24")
+
+
+def test_validators_wait_for_a_complete_read(tmp_path):
+    state = ScraperState(str(tmp_path / "state.sqlite"))
+    response = SimpleNamespace(status=200, headers={"ETag": '"v1"', "Last-Modified": "Mon, 01 Jan 2026"})
+    state.record_response("RSS", "https://feed", response)
+
+    state.commit("RSS", validators=False)
+    assert state.validators("https://feed") == {}
+    state.commit("RSS")
+    assert state.validators("https://feed") == {
+        "If-None-Match": '"v1"',
+        "If-Modified-Since": "Mon, 01 Jan 2026",
+    }
+
+    state.record_response("RSS", "https://feed", SimpleNamespace(status=304, headers={}))
+    assert state.counts["RSS"]["not_modified"] == 1
+
+
+def test_cursor_is_saved_with_the_sources_commit(tmp_path):
+    path = str(tmp_path / "state.sqlite")
+    state = ScraperState(path)
+    state.set_cursor("ClinicalTrials", "clinicaltrials:drug", token="page-2", since="2026-01-01")
+    assert state.cursor("clinicaltrials:drug") == {}
+
+    state.commit("ClinicalTrials", cursors=False)
+    assert state.cursor("clinicaltrials:drug") == {}
+    state.set_cursor("ClinicalTrials", "clinicaltrials:drug", token="page-3")
+    state.commit("ClinicalTrials")
+    state.close()
+
+    # Later updates merge into the saved cursor
+    state = ScraperState(path)
+    assert state.cursor("clinicaltrials:drug") == {
+        "token": "page-3", "since": "2026-01-01", "last_completed": None,
+    }
+    state.set_cursor("ClinicalTrials", "clinicaltrials:drug", token=None, last_completed="2026-01-05")
+    state.commit("ClinicalTrials")
+    assert state.cursor("clinicaltrials:drug") == {
+        "token": None, "since": "2026-01-01", "last_completed": "2026-01-05",
+    }
@@ -1,69 +1,431 @@
+"""
+Fine-tune DistilBERT on pharma_mentions.csv and save it to pharma_model/.
+
+Usage:
+    python train_model.py              # tokenize in memory, pad to the longest example
+    python train_model.py --cached     # memory-mapped tokenized cache + per-batch padding
+    python train_model.py --cached --batch-size 32 --epochs 3
+    python train_model.py --incremental  # fine-tune the latest model on rows added since
+    python train_model.py --cached --dedupe-threshold 0.7  # drop near-duplicate rows first
+
+--cached stores the tokenized dataset as Arrow under --cache-dir, keyed by
+the tokenizer and a hash of the data file, so re-runs skip tokenization.
+Padding happens per batch at collation time and batches are built from
+samples of similar length, so cost follows the real number of tokens.
+
+Every run records a watermark in --state (rows of the CSV the model has
+seen, and which model directory holds it). --incremental starts from that
+model, trains on the rows past the watermark plus a replay sample of older
+rows, checkpoints as it goes (re-running after an interruption resumes the
+same run) and writes the result to a new model_versions/vNNNN directory.
+"""
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import re
+import shutil
+import time
+
 import pandas as pd
-from datasets import Dataset
+from datasets import Dataset, load_dataset, load_from_disk
 from transformers import (
+    DataCollatorWithPadding,
     DistilBertTokenizerFast,
     DistilBertForSequenceClassification,
     Trainer,
-    TrainingArguments
+    TrainerCallback,
+    TrainingArguments,
+    default_data_collator
 )
+from transformers.trainer_utils import get_last_checkpoint
 
-# ------------------ Load data ------------------
-df = pd.read_csv("pharma_mentions.csv")
+DATA_FILE = "pharma_mentions.csv"
+BASE_MODEL = "distilbert-base-uncased"
+OUTPUT_DIR = "pharma_model"
+MAX_LENGTH = 512
+STATE_FILE = "train_state.json"
+VERSIONS_DIR = "model_versions"
 
-labels = df['label'].unique().tolist()
-label2id = {l: i for i, l in enumerate(labels)}
-id2label = {i: l for l, i in label2id.items()}
+# ------------------ Data ------------------
+def label_maps(labels):
+    label2id = {l: i for i, l in enumerate(labels)}
+    id2label = {i: l for l, i in label2id.items()}
+    return label2id, id2label
 
-df['labels'] = df['label'].map(label2id)
 
-dataset = Dataset.from_pandas(df[['text', 'labels']])
+def near_duplicate_mask(texts, threshold):
+    """True for the rows to keep: the first of every near-duplicate group"""
+    from near_dup import NearDuplicateIndex, text_key
 
-# ------------------ Tokenization ------------------
-tokenizer = DistilBertTokenizerFast.from_pretrained(
-    "distilbert-base-uncased"
-)
+    index = NearDuplicateIndex(threshold=threshold)
+    keep = [index.check(text_key(t), t) is None for t in texts]
+    print(f"♻️ Dropped {len(keep) - sum(keep)} near-duplicate rows (threshold {threshold})")
+    return keep
+
+
+def build_padded_dataset(data_file, tokenizer, dedupe_threshold=0):
+    """Original path: whole CSV in pandas, padded to the longest in each map batch"""
+    df = pd.read_csv(data_file)
+    if dedupe_threshold:
+        df = df[near_duplicate_mask(df['text'].fillna("").astype(str), dedupe_threshold)]
+
+    labels = df['label'].unique().tolist()
+    label2id, id2label = label_maps(labels)
+
+    df['labels'] = df['label'].map(label2id)
+
+    dataset = Dataset.from_pandas(df[['text', 'labels']])
+
+    def tokenize(batch):
+        return tokenizer(
+            batch["text"],
+            truncation=True,
+            padding=True
+        )
 
-def tokenize(batch):
-    return tokenizer(
-        batch["text"],
-        truncation=True,
-        padding=True
+    dataset = dataset.map(tokenize, batched=True)
+
+    dataset.set_format(
+        "torch",
+        columns=["input_ids", "attention_mask", "labels"]
     )
+    return dataset, label2id, id2label
 
-dataset = dataset.map(tokenize, batched=True)
 
-dataset.set_format(
-    "torch",
-    columns=["input_ids", "attention_mask", "labels"]
-)
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def dataset_cache_key(data_file, tokenizer, label2id, dedupe_threshold=0):
+    key = hashlib.sha256()
+    key.update(file_hash(data_file).encode())
+    key.update(f"dedupe:{dedupe_threshold}".encode())
+    key.update(f"{tokenizer.name_or_path}:{type(tokenizer).__name__}:{len(tokenizer)}:{MAX_LENGTH}".encode())
+    key.update(repr(sorted(label2id.items())).encode())
+    return key.hexdigest()[:16]
+
+
+def encoder(tokenizer, label2id):
+    """Unpadded tokenization with a length column for length grouping"""
+    def encode(batch):
+        encoded = tokenizer(batch["text"], truncation=True, max_length=MAX_LENGTH)
+        encoded["labels"] = [label2id[l] for l in batch["label"]]
+        encoded["length"] = [len(ids) for ids in encoded["input_ids"]]
+        return encoded
+    return encode
+
+
+def build_cached_dataset(data_file, tokenizer, cache_dir, labels=None, dedupe_threshold=0):
+    """
+    Tokenize without padding into a memory-mapped Arrow dataset, reusing a
+    previous run's cache when the data and tokenizer are unchanged.
+    """
+    raw = load_dataset(
+        "csv", data_files=data_file, split="train",
+        cache_dir=os.path.join(cache_dir, "raw")
+    )
+    raw = raw.filter(
+        lambda b: [t is not None and l is not None for t, l in zip(b["text"], b["label"])],
+        batched=True
+    )
+
+    label2id, id2label = label_maps(labels or raw.unique("label"))
+    path = os.path.join(cache_dir, dataset_cache_key(data_file, tokenizer, label2id, dedupe_threshold))
+
+    if os.path.isdir(path):
+        print(f"♻️ Reusing tokenized cache {path}")
+        return load_from_disk(path), label2id, id2label
+
+    started = time.perf_counter()
+    if dedupe_threshold:
+        keep = near_duplicate_mask(raw["text"], dedupe_threshold)
+        raw = raw.select([i for i, k in enumerate(keep) if k])
+    encoded = raw.map(encoder(tokenizer, label2id), batched=True, remove_columns=raw.column_names)
+    encoded.save_to_disk(path)
+    print(f"💾 Tokenized {len(encoded)} rows into {path} in {time.perf_counter() - started:.1f}s")
+
+    # Re-open so training reads the memory-mapped files, not the in-memory copy
+    return load_from_disk(path), label2id, id2label
+
+
+# ------------------ Throughput reporting ------------------
+class CountingCollator:
+    """Wraps a collator to count samples and real vs. padded tokens"""
+
+    def __init__(self, collator):
+        self.collator = collator
+        self.reset()
+
+    def reset(self):
+        self.samples = 0
+        self.tokens = 0
+        self.padded_tokens = 0
+
+    def __call__(self, features):
+        batch = self.collator(features)
+        mask = batch["attention_mask"]
+        self.samples += mask.shape[0]
+        self.tokens += int(mask.sum())
+        self.padded_tokens += mask.numel()
+        return batch
+
+
+class ThroughputCallback(TrainerCallback):
+    def __init__(self, counter):
+        self.counter = counter
+        self.epoch_times = []
+
+    def on_epoch_begin(self, args, state, control, **kwargs):
+        self.counter.reset()
+        self.started = time.perf_counter()
+
+    def on_epoch_end(self, args, state, control, **kwargs):
+        elapsed = time.perf_counter() - self.started
+        self.epoch_times.append(elapsed)
+        c = self.counter
+        print(
+            f"⏱️ Epoch {len(self.epoch_times)}: {elapsed:.1f}s, "
+            f"{c.samples / elapsed:.1f} samples/s, {c.tokens / elapsed:.0f} tokens/s, "
+            f"{c.tokens / max(c.padded_tokens, 1):.0%} of batch tokens are real"
+        )
+
+
+def length_grouping_args():
+    """transformers 5 replaced group_by_length with train_sampling_strategy"""
+    params = inspect.signature(TrainingArguments.__init__).parameters
+    if "train_sampling_strategy" in params:
+        return {"train_sampling_strategy": "group_by_length", "length_column_name": "length"}
+    return {"group_by_length": True, "length_column_name": "length"}
 
-# ------------------ Model ------------------
-model = DistilBertForSequenceClassification.from_pretrained(
-    "distilbert-base-uncased",
-    num_labels=len(labels),
-    id2label=id2label,
-    label2id=label2id
-)
 
 # ------------------ Training ------------------
-training_args = TrainingArguments(
-    output_dir="./model",
-    per_device_train_batch_size=4,  # smaller batch
-    num_train_epochs=3,
-    logging_steps=5,
-    save_strategy="epoch",
-    report_to="none",
-)
+def train(args):
+    tokenizer = DistilBertTokenizerFast.from_pretrained(BASE_MODEL)
 
+    if args.cached:
+        dataset, label2id, id2label = build_cached_dataset(
+            args.data, tokenizer, args.cache_dir, dedupe_threshold=args.dedupe_threshold
+        )
+        collator = CountingCollator(DataCollatorWithPadding(tokenizer, pad_to_multiple_of=8))
+        extra_args = length_grouping_args()
+    else:
+        dataset, label2id, id2label = build_padded_dataset(args.data, tokenizer, args.dedupe_threshold)
+        collator = CountingCollator(default_data_collator)
+        extra_args = {}
 
-trainer = Trainer(
-    model=model,
-    args=training_args,
-    train_dataset=dataset
-)
+    # ------------------ Model ------------------
+    model = DistilBertForSequenceClassification.from_pretrained(
+        BASE_MODEL,
+        num_labels=len(label2id),
+        id2label=id2label,
+        label2id=label2id
+    )
+
+    training_args = TrainingArguments(
+        output_dir="./model",
+        per_device_train_batch_size=args.batch_size,
+        num_train_epochs=args.epochs,
+        logging_steps=5,
+        save_strategy="epoch",
+        report_to="none",
+        **extra_args,
+    )
+
+    throughput = ThroughputCallback(collator)
+    trainer = Trainer(
+        model=model,
+        args=training_args,
+        train_dataset=dataset,
+        data_collator=collator,
+        callbacks=[throughput],
+    )
+
+    started = time.perf_counter()
+    trainer.train()
+    elapsed = time.perf_counter() - started
+    print(
+        f"✅ Trained on {len(dataset)} rows x {args.epochs} epochs in {elapsed:.1f}s "
+        f"({len(dataset) * args.epochs / elapsed:.1f} samples/s)"
+    )
+
+    # ------------------ Save ------------------
+    model.save_pretrained(args.output_dir)
+    tokenizer.save_pretrained(args.output_dir)
+    record_watermark(args.state, pd.read_csv(args.data), args.output_dir)
+
+
+# ------------------ Incremental training ------------------
+def read_state(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_state(path, state):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+
+def rows_hash(df):
+    """Detects edits to rows below the watermark (the CSV is append-only)"""
+    hashed = pd.util.hash_pandas_object(df[["text", "label"]], index=False)
+    return hashlib.sha256(hashed.values.tobytes()).hexdigest()
+
+
+def record_watermark(state_path, df, model_dir):
+    state = read_state(state_path)
+    state.pop("pending", None)
+    state.update({
+        "rows": len(df),
+        "rows_hash": rows_hash(df),
+        "model_dir": model_dir,
+        "trained_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    })
+    write_state(state_path, state)
+    print(f"📌 Watermark: {len(df)} rows -> {model_dir}")
+
+
+def next_version_dir(versions_dir):
+    os.makedirs(versions_dir, exist_ok=True)
+    existing = [int(name[1:]) for name in os.listdir(versions_dir) if re.fullmatch(r"v\d+", name)]
+    return os.path.join(versions_dir, f"v{max(existing, default=0) + 1:04d}")
+
+
+def incremental(args):
+    state = read_state(args.state)
+    if "rows" not in state:
+        raise SystemExit(f"❌ No watermark in {args.state}; run a full training first")
+
+    df = pd.read_csv(args.data)
+    seen = state["rows"]
+    if len(df) < seen or rows_hash(df.iloc[:seen]) != state["rows_hash"]:
+        raise SystemExit("❌ Rows below the watermark changed; run a full training instead")
+
+    # An interrupted run is resumed with exactly the same rows and replay sample
+    pending = state.get("pending")
+    if pending:
+        print(f"🔁 Resuming interrupted run into {pending['version_dir']}")
+    else:
+        pending = {
+            "version_dir": next_version_dir(args.versions_dir),
+            "base_model": state.get("model_dir", OUTPUT_DIR),
+            "end_rows": len(df),
+            "seed": args.seed,
+        }
+
+    end = pending["end_rows"]
+    new = df.iloc[seen:end].dropna(subset=["text", "label"])
+    if new.empty:
+        print(f"✅ No new labeled rows since the watermark ({seen} rows)")
+        return
+
+    tokenizer = DistilBertTokenizerFast.from_pretrained(pending["base_model"])
+    model = DistilBertForSequenceClassification.from_pretrained(pending["base_model"])
+    label2id = model.config.label2id
+
+    unknown = set(new["label"]) - set(label2id)
+    if unknown:
+        raise SystemExit(f"❌ New labels {sorted(unknown)} need a full training (the head changes size)")
+
+    old = df.iloc[:seen].dropna(subset=["text", "label"])
+    replay = old.sample(
+        n=min(len(old), round(len(new) * args.replay_ratio)), random_state=pending["seed"]
+    )
+    print(
+        f"📊 {len(new)} new rows + {len(replay)} replayed rows, "
+        f"starting from {pending['base_model']}"
+    )
+
+    frame = pd.concat([new, replay])[["text", "label"]]
+    if args.dedupe_threshold:
+        frame = frame[near_duplicate_mask(frame["text"].astype(str), args.dedupe_threshold)]
+    dataset = Dataset.from_pandas(frame, preserve_index=False)
+    dataset = dataset.map(encoder(tokenizer, label2id), batched=True, remove_columns=["text", "label"])
+
+    state["pending"] = pending
+    write_state(args.state, state)
+
+    checkpoint_dir = os.path.join(pending["version_dir"], "checkpoints")
+    resume_from = get_last_checkpoint(checkpoint_dir) if os.path.isdir(checkpoint_dir) else None
+
+    training_args = TrainingArguments(
+        output_dir=checkpoint_dir,
+        per_device_train_batch_size=args.batch_size,
+        num_train_epochs=args.epochs,
+        learning_rate=args.learning_rate,
+        logging_steps=5,
+        save_strategy="steps",
+        save_steps=args.save_steps,
+        save_total_limit=2,
+        seed=pending["seed"],
+        report_to="none",
+        **length_grouping_args(),
+    )
+
+    collator = CountingCollator(DataCollatorWithPadding(tokenizer, pad_to_multiple_of=8))
+    trainer = Trainer(
+        model=model,
+        args=training_args,
+        train_dataset=dataset,
+        data_collator=collator,
+        callbacks=[ThroughputCallback(collator)],
+    )
+
+    started = time.perf_counter()
+    trainer.train(resume_from_checkpoint=resume_from)
+    print(f"✅ Incremental training took {time.perf_counter() - started:.1f}s")
+
+    model.save_pretrained(pending["version_dir"])
+    tokenizer.save_pretrained(pending["version_dir"])
+    shutil.rmtree(checkpoint_dir, ignore_errors=True)
+    record_watermark(args.state, df.iloc[:end], pending["version_dir"])
+    print(f"🚀 Load it with POST /admin/models/load {{\"model_dir\": \"{pending['version_dir']}\"}}"
+          " and an X-Admin-Token header")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fine-tune the pharma classifier")
+    parser.add_argument("--data", default=DATA_FILE)
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--epochs", type=float, default=3)
+    parser.add_argument(
+        "--cached", action="store_true",
+        help="Use the memory-mapped tokenized cache with per-batch padding and length grouping"
+    )
+    parser.add_argument("--cache-dir", default="tokenized_cache")
+    parser.add_argument("--state", default=STATE_FILE, help="Training watermark file")
+    parser.add_argument(
+        "--dedupe-threshold", type=float, default=0,
+        help="Drop near-duplicate rows at this MinHash similarity (0 keeps everything)"
+    )
+
+    inc = parser.add_argument_group("incremental")
+    inc.add_argument("--incremental", action="store_true")
+    inc.add_argument("--versions-dir", default=VERSIONS_DIR)
+    inc.add_argument(
+        "--replay-ratio", type=float, default=1.0,
+        help="Older rows replayed per new row, to avoid forgetting"
+    )
+    inc.add_argument("--learning-rate", type=float, default=2e-5)
+    inc.add_argument("--save-steps", type=int, default=50)
+    inc.add_argument("--seed", type=int, default=42)
+
+    args = parser.parse_args()
+    if args.incremental:
+        incremental(args)
+    else:
+        train(args)
 
-trainer.train()
 
-# ------------------ Save ------------------
-model.save_pretrained("pharma_model")
-tokenizer.save_pretrained("pharma_model")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""
+Materialized per-category event counts at minute, hour and day resolution.
+
+Each sync finds the events stored since the last one and recomputes, from
+the events collection, every (category, day) they fall in: the minute,
+hour and day counts of that day are written with $set. A repeated or
+interrupted sync therefore rewrites the same numbers instead of counting
+events twice. New events are found by _id with an overlap of SYNC_OVERLAP,
+because ObjectIds made by different processes (the backend and
+bulk_classify) are not inserted in order. A lease document serializes
+syncs across threads and processes, so a detection run reads a few hundred
+rollup rows instead of every raw event. Counts come back gap-filled:
+buckets without events are explicit zeros, so quiet periods lower the
+baseline instead of being skipped.
+"""
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+from bson import ObjectId
+from pymongo import ASCENDING, DeleteMany, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from model.trend_model import bucket_width
+
+# Resolution name -> pandas frequency of its buckets
+RESOLUTIONS = {
+    "minute": "min",
+    "hour": "h",
+    "day": "D",
+}
+
+WATERMARK_ID = "_watermark"
+LEASE_ID = "_sync_lease"
+# Events are re-read from this long before the newest one already synced,
+# covering clock skew and insert latency between writers
+SYNC_OVERLAP = timedelta(minutes=10)
+
+
+def event_time(doc):
+    """Events carry "createdAt"; older bulk_classify rows carried "timestamp" """
+    return doc.get("timestamp") or doc.get("createdAt")
+
+
+def utc_naive(stamps):
+    return pd.to_datetime(stamps, utc=True).tz_localize(None)
+
+
+def resolution_for(bucket):
+    """Coarsest resolution whose buckets tile ``bucket`` (e.g. "2h" -> "hour"), or None"""
+    width = bucket_width(bucket)
+    for name in ("day", "hour", "minute"):
+        if width % bucket_width(RESOLUTIONS[name]) == pd.Timedelta(0):
+            return name
+    return None
+
+
+class RollupStore:
+    def __init__(self, collection, lease_seconds=300):
+        """
+        Args:
+            collection: Mongo collection holding the rollups, the sync
+                watermark and the sync lease (one rollup document per
+                resolution, category and bucket)
+            lease_seconds: How long a sync holds the lease before another
+                process may take it over (covers a crashed holder)
+        """
+        self.col = collection
+        self.col.create_index([("resolution", ASCENDING), ("bucket", ASCENDING)])
+        self.col.create_index([("category", ASCENDING), ("bucket", ASCENDING)])
+        self.lease = timedelta(seconds=lease_seconds)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{id(self)}"
+        self._lock = threading.Lock()
+
+    # ------------------ Lease ------------------
+    def _acquire(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            now = datetime.utcnow()
+            try:
+                self.col.find_one_and_update(
+                    {"_id": LEASE_ID, "$or": [{"expires": {"$lt": now}}, {"owner": self.owner}]},
+                    {"$set": {"owner": self.owner, "expires": now + self.lease}},
+                    upsert=True,
+                )
+                return True
+            except DuplicateKeyError:  # held by someone else
+                if time.monotonic() >= deadline:
+                    return False
+                time.sleep(0.5)
+
+    def _release(self):
+        self.col.delete_one({"_id": LEASE_ID, "owner": self.owner})
+
+    # ------------------ Sync ------------------
+    def sync(self, events_col, timeout=60, batch_size=10000):
+        """
+        Bring the rollups up to date with the events collection; returns
+        how many events were read.
+
+        Waits up to ``timeout`` seconds for a sync running elsewhere; if it
+        is still running, returns 0 and the rollups are as fresh as that
+        sync leaves them.
+        """
+        with self._lock:
+            if not self._acquire(timeout):
+                print("⚠️ Rollup sync still running elsewhere, using the rollups as they are")
+                return 0
+            try:
+                return self._sync(events_col, batch_size)
+            finally:
+                self._release()
+
+    def _sync(self, events_col, batch_size):
+        watermark = self.col.find_one({"_id": WATERMARK_ID})
+        query = {}
+        if watermark:
+            query = {"_id": {"$gte": ObjectId.from_datetime(watermark["synced_to"] - SYNC_OVERLAP)}}
+
+        categories, stamps = [], []
+        newest = None
+        read = 0
+        cursor = (
+            events_col.find(query, {"category": 1, "createdAt": 1, "timestamp": 1})
+            .sort("_id", ASCENDING)
+            .batch_size(batch_size)
+        )
+        for doc in cursor:
+            read += 1
+            if isinstance(doc["_id"], ObjectId):
+                newest = doc["_id"].generation_time.replace(tzinfo=None)
+            if doc.get("category") and event_time(doc):
+                categories.append(doc["category"])
+                stamps.append(event_time(doc))
+
+        # (category, day) pairs to recompute
+        touched = set(zip(categories, utc_naive(stamps).floor("D")))
+        if touched:
+            self._recompute(events_col, touched)
+        # The watermark moves only after the days are rewritten
+        if newest is not None:
+            self.col.replace_one(
+                {"_id": WATERMARK_ID},
+                {"_id": WATERMARK_ID, "synced_to": newest, "synced_at": datetime.utcnow()},
+                upsert=True,
+            )
+        return read
+
+    def _recompute(self, events_col, touched):
+        """Rewrite every bucket of the touched (category, day) pairs"""
+        first = min(day for _, day in touched).to_pydatetime()
+        last = (max(day for _, day in touched) + pd.Timedelta(days=1)).to_pydatetime()
+        window = {"$gte": first, "$lt": last}
+        docs = list(events_col.find(
+            {
+                "category": {"$in": sorted({c for c, _ in touched})},
+                "$or": [{"timestamp": window}, {"createdAt": window}],
+            },
+            {"_id": 0, "category": 1, "createdAt": 1, "timestamp": 1},
+        ))
+
+        events = pd.DataFrame({
+            "category": [d["category"] for d in docs],
+            "timestamp": utc_naive([event_time(d) for d in docs]),
+        })
+        events["day"] = events["timestamp"].dt.floor("D")
+        keep = pd.MultiIndex.from_frame(events[["category", "day"]]).isin(list(touched))
+        events = events[keep]
+
+        ops = []
+        written = {pair: [] for pair in touched}  # (category, day) -> rollup ids
+        for resolution, freq in RESOLUTIONS.items():
+            buckets = events.assign(bucket=events["timestamp"].dt.floor(freq))
+            counts = buckets.groupby(["category", "bucket"]).size()
+            for (category, bucket), count in counts.items():
+                rollup_id = f"{resolution}|{category}|{bucket.isoformat()}"
+                written[category, bucket.floor("D")].append(rollup_id)
+                ops.append(UpdateOne(
+                    {"_id": rollup_id},
+                    {"$set": {
+                        "resolution": resolution,
+                        "category": category,
+                        "bucket": bucket.to_pydatetime(),
+                        "count": int(count),
+                    }},
+                    upsert=True,
+                ))
+
+        # Buckets of a touched day that no longer have events (deleted ones)
+        for (category, day), ids in written.items():
+            ops.append(DeleteMany({
+                "category": category,
+                "bucket": {"$gte": day.to_pydatetime(), "$lt": (day + pd.Timedelta(days=1)).to_pydatetime()},
+                "_id": {"$nin": ids},
+            }))
+        self.col.bulk_write(ops, ordered=True)
+
+    def counts(self, resolution="hour", since=None, until=None, categories=None, bucket=None,
+               include_open=False):
+        """
+        Gap-filled counts as a DataFrame with category, hour and count.
+
+        Args:
+            resolution: Rollup resolution to read ("minute", "hour", "day")
+            since: First bucket of every series; default each category's first
+            until: Reference time (default: now)
+            categories: Only these categories
+            bucket: Pandas frequency to sum the rollups into, a multiple of
+                the resolution (e.g. "2h" over "hour"); default the resolution
+            include_open: Also return the bucket still open at ``until``;
+                by default series end at the last closed bucket, so a batch
+                run never scores a bucket that has only begun to fill
+
+        Zeros are included. The time column keeps detect_trends' name,
+        "hour", at any resolution.
+        """
+        freq = RESOLUTIONS[resolution]
+        bucket = bucket or freq
+        width = bucket_width(bucket)
+        end = pd.Timestamp(until or datetime.utcnow()).floor(bucket)  # the open bucket
+        if not include_open:
+            end -= width
+        query = {"resolution": resolution, "bucket": {"$lt": (end + width).to_pydatetime()}}
+        if since is not None:
+            query["bucket"]["$gte"] = pd.Timestamp(since).floor(bucket).to_pydatetime()
+        if categories is not None:
+            query["category"] = {"$in": list(categories)}
+
+        docs = list(self.col.find(query, {"_id": 0, "category": 1, "bucket": 1, "count": 1}))
+        if not docs:
+            return pd.DataFrame(columns=["category", "hour", "count"])
+
+        rows = pd.DataFrame(docs)
+        rows["bucket"] = rows["bucket"].dt.floor(bucket)
+        series = []
+        for category, group in rows.groupby("category", sort=False):
+            start = group["bucket"].min() if since is None else pd.Timestamp(since).floor(bucket)
+            index = pd.date_range(start, end, freq=bucket)
+            filled = group.groupby("bucket")["count"].sum().reindex(index, fill_value=0)
+            series.append(pd.DataFrame({"category": category, "hour": index, "count": filled.to_numpy()}))
+        return pd.concat(series, ignore_index=True)
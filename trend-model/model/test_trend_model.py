@@ -0,0 +1,116 @@
+"""
+Tests for the batch and streaming trend detectors.
+
+Run from trend-model/:
+    python -m pytest model
+"""
+import contextlib
+import io
+
+import pandas as pd
+import pytest
+
+from model.trend_model import (
+    MIN_BASELINE,
+    SEVERITY_RANK,
+    StreamingTrendDetector,
+    detect_trends,
+)
+
+
+def batches(every, size, hours, spike_at=None, spike_size=0):
+    """``size`` events every ``every``, stamped within the batch's minute"""
+    starts = pd.date_range("2026-01-01", periods=int(pd.Timedelta(hours=hours) / pd.Timedelta(every)), freq=every)
+    times = []
+    for i, start in enumerate(starts):
+        n = spike_size if i == spike_at else size
+        times.extend(start + pd.Timedelta(seconds=s % 60) for s in range(n))
+    return times
+
+
+def streamed(times, bucket, min_baseline=MIN_BASELINE):
+    detector = StreamingTrendDetector(bucket=bucket, min_baseline=min_baseline)
+    return [t for t in (detector.update("SIDE_EFFECTS", ts) for ts in times) if t is not None]
+
+
+def batched(times, bucket, min_baseline=0):
+    """detect_trends at the end of every bucket, like a scheduled run"""
+    counts = pd.Series(1, index=pd.DatetimeIndex(times)).resample(bucket).sum()
+    trends = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for end in range(1, len(counts) + 1):
+            window = counts.iloc[:end]
+            df = pd.DataFrame({"category": "SIDE_EFFECTS", "hour": window.index, "count": window.to_numpy()})
+            trends.extend(detect_trends(df, bucket=bucket, min_baseline=min_baseline))
+    return trends
+
+
+def by_window(trends):
+    windows = {}
+    for t in trends:
+        key = (t["category"], t["windowStart"])
+        if SEVERITY_RANK[t["severity"]] > SEVERITY_RANK[windows.get(key)]:
+            windows[key] = t["severity"]
+    return windows
+
+
+@pytest.mark.parametrize("every,size,hours,bucket", [
+    ("10min", 3, 4, "min"),
+    ("2h", 40, 72, "2h"),
+    ("1min", 5, 4, "min"),
+])
+def test_steady_input_streams_no_trends(every, size, hours, bucket):
+    assert streamed(batches(every, size, hours), bucket) == []
+
+
+def test_spike_is_one_window_in_both_detectors():
+    times = batches("2h", 40, 72, spike_at=30, spike_size=200)
+    stream = by_window(streamed(times, "2h"))
+    assert len(stream) == 1
+    assert stream == by_window(batched(times, "2h", min_baseline=MIN_BASELINE))
+
+
+def test_stream_severity_only_climbs_within_a_window():
+    times = batches("2h", 40, 72, spike_at=30, spike_size=200)
+    trends = streamed(times, "2h")
+    ranks = [SEVERITY_RANK[t["severity"]] for t in trends]
+    assert len({t["windowStart"] for t in trends}) == 1
+    assert ranks == sorted(ranks) and len(set(ranks)) == len(ranks)
+
+
+@pytest.mark.parametrize("every,size,hours,bucket", [
+    ("10min", 3, 4, "min"),
+    ("2h", 40, 72, "2h"),
+])
+def test_stream_matches_batch_without_a_floor(every, size, hours, bucket):
+    times = batches(every, size, hours, spike_at=10, spike_size=4 * size)
+    assert by_window(streamed(times, bucket, min_baseline=0)) == by_window(batched(times, bucket))
+
+
+def test_batch_default_has_no_baseline_floor():
+    # 1 event after 3 empty buckets: 4x, reported unless a floor is asked for
+    df = pd.DataFrame({
+        "category": "SIDE_EFFECTS",
+        "hour": pd.date_range("2026-01-01", periods=5, freq="h"),
+        "count": [1, 0, 0, 0, 1],
+    })
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert [t["severity"] for t in detect_trends(df, bucket="h")] == ["CRITICAL"]
+        assert detect_trends(df, bucket="h", min_baseline=MIN_BASELINE) == []
+
+
+def test_checkpoint_round_trip_continues_identically():
+    times = batches("2h", 40, 72, spike_at=30, spike_size=200)
+    half = len(times) // 2
+
+    straight = StreamingTrendDetector(bucket="2h")
+    expected = [t for t in (straight.update("SIDE_EFFECTS", ts) for ts in times) if t is not None]
+
+    first = StreamingTrendDetector(bucket="2h")
+    for ts in times[:half]:
+        first.update("SIDE_EFFECTS", ts)
+    resumed = StreamingTrendDetector.from_dict(first.to_dict())
+    got = [t for t in (resumed.update("SIDE_EFFECTS", ts) for ts in times[half:]) if t is not None]
+
+    strip = lambda trends: [{k: v for k, v in t.items() if k != "detectedAt"} for t in trends]
+    assert strip(got) == strip(expected)
@@ -1,6 +1,13 @@
 """
 Enhanced Trend Detection Model with Comprehensive Analytics
 """
+import json
+import math
+import os
+import tempfile
+from collections import Counter, deque
+
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 
@@ -14,6 +21,11 @@ SPIKE_THRESHOLDS = {
     'HIGH': 2.0,          # 100% increase (2x)
     'CRITICAL': 3.0       # 200% increase (3x)
 }
+SEVERITY_RANK = {None: 0, 'LOW': 1, 'MEDIUM': 2, 'HIGH': 3, 'CRITICAL': 4}
+# Average events per bucket the window must hold before its latest bucket
+# for a spike to count; below it, any batch after a quiet spell scores as
+# CRITICAL (e.g. 1 event after 3 empty buckets = 4x)
+MIN_BASELINE = 1.0
 
 
 def calculate_severity(spike_score):
@@ -72,13 +84,186 @@ def get_top_sources(category, events_df, limit=3):
     ]
 
 
-def detect_trends(csv_path, events_data=None):
+class EventIndex:
+    """
+    Sample texts and top sources of every series, computed once.
+
+    Same results as get_sample_events / get_top_sources per series, but the
+    raw events are sorted and counted in one grouped pass, so looking up a
+    trending series is a dict access instead of a scan of all events.
+    """
+
+    def __init__(self, events_df, keys=("category",), samples=5, sources=3):
+        """
+        Args:
+            events_df: Raw events with the key columns, "timestamp", "text"
+                and "source"
+            keys: Series columns, as in detect_trends
+            samples: Latest texts kept per series
+            sources: Top sources kept per series
+        """
+        keys = list(keys)
+        self.keys = keys
+
+        # Newest first; the stable sort keeps nlargest's first-occurrence ties
+        latest = events_df.sort_values("timestamp", ascending=False, kind="mergesort")
+        latest = latest.groupby(keys, sort=False).head(samples)
+        self._samples = {
+            key: group["text"].tolist()
+            for key, group in latest.groupby(keys, sort=False)
+        }
+
+        # value_counts order: by count, ties in order of first appearance
+        counts = events_df.groupby(keys + ["source"], sort=False).size().reset_index(name="count")
+        counts = counts.sort_values("count", ascending=False, kind="mergesort")
+        counts = counts.groupby(keys, sort=False).head(sources)
+        self._sources = {
+            key: [{"source": source, "count": int(count)} for source, count in zip(group["source"], group["count"])]
+            for key, group in counts.groupby(keys, sort=False)
+        }
+
+    def samples(self, key):
+        """Latest texts of a series; key is the tuple of its key values"""
+        return self._samples.get(tuple(key), [])
+
+    def sources(self, key):
+        """Top sources of a series as [{"source", "count"}]"""
+        return self._sources.get(tuple(key), [])
+
+
+def bucket_width(bucket):
+    """Pandas frequency ("min", "2h", "D") -> Timedelta"""
+    return pd.Timedelta(pd.tseries.frequencies.to_offset(bucket).nanos)
+
+
+def duration_label(width):
+    """Timedelta -> "30m", "1h", "1d" as used in windowDuration"""
+    seconds = int(width.total_seconds())
+    for unit, size in (("d", 86400), ("h", 3600), ("m", 60)):
+        if seconds % size == 0:
+            return f"{seconds // size}{unit}"
+    return f"{seconds}s"
+
+
+def trend_record(category, spike_score, current_count, baseline_count, historical_scores,
+                 window_end, sample_texts=(), top_sources=(), extra=None, bucket=None):
+    """
+    Trend document as stored in the trends collection.
+
+    With a ``bucket`` frequency, ``window_end`` is the start of the spiking
+    bucket and the window is that bucket; without one the legacy 2-hour
+    window ending at ``window_end`` is reported.
+    """
+    percent_increase = ((current_count - baseline_count) / baseline_count) * 100
+    if bucket is None:
+        window_start = window_end - timedelta(hours=2)  # Based on your 2-hour scheduler
+        window_duration = "2h"
+        comparison_period = f"vs last {WINDOW_SIZE * 2}h average"
+    else:
+        width = bucket_width(bucket)
+        window_start, window_end = window_end, window_end + width
+        window_duration = duration_label(width)
+        comparison_period = f"vs last {duration_label(width * WINDOW_SIZE)} average"
+
+    return {
+        # Core metrics
+        "category": category,
+        **(extra or {}),
+        "spikeScore": round(float(spike_score), 2),
+        "currentCount": current_count,
+        "baselineCount": round(float(baseline_count), 2),
+        "percentIncrease": round(float(percent_increase), 1),
+        
+        # Severity and direction
+        "severity": calculate_severity(spike_score),
+        "trendDirection": calculate_trend_direction(spike_score, historical_scores),
+        
+        # Temporal information
+        "windowStart": window_start.isoformat(),
+        "windowEnd": window_end.isoformat(),
+        "windowDuration": window_duration,
+        "detectedAt": datetime.now().isoformat(),
+        
+        # Sample data
+        "sampleTexts": list(sample_texts),
+        "topSources": list(top_sources),
+        
+        # Comparison
+        "comparisonPeriod": comparison_period,
+        
+        # Status
+        "isActive": True
+    }
+
+
+def rolling_stats(df, keys=("category",)):
+    """
+    Rolling mean/std and spike score of every series in one grouped pass.
+
+    Rows are sorted once by keys and hour, so each series is a contiguous
+    run; window sums then come from one cumulative sum (exact for integer
+    counts) instead of a filter, copy, sort and rolling() per series.
+
+    Args:
+        df: Aggregated counts with the key columns, "hour" and "count"
+        keys: Columns identifying a series, e.g. ("category", "source")
+
+    Returns:
+        The rows sorted by keys and hour with "rolling_mean", "rolling_std",
+        "spike_score", "position" (row number within its series),
+        "series_size" and "series_order" (order of first appearance)
+    """
+    keys = list(keys)
+    df = df.dropna(subset=keys).copy()  # rows without a key match no series
+    df["series_order"] = df.groupby(keys, sort=False).ngroup()
+    df = df.sort_values(["series_order", "hour"], kind="mergesort").reset_index(drop=True)
+
+    grouped = df.groupby("series_order", sort=False)
+    df["position"] = grouped.cumcount()
+    df["series_size"] = grouped["count"].transform("size")
+
+    counts = df["count"].to_numpy(dtype="float64")
+    sums = np.cumsum(counts)
+    squares = np.cumsum(counts ** 2)
+    full = df["position"].to_numpy() >= WINDOW_SIZE - 1
+
+    def window(cumulative):
+        shifted = np.concatenate([np.zeros(WINDOW_SIZE), cumulative[:-WINDOW_SIZE]])[:len(cumulative)]
+        return np.where(full, cumulative - shifted, np.nan)
+
+    window_sum, window_squares = window(sums), window(squares)
+    variance = (WINDOW_SIZE * window_squares - window_sum ** 2) / (WINDOW_SIZE * (WINDOW_SIZE - 1))
+
+    df["rolling_mean"] = window_sum / WINDOW_SIZE
+    df["rolling_std"] = np.sqrt(np.maximum(variance, 0))
+    df["spike_score"] = df["count"] / df["rolling_mean"]
+    return df
+
+
+def prior_mean(rolling_mean, count, window_size=WINDOW_SIZE):
+    """Mean of the window's buckets before the latest one"""
+    if window_size < 2:
+        return rolling_mean
+    return (rolling_mean * window_size - count) / (window_size - 1)
+
+
+def detect_trends(csv_path, events_data=None, keys=("category",), bucket=None, min_baseline=0):
     """
     Enhanced trend detection with comprehensive analytics.
     
     Args:
-        csv_path: Path to aggregated events CSV
-        events_data: Optional - raw events DataFrame for sampling
+        csv_path: Path to aggregated events CSV (or the aggregated DataFrame)
+        events_data: Optional - raw events DataFrame for sampling, or any
+            lookup with samples(key) and sources(key), such as an EventIndex
+            built with the same keys
+        keys: Columns identifying a series; "category" plus optional finer
+            keys such as "source", which are copied into each trend
+        bucket: Pandas frequency of the "hour" buckets (e.g. "min", "h",
+            "D" from RollupStore.counts) used for the trend windows;
+            None keeps the legacy fixed 2-hour window
+        min_baseline: Least average count of the buckets before the latest
+            one for it to be reported; 0 (the default) keeps the original
+            output, MIN_BASELINE matches StreamingTrendDetector
     
     Returns:
         List of detected trends with rich metadata
@@ -88,8 +273,12 @@ def detect_trends(csv_path, events_data=None):
     print("🔍 ENHANCED TREND DETECTION")
     print("="*60)
     
+    keys = list(keys)
+    if "category" not in keys:
+        raise ValueError(f"keys must include 'category', got {keys}")
+
     # Read aggregated data
-    df = pd.read_csv(csv_path)
+    df = csv_path if isinstance(csv_path, pd.DataFrame) else pd.read_csv(csv_path)
     
     if df.empty:
         print("❌ No data available for trend detection")
@@ -100,22 +289,33 @@ def detect_trends(csv_path, events_data=None):
     
     results = []
     
-    # Process each category
-    for category in df["category"].unique():
-        cat_df = df[df["category"] == category].copy()
-        cat_df = cat_df.sort_values("hour")
-        
-        if len(cat_df) < WINDOW_SIZE + 1:
-            print(f"⚠️ {category}: Insufficient data (need {WINDOW_SIZE + 1} points, have {len(cat_df)})")
-            continue
-        
-        # Calculate rolling statistics
-        cat_df["rolling_mean"] = cat_df["count"].rolling(window=WINDOW_SIZE).mean()
-        cat_df["rolling_std"] = cat_df["count"].rolling(window=WINDOW_SIZE).std()
-        cat_df["spike_score"] = cat_df["count"] / cat_df["rolling_mean"]
-        
-        # Get latest data point
-        latest = cat_df.iloc[-1]
+    # Rolling statistics for every series at once
+    stats = rolling_stats(df, keys)
+    latest_rows = stats[stats["position"] == stats["series_size"] - 1]
+
+    short = latest_rows[latest_rows["series_size"] < WINDOW_SIZE + 1]
+    for _, row in short.head(20).iterrows():
+        name = " / ".join(str(row[k]) for k in keys)
+        print(f"⚠️ {name}: Insufficient data (need {WINDOW_SIZE + 1} points, have {row['series_size']})")
+    if len(short) > 20:
+        print(f"⚠️ ... and {len(short) - 20} more series with insufficient data")
+
+    # Only series whose latest point can reach a severity level
+    latest_rows = latest_rows[
+        (latest_rows["series_size"] >= WINDOW_SIZE + 1)
+        & (latest_rows["spike_score"] >= SPIKE_THRESHOLDS['LOW'])
+        & (prior_mean(latest_rows["rolling_mean"], latest_rows["count"]) >= min_baseline)
+    ]
+    spike_scores = stats["spike_score"].to_numpy()
+
+    # Index the raw events of the trending categories once for sampling
+    if isinstance(events_data, pd.DataFrame):
+        trending = events_data["category"].isin(latest_rows["category"].unique())
+        events_data = EventIndex(events_data[trending], keys)
+
+    # Process each series with a significant spike
+    for index, latest in zip(latest_rows.index, latest_rows.to_dict("records")):
+        category = latest["category"]
         spike_score = latest["spike_score"]
         
         # Determine severity
@@ -127,56 +327,34 @@ def detect_trends(csv_path, events_data=None):
         # Calculate metrics
         current_count = int(latest["count"])
         baseline_count = latest["rolling_mean"]
-        percent_increase = ((current_count - baseline_count) / baseline_count) * 100
         
         # Get historical spike scores for trend direction
-        historical_scores = cat_df["spike_score"].tail(3).tolist()
-        trend_direction = calculate_trend_direction(spike_score, historical_scores)
-        
-        # Time window information
-        window_end = pd.to_datetime(latest["hour"])
-        window_start = window_end - timedelta(hours=2)  # Based on your 2-hour scheduler
+        start = index - int(latest["position"])
+        historical_scores = spike_scores[max(index - 2, start):index + 1].tolist()
         
         # Get sample events and top sources (if events_data provided)
         sample_texts = []
         top_sources = []
         
         if events_data is not None:
-            sample_texts = get_sample_events(category, events_data, limit=5)
-            top_sources = get_top_sources(category, events_data, limit=3)
+            series_key = [latest[key] for key in keys]
+            sample_texts = events_data.samples(series_key)
+            top_sources = events_data.sources(series_key)
         
-        trend = {
-            # Core metrics
-            "category": category,
-            "spikeScore": round(float(spike_score), 2),
-            "currentCount": current_count,
-            "baselineCount": round(float(baseline_count), 2),
-            "percentIncrease": round(float(percent_increase), 1),
-            
-            # Severity and direction
-            "severity": severity,
-            "trendDirection": trend_direction,
-            
-            # Temporal information
-            "windowStart": window_start.isoformat(),
-            "windowEnd": window_end.isoformat(),
-            "windowDuration": "2h",
-            "detectedAt": datetime.now().isoformat(),
-            
-            # Sample data
-            "sampleTexts": sample_texts,
-            "topSources": top_sources,
-            
-            # Comparison
-            "comparisonPeriod": f"vs last {WINDOW_SIZE * 2}h average",
-            
-            # Status
-            "isActive": True
-        }
+        trend = trend_record(
+            category, spike_score, current_count, baseline_count, historical_scores,
+            window_end=pd.to_datetime(latest["hour"]),
+            sample_texts=sample_texts,
+            top_sources=top_sources,
+            extra={key: latest[key] for key in keys if key != "category"},
+            bucket=bucket,
+        )
+        trend_direction = trend["trendDirection"]
+        percent_increase = trend["percentIncrease"]
         
         results.append(trend)
         
-        print(f"\n🚨 TREND DETECTED: {category}")
+        print(f"\n🚨 TREND DETECTED: {' / '.join(str(latest[k]) for k in keys)}")
         print(f"   Severity: {severity}")
         print(f"   Spike: {spike_score:.2f}x ({percent_increase:.1f}% increase)")
         print(f"   Current: {current_count} events vs baseline {baseline_count:.1f}")
@@ -191,6 +369,259 @@ def detect_trends(csv_path, events_data=None):
     return results
 
 
+# ----------------------------
+# STREAMING DETECTION
+# ----------------------------
+class SeriesState:
+    """Ring buffer and running sums of one category's bucket counts"""
+
+    def __init__(self, window_size, samples):
+        self.bucket = None                      # start of the open bucket
+        self.count = 0                          # events in the open bucket
+        self.ring = deque(maxlen=window_size)   # counts of the last closed buckets
+        self.ring_sum = 0
+        self.closed = 0                         # closed buckets seen
+        self.scores = deque(maxlen=2)           # final spike scores of the last closed buckets
+        self.level = None                       # severity already reported
+        self.samples = deque(maxlen=samples)    # latest texts, newest first
+        self.sources = Counter()
+
+    def to_dict(self):
+        return {
+            "bucket": self.bucket.isoformat() if self.bucket is not None else None,
+            "count": self.count,
+            "ring": list(self.ring),
+            "closed": self.closed,
+            "scores": [None if math.isnan(x) else x for x in self.scores],
+            "level": self.level,
+            "samples": list(self.samples),
+            "sources": dict(self.sources),
+        }
+
+    @classmethod
+    def from_dict(cls, data, window_size, samples):
+        state = cls(window_size, samples)
+        state.bucket = pd.Timestamp(data["bucket"]) if data["bucket"] else None
+        state.count = data["count"]
+        state.ring.extend(data["ring"])
+        state.ring_sum = sum(state.ring)
+        state.closed = data["closed"]
+        state.scores.extend(math.nan if x is None else x for x in data["scores"])
+        state.level = data["level"]
+        state.samples.extend(data["samples"])
+        state.sources.update(data["sources"])
+        return state
+
+
+class StreamingTrendDetector:
+    """
+    Incremental twin of detect_trends for a live event stream.
+
+    Per category it keeps the counts of the last WINDOW_SIZE closed buckets
+    in a ring buffer with their running sum, plus the count of the bucket
+    still open. Each event costs O(1): the open bucket's spike score is
+    recomputed from the running sum, and a trend record is returned only
+    when its severity climbs past the level already reported. A spike is
+    therefore reported while its bucket is still filling, instead of at
+    the next batch run; each later record for the same bucket is an
+    upgrade of the first, with the same category and window. Scores match
+    detect_trends on the same buckets.
+
+    Usage:
+        detector = StreamingTrendDetector.load("detector_state.json") or StreamingTrendDetector()
+        trend = detector.update("SIDE_EFFECTS", event_time, source="PubMed", text=text)
+        detector.save("detector_state.json")
+    """
+
+    def __init__(self, bucket="min", window_size=WINDOW_SIZE, samples=5, fill_gaps=True,
+                 min_baseline=MIN_BASELINE):
+        """
+        Args:
+            bucket: Bucket width as a pandas frequency ("min", "h", "D")
+            window_size: Buckets in the rolling window, like WINDOW_SIZE
+            samples: Latest texts kept per category for trend records
+            fill_gaps: Count buckets without events as zeros, like the
+                gap-filled rollups; False matches detect_trends on sparse
+                aggregates that skip empty buckets
+            min_baseline: Least average count of the closed buckets in the
+                window for the open one to be reported (0 matches the
+                default detect_trends)
+        """
+        self.bucket = bucket
+        self.window_size = window_size
+        self.samples = samples
+        self.fill_gaps = fill_gaps
+        self.min_baseline = min_baseline
+        self._step = bucket_width(bucket).value
+        self.series = {}
+        self.events = 0
+        self.late_events = 0
+
+    def _state(self, category):
+        if category not in self.series:
+            self.series[category] = SeriesState(self.window_size, self.samples)
+        return self.series[category]
+
+    def _score(self, state):
+        """(spike score, rolling mean) of the open bucket, None before a full window"""
+        if state.closed < self.window_size or not state.count:
+            return None
+        # Window = the newest window_size - 1 closed buckets + the open one
+        rolling_mean = (state.ring_sum - state.ring[0] + state.count) / self.window_size
+        return state.count / rolling_mean, rolling_mean
+
+    def _close(self, state):
+        if state.bucket is None:
+            return
+        scored = self._score(state)
+        state.scores.append(scored[0] if scored else math.nan)
+        # The closed bucket's level carries over, so a sustained spike is
+        # reported once and a new one after it has subsided
+        state.level = calculate_severity(scored[0]) if scored else None
+
+        if len(state.ring) == self.window_size:
+            state.ring_sum -= state.ring[0]
+        state.ring.append(state.count)
+        state.ring_sum += state.count
+        state.closed += 1
+
+    def update(self, category, timestamp, count=1, source=None, text=None):
+        """
+        Add ``count`` events at ``timestamp``.
+
+        Returns a trend record (as from detect_trends) when this update
+        lifts the category to a higher severity, otherwise None. Events for
+        buckets that are already closed are counted as late and ignored.
+        """
+        timestamp = pd.Timestamp(timestamp)
+        if timestamp.tz is None:
+            bucket = pd.Timestamp(timestamp.value - timestamp.value % self._step)
+        else:
+            bucket = timestamp.floor(self.bucket)
+        state = self._state(category)
+        if state.bucket is not None and bucket < state.bucket:
+            self.late_events += count
+            return None
+        if state.bucket is None or bucket > state.bucket:
+            self._close(state)
+            if self.fill_gaps and state.bucket is not None:
+                # Only the last window_size + 2 empty buckets can still matter
+                empty = (bucket - state.bucket).value // self._step - 1
+                for _ in range(min(empty, self.window_size + 2)):
+                    state.count = 0
+                    self._close(state)
+            state.bucket = bucket
+            state.count = 0
+
+        self.events += count
+        state.count += count
+        if source:
+            state.sources[source] += count
+        if text:
+            state.samples.appendleft(text)
+
+        scored = self._score(state)
+        if scored is None:
+            return None
+        spike_score, rolling_mean = scored
+        severity = calculate_severity(spike_score)
+        if SEVERITY_RANK[severity] <= SEVERITY_RANK[state.level]:
+            return None
+        if prior_mean(rolling_mean, state.count, self.window_size) < self.min_baseline:
+            return None
+
+        state.level = severity
+        return trend_record(
+            category, spike_score, state.count, rolling_mean,
+            [*state.scores, spike_score],
+            window_end=state.bucket,
+            bucket=self.bucket,
+            sample_texts=state.samples,
+            top_sources=[
+                {"source": source, "count": int(n)} for source, n in state.sources.most_common(3)
+            ],
+        )
+
+    def replay(self, df):
+        """
+        Load history from aggregated counts (category, hour, count) without
+        reporting trends; returns the number of buckets read.
+        """
+        rows = df.sort_values("hour", kind="mergesort")
+        for category, hour, count in zip(rows["category"], rows["hour"], rows["count"]):
+            self.update(category, hour, int(count))
+        # History only sets the baseline; whatever is spiking now is reported
+        for state in self.series.values():
+            state.level = None
+        return len(rows)
+
+    def snapshot(self):
+        """Open-bucket score and reported level of every category"""
+        out = {}
+        for category, state in self.series.items():
+            scored = self._score(state)
+            out[category] = {
+                "bucket": state.bucket.isoformat() if state.bucket is not None else None,
+                "count": state.count,
+                "spikeScore": round(float(scored[0]), 2) if scored else None,
+                "baselineCount": round(float(scored[1]), 2) if scored else None,
+                "severity": state.level,
+            }
+        return out
+
+    # ------------------ Checkpoints ------------------
+    def to_dict(self):
+        return {
+            "bucket": self.bucket,
+            "window_size": self.window_size,
+            "samples": self.samples,
+            "fill_gaps": self.fill_gaps,
+            "min_baseline": self.min_baseline,
+            "events": self.events,
+            "late_events": self.late_events,
+            # A list rather than a mapping: category names are not always valid Mongo keys
+            "series": [{"category": c, **s.to_dict()} for c, s in self.series.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        detector = cls(
+            data["bucket"], data["window_size"], data["samples"],
+            data.get("fill_gaps", True), data.get("min_baseline", MIN_BASELINE),
+        )
+        detector.events = data["events"]
+        detector.late_events = data["late_events"]
+        for entry in data["series"]:
+            detector.series[entry["category"]] = SeriesState.from_dict(
+                entry, detector.window_size, detector.samples
+            )
+        return detector
+
+    def save(self, path):
+        """Atomically write the state as JSON"""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        """Detector saved at ``path``, or None if there is no checkpoint"""
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def save_mongo(self, collection, key="streaming_detector"):
+        collection.replace_one({"_id": key}, {"_id": key, **self.to_dict()}, upsert=True)
+
+    @classmethod
+    def load_mongo(cls, collection, key="streaming_detector"):
+        data = collection.find_one({"_id": key})
+        return cls.from_dict(data) if data else None
+
+
 def format_trend_summary(trend):
     """Generate a human-readable summary of a trend"""
     category = trend['category'].replace('_', ' ').title()
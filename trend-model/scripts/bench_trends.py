@@ -0,0 +1,164 @@
+"""
+Benchmark of detect_trends: per-category loop vs one grouped pass.
+
+Generates aggregated counts for a growing number of series (6 categories
+up to thousands of category x source series), checks that the grouped
+detect_trends returns exactly what the original per-category loop did,
+and reports how both scale. The sampling benchmark does the same for the
+sample texts and top sources of every trend: per-trend filtering of the
+raw events vs one EventIndex.
+
+Usage (from trend-model/):
+    python -m scripts.bench_trends --points 48 --series 6 60 600 6000 --sampling-series 6 60 600
+"""
+import argparse
+import contextlib
+import io
+import time
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from model import trend_model
+from model.trend_model import (
+    WINDOW_SIZE, EventIndex, calculate_severity, calculate_trend_direction,
+    get_sample_events, get_top_sources,
+)
+
+CATEGORIES = [
+    "BRAND_PERCEPTION", "SIDE_EFFECTS", "COMPETITOR_ACTIVITY",
+    "CLINICAL_TRIALS", "REGULATION_POLICY", "MARKETING_PROMOTION",
+]
+
+
+def legacy_detect_trends(df):
+    """The original loop: filter, copy, sort and roll every category separately"""
+    results = []
+    for category in df["category"].unique():
+        cat_df = df[df["category"] == category].copy()
+        cat_df = cat_df.sort_values("hour")
+        if len(cat_df) < WINDOW_SIZE + 1:
+            continue
+
+        cat_df["rolling_mean"] = cat_df["count"].rolling(window=WINDOW_SIZE).mean()
+        cat_df["rolling_std"] = cat_df["count"].rolling(window=WINDOW_SIZE).std()
+        cat_df["spike_score"] = cat_df["count"] / cat_df["rolling_mean"]
+
+        latest = cat_df.iloc[-1]
+        spike_score = latest["spike_score"]
+        severity = calculate_severity(spike_score)
+        if severity is None:
+            continue
+
+        current_count = int(latest["count"])
+        baseline_count = latest["rolling_mean"]
+        percent_increase = ((current_count - baseline_count) / baseline_count) * 100
+        historical_scores = cat_df["spike_score"].tail(3).tolist()
+        window_end = pd.to_datetime(latest["hour"])
+        results.append({
+            "category": category,
+            "spikeScore": round(float(spike_score), 2),
+            "currentCount": current_count,
+            "baselineCount": round(float(baseline_count), 2),
+            "percentIncrease": round(float(percent_increase), 1),
+            "severity": severity,
+            "trendDirection": calculate_trend_direction(spike_score, historical_scores),
+            "windowStart": (window_end - timedelta(hours=2)).isoformat(),
+            "windowEnd": window_end.isoformat(),
+        })
+    return results
+
+
+def synthetic_counts(series, points, seed=0):
+    """Minute-bucket counts like api.py's aggregation, with spikes in some series"""
+    rng = np.random.default_rng(seed)
+    hours = pd.date_range("2026-01-01", periods=points, freq="min").astype(str)
+    names = [f"{CATEGORIES[i % len(CATEGORIES)]}" + (f"#{i // len(CATEGORIES)}" if i >= len(CATEGORIES) else "")
+             for i in range(series)]
+    counts = rng.poisson(rng.uniform(1, 20, series)[:, None], (series, points))
+    counts[:, -1] *= rng.choice([1, 1, 2, 4], series)
+    df = pd.DataFrame({
+        "category": np.repeat(names, points),
+        "hour": np.tile(hours, series),
+        "count": counts.ravel(),
+    })
+    # Shuffled and a few series too short to score, like real exports
+    df = df.sample(frac=1, random_state=seed).reset_index(drop=True)
+    return df[~((df.index % 97 == 0) & df["category"].str.endswith("#1"))]
+
+
+def synthetic_events(counts, seed=0):
+    """One raw event per counted unit, with a few sources and distinct texts"""
+    rng = np.random.default_rng(seed)
+    repeats = counts["count"].to_numpy()
+    events = pd.DataFrame({
+        "category": np.repeat(counts["category"].to_numpy(), repeats),
+        "timestamp": pd.to_datetime(np.repeat(counts["hour"].to_numpy(), repeats)),
+    })
+    events["timestamp"] += pd.to_timedelta(rng.integers(0, 60, len(events)), unit="s")
+    events["source"] = rng.choice(["PubMed", "FDA", "NewsAPI", "ClinicalTrials", "Reddit"], len(events))
+    events["text"] = [f"event {i}" for i in range(len(events))]
+    return events
+
+
+def legacy_sampling(trends, events):
+    return [(get_sample_events(t["category"], events), get_top_sources(t["category"], events)) for t in trends]
+
+
+def indexed_sampling(trends, events):
+    index = EventIndex(events[events["category"].isin({t["category"] for t in trends})])
+    return [(index.samples([t["category"]]), index.sources([t["category"]])) for t in trends]
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - started)
+    return out, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="detect_trends scaling benchmark")
+    parser.add_argument("--series", type=int, nargs="+", default=[6, 60, 600, 6000])
+    parser.add_argument("--points", type=int, default=48, help="Time buckets per series")
+    parser.add_argument("--sampling-series", type=int, nargs="*", default=[6, 60, 600],
+                        help="Series counts of the sampling benchmark")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    fields = ["category", "spikeScore", "currentCount", "baselineCount", "percentIncrease",
+              "severity", "trendDirection", "windowStart", "windowEnd"]
+
+    print(f"🏁 detect_trends benchmark, {args.points} buckets per series")
+    for series in args.series:
+        df = synthetic_counts(series, args.points)
+        legacy, legacy_s = timed(lambda: legacy_detect_trends(df), args.repeat)
+        with contextlib.redirect_stdout(io.StringIO()):
+            grouped, grouped_s = timed(lambda: trend_model.detect_trends(df), args.repeat)
+
+        same = [{k: t[k] for k in fields} for t in grouped] == legacy
+        print(f"   {series:6} series {len(df):8} rows  loop {legacy_s * 1000:9.1f} ms  "
+              f"grouped {grouped_s * 1000:8.1f} ms  {legacy_s / grouped_s:6.1f}x  "
+              f"{len(grouped):5} trends  {'✅ identical' if same else '❌ DIFFERENT'}")
+
+    if args.sampling_series:
+        print("\n🏁 Sample texts and top sources of every trend")
+    for series in args.sampling_series:
+        df = synthetic_counts(series, args.points)
+        events = synthetic_events(df)
+        with contextlib.redirect_stdout(io.StringIO()):
+            trends = trend_model.detect_trends(df)
+        legacy, legacy_s = timed(lambda: legacy_sampling(trends, events), args.repeat)
+        indexed, indexed_s = timed(lambda: indexed_sampling(trends, events), args.repeat)
+
+        same = indexed == legacy
+        print(f"   {series:6} series {len(events):8} events  filter {legacy_s * 1000:9.1f} ms  "
+              f"index {indexed_s * 1000:8.1f} ms  {legacy_s / indexed_s:6.1f}x  "
+              f"{len(trends):5} trends  {'✅ identical' if same else '❌ DIFFERENT'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Check that StreamingTrendDetector stays quiet on steady input, still
+reports a real spike, and agrees with detect_trends.
+
+Events arrive the way the backend saves them: a batch per scrape, all
+stamped within the same minute. Each scenario is streamed event by event
+and also run through detect_trends on the same gap-filled buckets, with
+the same baseline floor. The stream may report a window several times as
+its severity climbs; the API keeps one trend per (category, window), so
+both paths are compared as {window: final severity}.
+
+Usage (from trend-model/):
+    python -m scripts.check_stream
+"""
+import argparse
+import contextlib
+import io
+import sys
+
+import pandas as pd
+
+from model.trend_model import MIN_BASELINE, SEVERITY_RANK, StreamingTrendDetector, detect_trends
+
+
+def batches(every, size, hours=24, spike_at=None, spike_size=0):
+    """Event timestamps: ``size`` events every ``every``, one batch bigger"""
+    starts = pd.date_range("2026-01-01", periods=int(pd.Timedelta(hours=hours) / pd.Timedelta(every)), freq=every)
+    times = []
+    for i, start in enumerate(starts):
+        n = spike_size if i == spike_at else size
+        times.extend(start + pd.Timedelta(seconds=s % 60) for s in range(n))
+    return times
+
+
+def stream(times, bucket, min_baseline=MIN_BASELINE):
+    detector = StreamingTrendDetector(bucket=bucket, min_baseline=min_baseline)
+    return [t for t in (detector.update("SIDE_EFFECTS", ts) for ts in times) if t is not None]
+
+
+def batch(times, bucket, min_baseline=MIN_BASELINE):
+    """detect_trends at the end of every bucket, like a scheduled run"""
+    counts = pd.Series(1, index=pd.DatetimeIndex(times)).resample(bucket).sum()
+    trends = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for end in range(1, len(counts) + 1):
+            window = counts.iloc[:end]
+            df = pd.DataFrame({"category": "SIDE_EFFECTS", "hour": window.index, "count": window.to_numpy()})
+            trends.extend(detect_trends(df, bucket=bucket, min_baseline=min_baseline))
+    return trends
+
+
+def by_window(trends):
+    """One trend per (category, window), at the highest severity it reached"""
+    windows = {}
+    for t in trends:
+        key = (t["category"], t["windowStart"])
+        if SEVERITY_RANK[t["severity"]] > SEVERITY_RANK[windows.get(key)]:
+            windows[key] = t["severity"]
+    return windows
+
+
+SCENARIOS = [
+    # (name, timestamps, bucket, expect trends)
+    ("3 events every 10 min, minute buckets", batches("10min", 3, hours=4), "min", False),
+    ("40 events every 2h, 2h buckets", batches("2h", 40, hours=72), "2h", False),
+    ("steady 5/min, minute buckets", batches("1min", 5, hours=4), "min", False),
+    ("40 every 2h, one batch of 200", batches("2h", 40, hours=72, spike_at=30, spike_size=200), "2h", True),
+]
+
+
+def main():
+    argparse.ArgumentParser(description="Streaming trend detector check").parse_args()
+
+    failed = False
+    for name, times, bucket, expected in SCENARIOS:
+        streamed, batched = by_window(stream(times, bucket)), by_window(batch(times, bucket))
+        ok = bool(streamed) == expected and streamed == batched
+        failed |= not ok
+        print(f"   {'✅' if ok else '❌'} {name:40} stream {len(streamed):3} trends  "
+              f"batch {len(batched):3} trends  {sorted(set(streamed.values())) or ''}")
+
+    if failed:
+        print("\n❌ Streaming check failed")
+        sys.exit(1)
+    print("\n✅ Streaming check passed")
+
+
+if __name__ == "__main__":
+    main()